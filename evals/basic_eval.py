@@ -24,13 +24,13 @@ def run_agent(question: str, document_path: str | None) -> str:
         conversation_id=conversation_id,
         thread_id=thread_id,
         user_message=question,
-        document_path=document_path,
+        document_paths=[document_path] if document_path else [],
     )
     return state["messages"][-1].content
 
 
-def main() -> None:
-    cases = [
+def build_cases() -> list[dict]:
+    return [
         {
             "input": {
                 "question": "Summarize the key events described in the deposition.",
@@ -47,9 +47,11 @@ def main() -> None:
         },
     ]
 
+
+def main() -> None:
     Eval(
         "rev-langgraph-demo",
-        data=cases,
+        data=build_cases(),
         task=lambda case: run_agent(case["question"], case["document_path"]),
         scores=[Factuality],
         metadata={
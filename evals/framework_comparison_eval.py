@@ -0,0 +1,145 @@
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from autoevals import Factuality
+from braintrust import EvalAsync
+from dotenv import load_dotenv
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+load_dotenv()
+
+from evals.basic_eval import build_cases  # noqa: E402
+from scripts.create_dataset import build_questions  # noqa: E402
+from src.backend.agent.runner import run_agent_turn  # noqa: E402
+
+DATA_PATH = os.getenv("DEPOSITION_SAMPLE_PATH", "./data/sample_deposition.txt")
+PROJECT = os.getenv("BRAINTRUST_PROJECT", "rev-langgraph-demo")
+FRAMEWORKS = [
+    name.strip()
+    for name in os.getenv(
+        "EVAL_FRAMEWORKS", "langgraph,openai_agents,google_adk"
+    ).split(",")
+    if name.strip()
+]
+MAX_CONCURRENCY = int(os.getenv("EVAL_MAX_CONCURRENCY", "4"))
+
+_rows: dict[str, list[dict]] = {framework: [] for framework in FRAMEWORKS}
+_rows_lock = threading.Lock()
+
+
+def comparison_cases() -> list[dict]:
+    cases = build_cases()
+    cases.extend(
+        {
+            "input": {"question": question, "document_path": DATA_PATH},
+            "expected": None,
+        }
+        for question in build_questions()
+    )
+    return cases
+
+
+def factuality(input, output, expected):
+    # Dataset questions have no reference answer; only latency/cost is compared.
+    if expected is None:
+        return None
+    return Factuality()(input=input["question"], output=output, expected=expected)
+
+
+def make_task(framework: str):
+    def task(case: dict, hooks) -> str:
+        started = time.perf_counter()
+        turn = run_agent_turn(
+            framework=framework,
+            conversation_id=str(uuid.uuid4()),
+            thread_id=str(uuid.uuid4()),
+            user_message=case["question"],
+            document_paths=[case["document_path"]],
+            metadata={"agent_framework": framework},
+        )
+        wall_time = time.perf_counter() - started
+        metrics = {"wall_time_s": wall_time, **turn.usage.as_metrics()}
+        hooks.span.log(metrics=metrics, metadata={"agent_framework": framework})
+        with _rows_lock:
+            _rows[framework].append(metrics)
+        return turn.assistant_message
+
+    return task
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(pct * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def print_summary(results: dict) -> None:
+    header = (
+        f"{'framework':<15}{'cases':>6}{'p50 s':>9}{'p95 s':>9}"
+        f"{'llm':>7}{'tools':>7}{'tokens':>9}{'factuality':>12}"
+    )
+    print(header)
+    print("-" * len(header))
+    for framework in FRAMEWORKS:
+        rows = _rows[framework]
+        if not rows:
+            print(f"{framework:<15}{0:>6}  (no successful cases)")
+            continue
+        wall_times = [row["wall_time_s"] for row in rows]
+        score = None
+        summary = getattr(results.get(framework), "summary", None)
+        if summary is not None and "factuality" in (summary.scores or {}):
+            score = summary.scores["factuality"].score
+        print(
+            f"{framework:<15}{len(rows):>6}"
+            f"{_percentile(wall_times, 0.5):>9.2f}{_percentile(wall_times, 0.95):>9.2f}"
+            f"{statistics.mean(row['llm_calls'] for row in rows):>7.1f}"
+            f"{statistics.mean(row['tool_calls'] for row in rows):>7.1f}"
+            f"{statistics.mean(row['total_tokens'] for row in rows):>9.0f}"
+            f"{score if score is not None else float('nan'):>12.2f}"
+        )
+
+
+async def run_comparison() -> dict:
+    cases = comparison_cases()
+    runs = [
+        EvalAsync(
+            PROJECT,
+            data=cases,
+            task=make_task(framework),
+            scores=[factuality],
+            experiment_name=f"framework-comparison-{framework}",
+            max_concurrency=MAX_CONCURRENCY,
+            metadata={
+                "agent_framework": framework,
+                "model": os.getenv("DEFAULT_LLM_MODEL", "gpt-4o-mini"),
+                "dataset": "framework_comparison_eval",
+            },
+        )
+        for framework in FRAMEWORKS
+    ]
+    outcomes = await asyncio.gather(*runs, return_exceptions=True)
+    results = {}
+    for framework, outcome in zip(FRAMEWORKS, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"{framework} eval failed: {outcome}")
+            continue
+        results[framework] = outcome
+    return results
+
+
+def main() -> None:
+    results = asyncio.run(run_comparison())
+    print_summary(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from autoevals import Factuality
+from braintrust import EvalAsync
+from dotenv import load_dotenv
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+load_dotenv()
+
+from evals.basic_eval import build_cases  # noqa: E402
+from src.backend.agent.routing import RouterConfig, route_turn  # noqa: E402
+from src.backend.agent.runner import resolve_agent_framework, run_agent_turn  # noqa: E402
+
+DATA_PATH = os.getenv("DEPOSITION_SAMPLE_PATH", "./data/sample_deposition.txt")
+PROJECT = os.getenv("BRAINTRUST_PROJECT", "rev-langgraph-demo")
+MAX_CONCURRENCY = int(os.getenv("EVAL_MAX_CONCURRENCY", "4"))
+# Only print routing decisions; no model calls.
+DRY_RUN = os.getenv("EVAL_ROUTER_DRY_RUN", "").lower() in {"1", "true", "yes"}
+# USD per million input:output tokens, e.g. "gpt-4o-mini=0.15:0.60,gpt-4o=2.50:10.00".
+PRICES = os.getenv("MODEL_PRICES", "gpt-4o-mini=0.15:0.60,gpt-4o=2.50:10.00")
+MODES = ["routed", "strong"]
+
+_rows: dict[str, list[dict]] = {mode: [] for mode in MODES}
+_rows_lock = threading.Lock()
+
+
+def _prices() -> dict[str, tuple[float, float]]:
+    prices = {}
+    for entry in PRICES.split(","):
+        if "=" not in entry:
+            continue
+        model, values = entry.split("=", 1)
+        prompt, completion = values.split(":", 1)
+        prices[model.strip()] = (float(prompt), float(completion))
+    return prices
+
+
+def routing_cases() -> list[dict]:
+    cases = build_cases()
+    # Follow-ups that should not need the strong tier. Small talk has no
+    # reference answer; rewrites are scored against the original question.
+    cases.extend(
+        [
+            {"input": {"question": "Thanks!", "document_path": None, "previous_tool_calls": 2}, "expected": None},
+            {"input": {"question": "ok got it", "document_path": None, "previous_tool_calls": 1}, "expected": None},
+            {
+                "input": {
+                    "question": "Shorter please: what happened in the accident described in the deposition?",
+                    "document_path": DATA_PATH,
+                    "previous_tool_calls": 1,
+                },
+                "expected": "A car accident, described briefly.",
+            },
+            {
+                "input": {
+                    "question": "Compare the witness's account of the timing with the injuries they reported. Any inconsistencies?",
+                    "document_path": DATA_PATH,
+                    "previous_tool_calls": 0,
+                },
+                "expected": None,
+            },
+        ]
+    )
+    return cases
+
+
+def factuality(input, output, expected):
+    if expected is None:
+        return None
+    return Factuality()(input=input["question"], output=output, expected=expected)
+
+
+def make_task(mode: str, framework: str):
+    prices = _prices()
+
+    def task(case: dict, hooks) -> str:
+        document_paths = [case["document_path"]] if case.get("document_path") else []
+        decision = route_turn(
+            case["question"],
+            has_documents=bool(document_paths),
+            previous_tool_calls=case.get("previous_tool_calls"),
+            framework=framework,
+            override="strong" if mode == "strong" else None,
+        )
+        started = time.perf_counter()
+        turn = run_agent_turn(
+            framework=framework,
+            conversation_id=str(uuid.uuid4()),
+            thread_id=str(uuid.uuid4()),
+            user_message=case["question"],
+            document_paths=document_paths,
+            model_name=decision.model,
+            metadata={"agent_framework": framework, "model_tier": decision.tier},
+        )
+        wall_time = time.perf_counter() - started
+        prompt_price, completion_price = prices.get(decision.model or "", (0.0, 0.0))
+        cost = (turn.usage.prompt_tokens * prompt_price + turn.usage.completion_tokens * completion_price) / 1e6
+        metrics = {"wall_time_s": wall_time, "estimated_cost_usd": cost, **turn.usage.as_metrics()}
+        hooks.span.log(metrics=metrics, metadata=decision.as_metadata())
+        with _rows_lock:
+            _rows[mode].append({**metrics, "tier": decision.tier})
+        return turn.assistant_message
+
+    return task
+
+
+def print_decisions(framework: str) -> None:
+    for case in routing_cases():
+        item = case["input"]
+        decision = route_turn(
+            item["question"],
+            has_documents=bool(item.get("document_path")),
+            previous_tool_calls=item.get("previous_tool_calls"),
+            framework=framework,
+        )
+        score = "-" if decision.score is None else f"{decision.score:.2f}"
+        print(f"{decision.tier:<8}{score:>6}  {decision.model or '(default)':<24}{item['question'][:60]}")
+
+
+def print_summary(results: dict) -> None:
+    header = f"{'mode':<10}{'cases':>6}{'fast %':>8}{'p50 s':>8}{'mean s':>8}{'cost $':>10}{'factuality':>12}"
+    print(header)
+    print("-" * len(header))
+    for mode in MODES:
+        rows = _rows[mode]
+        if not rows:
+            print(f"{mode:<10}{0:>6}  (no successful cases)")
+            continue
+        wall_times = [row["wall_time_s"] for row in rows]
+        score = None
+        summary = getattr(results.get(mode), "summary", None)
+        if summary is not None and "factuality" in (summary.scores or {}):
+            score = summary.scores["factuality"].score
+        print(
+            f"{mode:<10}{len(rows):>6}"
+            f"{100 * sum(row['tier'] == 'fast' for row in rows) / len(rows):>8.0f}"
+            f"{statistics.median(wall_times):>8.2f}{statistics.mean(wall_times):>8.2f}"
+            f"{sum(row['estimated_cost_usd'] for row in rows):>10.4f}"
+            f"{score if score is not None else float('nan'):>12.2f}"
+        )
+
+
+async def run_routing_eval(framework: str) -> dict:
+    cases = routing_cases()
+    runs = [
+        EvalAsync(
+            PROJECT,
+            data=cases,
+            task=make_task(mode, framework),
+            scores=[factuality],
+            experiment_name=f"model-routing-{mode}",
+            max_concurrency=MAX_CONCURRENCY,
+            metadata={
+                "agent_framework": framework,
+                "routing_mode": mode,
+                "model_tiers": RouterConfig.from_env(framework).tiers,
+                "dataset": "model_routing_eval",
+            },
+        )
+        for mode in MODES
+    ]
+    outcomes = await asyncio.gather(*runs, return_exceptions=True)
+    results = {}
+    for mode, outcome in zip(MODES, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"{mode} eval failed: {outcome}")
+            continue
+        results[mode] = outcome
+    return results
+
+
+def main() -> None:
+    framework = resolve_agent_framework()
+    if not RouterConfig.from_env(framework).enabled:
+        print("No model tiers configured; set MODEL_TIERS (or GOOGLE_ADK_MODEL_TIERS), e.g. fast=gpt-4o-mini,strong=gpt-4o")
+        return
+    if DRY_RUN:
+        print_decisions(framework)
+        return
+    results = asyncio.run(run_routing_eval(framework))
+    print_summary(results)
+
+
+if __name__ == "__main__":
+    main()
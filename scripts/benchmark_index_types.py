@@ -0,0 +1,111 @@
+"""Recall/latency/size comparison of RAG index types against the flat baseline.
+
+Uses synthetic clustered vectors by default. Set BENCH_DOCUMENT to embed a
+real transcript with the configured embedding model instead (this calls the
+embeddings API once per chunk batch).
+"""
+
+import dataclasses
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.backend.agent.index_store import (  # noqa: E402
+    INDEX_FILE,
+    INDEX_TYPES,
+    IndexConfig,
+    IndexWriter,
+    PersistedIndex,
+)
+
+load_dotenv()
+
+CHUNKS = int(os.getenv("BENCH_CHUNKS", "20000"))
+DIMENSION = int(os.getenv("BENCH_DIM", "1536"))
+QUERIES = int(os.getenv("BENCH_QUERIES", "200"))
+TOP_K = int(os.getenv("BENCH_K", "5"))
+DOCUMENT = os.getenv("BENCH_DOCUMENT")
+INDEX_TYPES_TO_RUN = [
+    name.strip() for name in os.getenv("BENCH_INDEX_TYPES", ",".join(INDEX_TYPES)).split(",")
+]
+
+
+def synthetic_vectors(rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    # Clustered data behaves more like real embeddings than uniform noise.
+    centers = rng.normal(size=(max(1, CHUNKS // 50), DIMENSION)).astype("float32")
+    labels = rng.integers(0, len(centers), size=CHUNKS)
+    corpus = centers[labels] + 0.3 * rng.normal(size=(CHUNKS, DIMENSION)).astype("float32")
+    picks = rng.integers(0, CHUNKS, size=QUERIES)
+    queries = corpus[picks] + 0.1 * rng.normal(size=(QUERIES, DIMENSION)).astype("float32")
+    return corpus, queries
+
+
+def document_vectors(rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    from src.backend.agent.embedding_batcher import EmbeddingBatcher
+    from src.backend.agent.rag import _chunk_texts, _embeddings
+
+    texts = _chunk_texts(DOCUMENT)
+    corpus = EmbeddingBatcher(_embeddings().embed_documents).embed(texts)
+    # Reuse chunk vectors (slightly perturbed) as queries to avoid extra API calls.
+    picks = rng.integers(0, len(corpus), size=min(QUERIES, len(corpus)))
+    noise = 0.01 * rng.normal(size=(len(picks), corpus.shape[1])).astype("float32")
+    return corpus, corpus[picks] + noise
+
+
+def build(directory: str, corpus: np.ndarray, config: IndexConfig) -> tuple[PersistedIndex, float]:
+    started = time.perf_counter()
+    writer = IndexWriter(directory, [""] * len(corpus), config)
+    for start in range(0, len(corpus), 512):
+        writer.add(start, corpus[start : start + 512])
+    writer.finish({"source_name": "benchmark"})
+    return PersistedIndex(directory, embeddings=None, config=config), time.perf_counter() - started
+
+
+def measure(index: PersistedIndex, queries: np.ndarray) -> tuple[list[list[int]], list[float]]:
+    results, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits = index.search_by_vector(query, TOP_K)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append([position for position, _ in hits])
+    return results, latencies
+
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    corpus, queries = document_vectors(rng) if DOCUMENT else synthetic_vectors(rng)
+    base = IndexConfig.from_env()
+    print(f"{len(corpus)} vectors x {corpus.shape[1]} dims, {len(queries)} queries, k={TOP_K}")
+    print(f"{'type':<10} {'spec':<18} {'build_s':>8} {'size_mb':>8} {'recall':>7} {'p50_ms':>7} {'p95_ms':>7}")
+
+    baseline: list[list[int]] | None = None
+    with tempfile.TemporaryDirectory() as root:
+        for index_type in ["flat"] + [name for name in INDEX_TYPES_TO_RUN if name != "flat"]:
+            config = dataclasses.replace(base, index_type=index_type)
+            directory = os.path.join(root, index_type)
+            index, build_s = build(directory, corpus, config)
+            results, latencies = measure(index, queries)
+            if baseline is None:
+                baseline = results
+            recall = statistics.mean(
+                len(set(found) & set(exact)) / max(1, len(exact))
+                for found, exact in zip(results, baseline)
+            )
+            size_mb = os.path.getsize(os.path.join(directory, INDEX_FILE)) / 1e6
+            p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+            print(
+                f"{index_type:<10} {index.meta['index_spec']:<18} {build_s:>8.2f} {size_mb:>8.1f} "
+                f"{recall:>7.3f} {statistics.median(latencies):>7.3f} {p95:>7.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
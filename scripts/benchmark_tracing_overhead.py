@@ -0,0 +1,209 @@
+"""Per-event and per-turn tracing overhead, with a no-op exporter.
+
+Events are discarded by a stand-in background logger, so the numbers cover
+only the work done on the request thread (span construction, callback
+handling), not serialization or network. Each run appends one JSON line to
+BENCH_OUTPUT so overhead can be tracked over time.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from braintrust import init_logger, traced  # noqa: E402
+from braintrust import logger as bt_logger  # noqa: E402
+from braintrust.util import LazyValue  # noqa: E402
+
+EVENTS = int(os.getenv("BENCH_EVENTS", "2000"))
+TURNS = int(os.getenv("BENCH_TURNS", "200"))
+REPEATS = int(os.getenv("BENCH_REPEATS", "5"))
+OUTPUT = os.getenv("BENCH_OUTPUT", "./data/benchmarks/tracing_overhead.jsonl")
+
+
+class NoopBackgroundLogger:
+    def __init__(self) -> None:
+        self.events = 0
+
+    def log(self, *events: Any) -> None:
+        self.events += len(events)
+
+    def flush(self, batch_size: int | None = None) -> None:
+        pass
+
+    def enforce_queue_size_limit(self, enforce: bool) -> None:
+        pass
+
+    def set_masking_function(self, masking_function: Any) -> None:
+        pass
+
+    def internal_replace_api_conn(self, api_conn: Any) -> None:
+        pass
+
+
+def best_of(run: Callable[[], None]) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def langchain_model_events(logger) -> dict[str, float]:
+    from braintrust_langchain import BraintrustCallbackHandler, set_global_handler
+    from braintrust_langchain.context import clear_global_handler
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    model = FakeListChatModel(responses=["ok"])
+    shared = BraintrustCallbackHandler(logger=logger)
+
+    def invoke(callbacks: list[Any]) -> Callable[[], None]:
+        def run() -> None:
+            for _ in range(EVENTS):
+                model.invoke("hi", config={"callbacks": callbacks})
+
+        return run
+
+    clear_global_handler()
+    baseline = best_of(invoke([]))
+    set_global_handler(shared)
+    # Before handler reuse: the global handler plus a fresh per-turn one.
+    double = best_of(invoke([BraintrustCallbackHandler(logger=logger)]))
+    single = best_of(invoke([shared]))
+    clear_global_handler()
+    # Each invoke is one LLM run: a start and an end callback.
+    per_event = lambda total: (total - baseline) / (EVENTS * 2) * 1e6  # noqa: E731
+    return {
+        "langchain_event_us_single_handler": per_event(single),
+        "langchain_event_us_double_handler": per_event(double),
+    }
+
+
+def langgraph_turns(logger) -> dict[str, float]:
+    from braintrust_langchain import BraintrustCallbackHandler, set_global_handler
+    from braintrust_langchain.context import clear_global_handler
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    from src.backend.agent import graph
+
+    class ToolCallingFake(GenericFakeChatModel):
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+    def script():
+        while True:
+            yield AIMessage(content="", tool_calls=[{"name": "noop", "args": {}, "id": "call-1"}])
+            yield AIMessage(content="done")
+
+    responses = script()
+    graph._model = lambda model_name=None: ToolCallingFake(messages=responses)
+    graph.system_prompt = lambda: "benchmark"
+    compiled = graph.get_graph()
+    shared = BraintrustCallbackHandler(logger=logger)
+
+    def turns(callbacks: list[Any]) -> Callable[[], None]:
+        def run() -> None:
+            for turn in range(TURNS):
+                compiled.invoke(
+                    {"messages": [HumanMessage(content="hi")], "llm_calls": 0, "document_paths": []},
+                    config={"callbacks": callbacks, "configurable": {"thread_id": f"bench-{turn}"}},
+                )
+
+        return run
+
+    clear_global_handler()
+    baseline = best_of(turns([]))
+    set_global_handler(shared)
+    double = best_of(turns([BraintrustCallbackHandler(logger=logger)]))
+    single = best_of(turns([shared]))
+    clear_global_handler()
+    per_turn = lambda total: (total - baseline) / TURNS * 1e3  # noqa: E731
+    return {
+        "langgraph_turn_ms_baseline": baseline / TURNS * 1e3,
+        "langgraph_turn_ms_single_handler": per_turn(single),
+        "langgraph_turn_ms_double_handler": per_turn(double),
+    }
+
+
+def traced_tool_spans() -> dict[str, float]:
+    def plain(query: str) -> str:
+        return query
+
+    wrapped = traced(name="bench_tool")(plain)
+    baseline = best_of(lambda: [plain("q") for _ in range(EVENTS)])
+    with_span = best_of(lambda: [wrapped("q") for _ in range(EVENTS)])
+    return {"traced_tool_span_us": (with_span - baseline) / EVENTS * 1e6}
+
+
+def openai_agents_spans() -> dict[str, float]:
+    try:
+        from agents.tracing import add_trace_processor, custom_span, trace
+        from braintrust.wrappers.openai import BraintrustTracingProcessor
+    except ImportError:
+        return {}
+
+    def spans() -> None:
+        with trace("bench"):
+            for _ in range(EVENTS):
+                with custom_span("bench"):
+                    pass
+
+    baseline = best_of(spans)
+    add_trace_processor(BraintrustTracingProcessor())
+    traced_total = best_of(spans)
+    return {"openai_agents_span_us": (traced_total - baseline) / EVENTS * 1e6}
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    exporter = NoopBackgroundLogger()
+    bt_logger._state._global_bg_logger = LazyValue(lambda: exporter, use_mutex=False)
+    logger = init_logger(project="tracing-overhead-bench", api_key="benchmark")
+
+    results: dict[str, float] = {}
+    results.update(langchain_model_events(logger))
+    results.update(langgraph_turns(logger))
+    results.update(traced_tool_spans())
+    results.update(openai_agents_spans())
+
+    width = max(len(name) for name in results)
+    for name, value in results.items():
+        print(f"{name:<{width}}  {value:10.3f}")
+    skipped = [] if "openai_agents_span_us" in results else ["openai_agents (SDK not installed)"]
+    # Google ADK has no Braintrust integration wired up in this app.
+    skipped.append("google_adk (not traced)")
+    print(f"skipped: {', '.join(skipped)}; events exported: {exporter.events}")
+
+    os.makedirs(os.path.dirname(OUTPUT) or ".", exist_ok=True)
+    with open(OUTPUT, "a", encoding="utf-8") as handle:
+        record = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "events": EVENTS,
+            "turns": TURNS,
+            "best_of": REPEATS,
+            "results": {name: round(value, 3) for name, value in results.items()},
+        }
+        handle.write(json.dumps(record) + "\n")
+    print(f"appended to {OUTPUT}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Export session transcripts as question/answer rows.
+
+Turns are streamed from SESSION_DB_PATH in conversation order and written
+as they arrive, so memory stays flat however large the database is. Each
+row pairs a user message with the assistant reply that followed it.
+Uploaded documents are referenced by content hash rather than copied into
+every row. A sidecar ``<output>.documents.jsonl`` lists each distinct
+document once.
+
+EXPORT_FORMAT selects the sink:
+- jsonl (default): one dataset-shaped row per line in EXPORT_OUTPUT.
+- parquet: a flat table in EXPORT_OUTPUT, written one row group per
+  EXPORT_BATCH_SIZE rows. Needs ``uv sync --extra export``.
+- braintrust: inserts into BRAINTRUST_DATASET_NAME in BRAINTRUST_PROJECT.
+  Rows carry stable ids, so re-running an export updates rather than
+  duplicates them. At most EXPORT_CONCURRENCY batches of EXPORT_BATCH_SIZE
+  rows are in flight at a time. With EXPORT_ATTACH_DOCUMENTS=true each
+  distinct document is also uploaded once, as an attachment, to
+  ``<dataset>-documents`` with its hash as the row id.
+
+Filters: EXPORT_SINCE / EXPORT_UNTIL (ISO dates or timestamps, UTC),
+EXPORT_FRAMEWORK, EXPORT_FEEDBACK (any, rated, unrated) and
+EXPORT_MIN_SCORE / EXPORT_MAX_SCORE (thumbs up is 1, down is 0).
+Conversations that have not been read since message rows were introduced
+are only exported once their history has been loaded.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from dotenv import load_dotenv  # noqa: E402
+
+from src.backend.storage.session_store import ExportTurn, SessionStore  # noqa: E402
+
+load_dotenv()
+
+DB_PATH = os.getenv("SESSION_DB_PATH", "./data/sessions.db")
+FORMAT = os.getenv("EXPORT_FORMAT", "jsonl")
+OUTPUT = os.getenv("EXPORT_OUTPUT", "./data/exports/sessions.jsonl")
+SINCE = os.getenv("EXPORT_SINCE") or None
+UNTIL = os.getenv("EXPORT_UNTIL") or None
+FRAMEWORK = os.getenv("EXPORT_FRAMEWORK") or None
+FEEDBACK = os.getenv("EXPORT_FEEDBACK", "any")
+MIN_SCORE = os.getenv("EXPORT_MIN_SCORE") or None
+MAX_SCORE = os.getenv("EXPORT_MAX_SCORE") or None
+BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+CONCURRENCY = int(os.getenv("EXPORT_CONCURRENCY", "4"))
+ATTACH_DOCUMENTS = os.getenv("EXPORT_ATTACH_DOCUMENTS", "false").lower() in {"1", "true", "yes"}
+DATASET_NAME = os.getenv("BRAINTRUST_DATASET_NAME", "rev-session-transcripts")
+PROJECT = os.getenv("BRAINTRUST_PROJECT", "rev-langgraph-demo")
+
+
+@lru_cache(maxsize=4096)
+def document_ref(path: str) -> dict[str, Any]:
+    """Hash once per path; documents are immutable once uploaded."""
+    ref: dict[str, Any] = {"sha256": None, "filename": os.path.basename(path), "size": None}
+    try:
+        digest = hashlib.sha256()
+        with open(path, "rb") as handle:
+            for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+                digest.update(chunk)
+        ref.update(sha256=digest.hexdigest(), size=os.path.getsize(path))
+    except OSError:
+        pass
+    return ref
+
+
+def to_row(turn: ExportTurn) -> dict[str, Any]:
+    tags = [f"framework:{turn.agent_framework}"] if turn.agent_framework else []
+    if turn.feedback_score is not None:
+        tags.append("thumbs_up" if turn.feedback_score >= 0.5 else "thumbs_down")
+    return {
+        "id": f"{turn.conversation_id}:{turn.seq}",
+        "input": {
+            "question": turn.question,
+            "documents": [document_ref(path) for path in turn.document_paths],
+        },
+        "expected": turn.answer,
+        "metadata": {
+            "conversation_id": turn.conversation_id,
+            "seq": turn.seq,
+            "span_id": turn.span_id,
+            "created_at": turn.created_at,
+            "agent_framework": turn.agent_framework,
+            "feedback_score": turn.feedback_score,
+            "feedback_comment": turn.feedback_comment,
+        },
+        "tags": tags,
+    }
+
+
+def iter_turns(store: SessionStore) -> Iterator[ExportTurn]:
+    if FEEDBACK not in {"any", "rated", "unrated"}:
+        raise ValueError("EXPORT_FEEDBACK must be any, rated or unrated")
+    return store.iter_turns(
+        since=SINCE,
+        until=UNTIL,
+        agent_framework=FRAMEWORK,
+        rated={"any": None, "rated": True, "unrated": False}[FEEDBACK],
+        min_score=float(MIN_SCORE) if MIN_SCORE is not None else None,
+        max_score=float(MAX_SCORE) if MAX_SCORE is not None else None,
+    )
+
+
+def batched(turns: Iterable[ExportTurn], size: int) -> Iterator[list[ExportTurn]]:
+    batch: list[ExportTurn] = []
+    for turn in turns:
+        batch.append(turn)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class DocumentManifest:
+    """Distinct documents seen by the export, one JSON line each."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.seen: dict[str, str] = {}
+        self._handle = open(path, "w", encoding="utf-8")
+
+    def add(self, turns: list[ExportTurn]) -> list[tuple[str, str]]:
+        added = []
+        for turn in turns:
+            for path in turn.document_paths:
+                document = document_ref(path)
+                digest = document["sha256"]
+                if digest is None or digest in self.seen:
+                    continue
+                self.seen[digest] = path
+                self._handle.write(json.dumps({**document, "path": path}) + "\n")
+                added.append((digest, path))
+        return added
+
+    def close(self) -> None:
+        self._handle.close()
+
+
+def write_jsonl(batches: Iterable[list[ExportTurn]], manifest: DocumentManifest) -> int:
+    count = 0
+    with open(OUTPUT, "w", encoding="utf-8") as handle:
+        for batch in batches:
+            manifest.add(batch)
+            for turn in batch:
+                handle.write(json.dumps(to_row(turn), ensure_ascii=False) + "\n")
+            count += len(batch)
+    return count
+
+
+def write_parquet(batches: Iterable[list[ExportTurn]], manifest: DocumentManifest) -> int:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise RuntimeError("Parquet export needs pyarrow. Install with: uv sync --extra export") from exc
+
+    schema = pa.schema(
+        [
+            ("id", pa.string()),
+            ("conversation_id", pa.string()),
+            ("seq", pa.int64()),
+            ("created_at", pa.string()),
+            ("agent_framework", pa.string()),
+            ("question", pa.string()),
+            ("answer", pa.string()),
+            ("span_id", pa.string()),
+            ("feedback_score", pa.float64()),
+            ("feedback_comment", pa.string()),
+            ("document_sha256", pa.list_(pa.string())),
+        ]
+    )
+    count = 0
+    with pq.ParquetWriter(OUTPUT, schema) as writer:
+        for batch in batches:
+            manifest.add(batch)
+            columns: dict[str, list] = {name: [] for name in schema.names}
+            for turn in batch:
+                row = to_row(turn)
+                metadata = row["metadata"]
+                columns["id"].append(row["id"])
+                columns["question"].append(row["input"]["question"])
+                columns["answer"].append(row["expected"])
+                columns["document_sha256"].append([doc["sha256"] for doc in row["input"]["documents"]])
+                for name in (
+                    "conversation_id",
+                    "seq",
+                    "created_at",
+                    "agent_framework",
+                    "span_id",
+                    "feedback_score",
+                    "feedback_comment",
+                ):
+                    columns[name].append(metadata[name])
+            writer.write_table(pa.table(columns, schema=schema))
+            count += len(batch)
+    return count
+
+
+def write_braintrust(batches: Iterable[list[ExportTurn]], manifest: DocumentManifest) -> int:
+    # The SDK posts every queued batch of this size in parallel on flush, so
+    # flushing after CONCURRENCY batches bounds the requests in flight.
+    os.environ.setdefault("BRAINTRUST_DEFAULT_BATCH_SIZE", str(BATCH_SIZE))
+    from braintrust import Attachment, init_dataset
+
+    dataset = init_dataset(project=PROJECT, name=DATASET_NAME)
+    documents = init_dataset(project=PROJECT, name=f"{DATASET_NAME}-documents") if ATTACH_DOCUMENTS else None
+    count = 0
+    pending = 0
+    for batch in batches:
+        added = manifest.add(batch)
+        if documents is not None:
+            for digest, path in added:
+                documents.insert(
+                    id=digest,
+                    input={"document": Attachment(data=path, filename=os.path.basename(path))},
+                    metadata={"sha256": digest, "filename": os.path.basename(path)},
+                )
+        for turn in batch:
+            dataset.insert(**to_row(turn))
+        count += len(batch)
+        pending += 1
+        if pending >= CONCURRENCY:
+            dataset.flush()
+            pending = 0
+    if documents is not None:
+        documents.flush()
+    dataset.flush()
+    return count
+
+
+WRITERS = {"jsonl": write_jsonl, "parquet": write_parquet, "braintrust": write_braintrust}
+
+
+def main() -> None:
+    writer = WRITERS.get(FORMAT)
+    if writer is None:
+        raise SystemExit(f"EXPORT_FORMAT must be one of {', '.join(WRITERS)}")
+    store = SessionStore(DB_PATH)
+    os.makedirs(os.path.dirname(OUTPUT) or ".", exist_ok=True)
+    manifest = DocumentManifest(f"{OUTPUT}.documents.jsonl")
+    started = time.monotonic()
+    try:
+        count = writer(batched(iter_turns(store), BATCH_SIZE), manifest)
+    finally:
+        manifest.close()
+    target = f"{PROJECT}/{DATASET_NAME}" if FORMAT == "braintrust" else OUTPUT
+    print(
+        f"Exported {count} turns to {target} in {time.monotonic() - started:.1f}s; "
+        f"{len(manifest.seen)} distinct documents in {manifest.path}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""Replay captured /chat, /upload and /feedback traffic against this build.
+
+Reads a log written with TRAFFIC_CAPTURE_PATH set. Each captured
+conversation is replayed in its original order on its own worker. Its
+requests start at their original offsets divided by REPLAY_SPEED; with 0
+there are no waits. Conversation and span ids are remapped, so feedback
+lands on the replayed turns.
+
+REPLAY_TARGET=inprocess (the default) runs this build's app in-process
+with fresh session and upload directories. LangGraph's model is replaced
+according to REPLAY_RESPONSES:
+- recorded: returns the reply captured for the same message, after the
+  captured turn time times REPLAY_MODEL_LATENCY.
+- stub: returns a fixed reply immediately.
+- live: uses the configured models.
+Stubbed models make no tool calls, so tools, embeddings and upload
+indexing are not exercised. Trace events are discarded unless
+REPLAY_TRACING=live.
+
+Set REPLAY_TARGET to a base URL to replay against a running server
+instead; its models and tracing are then whatever it is configured with.
+
+Prints latency per endpoint next to the captured latency and appends one
+JSON line to REPLAY_OUTPUT.
+"""
+
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from dotenv import load_dotenv  # noqa: E402
+
+from src.backend.api.traffic import read_blob, read_traffic  # noqa: E402
+
+load_dotenv()
+
+LOG = os.getenv("REPLAY_LOG") or os.getenv("TRAFFIC_CAPTURE_PATH") or "./data/traffic/traffic.jsonl"
+TARGET = os.getenv("REPLAY_TARGET", "inprocess")
+SPEED = float(os.getenv("REPLAY_SPEED", "1"))
+RESPONSES = os.getenv("REPLAY_RESPONSES", "recorded")
+MODEL_LATENCY = float(os.getenv("REPLAY_MODEL_LATENCY", "0"))
+TRACING = os.getenv("REPLAY_TRACING", "noop")
+MAX_CONVERSATIONS = int(os.getenv("REPLAY_MAX_CONVERSATIONS", "32"))
+OUTPUT = os.getenv("REPLAY_OUTPUT", "./data/benchmarks/replay.jsonl")
+STUB_REPLY = "Replayed response."
+
+
+def load_conversations(path: str) -> tuple[list[list[dict[str, Any]]], float]:
+    """Captured requests grouped by conversation, each in start order.
+
+    Feedback carries only a span id, so it joins the conversation of the
+    turn that returned that span.
+    """
+    entries = sorted(read_traffic(path), key=lambda entry: entry["ts"])
+    span_owner = {
+        (entry.get("response") or {}).get("span_id"): entry["conversation_id"]
+        for entry in entries
+        if entry["path"] == "/chat"
+    }
+    conversations: dict[str, list[dict[str, Any]]] = defaultdict(list)
+    for entry in entries:
+        key = entry.get("conversation_id")
+        if entry["path"] == "/feedback":
+            key = span_owner.get((entry.get("request") or {}).get("span_id"))
+        conversations[key or f"orphan-{entry['seq']}"].append(entry)
+    first = entries[0]["ts"] if entries else 0.0
+    return list(conversations.values()), first
+
+
+def recorded_replies(conversations: list[list[dict[str, Any]]]) -> dict[str, deque]:
+    replies: dict[str, deque] = defaultdict(deque)
+    for entries in conversations:
+        for entry in entries:
+            if entry["path"] == "/chat" and entry.get("response"):
+                replies[entry["request"]["message"]].append(
+                    (entry["response"]["assistant_message"], entry["duration_ms"] / 1000)
+                )
+    return replies
+
+
+def install_replay_model(replies: dict[str, deque]) -> None:
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    from src.backend.agent import graph
+
+    lock = threading.Lock()
+
+    class ReplayModel(BaseChatModel):
+        @property
+        def _llm_type(self) -> str:
+            return "replay"
+
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            question = next((str(m.content) for m in reversed(messages) if m.type == "human"), "")
+            reply, seconds = STUB_REPLY, 0.0
+            if RESPONSES == "recorded":
+                with lock:
+                    queue = replies.get(question)
+                    if queue:
+                        reply, seconds = queue.popleft()
+            if seconds and MODEL_LATENCY:
+                time.sleep(seconds * MODEL_LATENCY)
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+    model = ReplayModel()
+    graph._model = lambda model_name=None: model
+
+
+def prepare_inprocess(workdir: str) -> None:
+    os.environ["SESSION_DB_PATH"] = os.path.join(workdir, "sessions.db")
+    os.environ["UPLOADS_DIR"] = os.path.join(workdir, "uploads")
+    # Replayed traffic must not be captured again.
+    os.environ.pop("TRAFFIC_CAPTURE_PATH", None)
+    if RESPONSES != "live":
+        os.environ["AGENT_FRAMEWORK"] = "langgraph"
+        os.environ["RAG_SUMMARY_ON_UPLOAD"] = "false"
+    if TRACING != "live":
+        from braintrust import logger as bt_logger
+        from braintrust.util import LazyValue
+
+        from scripts.benchmark_tracing_overhead import NoopBackgroundLogger
+
+        os.environ["TRACE_SPOOL_ENABLED"] = "false"
+        exporter = NoopBackgroundLogger()
+        bt_logger._state._global_bg_logger = LazyValue(lambda: exporter, use_mutex=False)
+
+
+class Replayer:
+    def __init__(self, client: Any, first_ts: float) -> None:
+        self.client = client
+        self.first_ts = first_ts
+        self.run_id = uuid.uuid4().hex[:8]
+        self.started = 0.0
+        self.spans: dict[str, str] = {}
+        self.results: list[dict[str, Any]] = []
+        self.lock = threading.Lock()
+
+    def _send(self, entry: dict[str, Any], conversation_id: str):
+        request = entry.get("request") or {}
+        if entry["path"] == "/chat":
+            payload = {**request, "conversation_id": conversation_id}
+            return self.client.post("/chat", json=payload)
+        if entry["path"] == "/upload":
+            data = read_blob(LOG, request["sha256"])
+            files = {"file": (request["filename"], data, request.get("content_type") or "application/octet-stream")}
+            return self.client.post("/upload", data={"conversation_id": conversation_id}, files=files)
+        with self.lock:
+            span_id = self.spans.get(request.get("span_id"))
+        if span_id is None:
+            return None
+        return self.client.post("/feedback", json={**request, "span_id": span_id})
+
+    def replay_conversation(self, index: int, entries: list[dict[str, Any]]) -> None:
+        conversation_id = f"replay-{self.run_id}-{index}"
+        for entry in entries:
+            due = time.monotonic()
+            if SPEED > 0:
+                due = self.started + (entry["ts"] - self.first_ts) / SPEED
+                time.sleep(max(0.0, due - time.monotonic()))
+            sent = time.monotonic()
+            try:
+                response = self._send(entry, conversation_id)
+                status = None if response is None else response.status_code
+            except Exception as exc:
+                response, status = None, f"error: {type(exc).__name__}"
+            latency = time.monotonic() - sent
+            if entry["path"] == "/chat" and response is not None and response.status_code == 200:
+                recorded_span = (entry.get("response") or {}).get("span_id")
+                with self.lock:
+                    self.spans[recorded_span] = response.json()["span_id"]
+            with self.lock:
+                self.results.append(
+                    {
+                        "path": entry["path"],
+                        "status": status,
+                        "latency_s": latency,
+                        "lag_s": max(0.0, sent - due),
+                        "recorded_s": entry["duration_ms"] / 1000,
+                    }
+                )
+
+    def run(self, conversations: list[list[dict[str, Any]]]) -> float:
+        slots = threading.BoundedSemaphore(MAX_CONVERSATIONS)
+
+        def worker(index: int, entries: list[dict[str, Any]]) -> None:
+            with slots:
+                self.replay_conversation(index, entries)
+
+        self.started = time.monotonic()
+        threads = [
+            threading.Thread(target=worker, args=(index, entries), daemon=True)
+            for index, entries in enumerate(conversations)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.monotonic() - self.started
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(results: list[dict[str, Any]], wall_s: float) -> dict[str, Any]:
+    summary: dict[str, Any] = {
+        "requests": len(results),
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(len(results) / wall_s, 3) if wall_s else None,
+    }
+    for path in ("/chat", "/upload", "/feedback"):
+        rows = [row for row in results if row["path"] == path and row["status"] is not None]
+        if not rows:
+            continue
+        latencies = [row["latency_s"] for row in rows]
+        recorded = [row["recorded_s"] for row in rows]
+        summary[path] = {
+            "count": len(rows),
+            "errors": sum(not (isinstance(row["status"], int) and row["status"] < 400) for row in rows),
+            "p50_s": round(statistics.median(latencies), 4),
+            "p95_s": round(percentile(latencies, 95), 4),
+            "p99_s": round(percentile(latencies, 99), 4),
+            "recorded_p50_s": round(statistics.median(recorded), 4),
+            "recorded_p95_s": round(percentile(recorded, 95), 4),
+            "max_lag_s": round(max(row["lag_s"] for row in rows), 4),
+        }
+    summary["skipped_feedback"] = sum(row["status"] is None for row in results)
+    return summary
+
+
+def print_summary(summary: dict[str, Any]) -> None:
+    header = f"{'endpoint':<10}{'count':>7}{'errors':>8}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'rec p50':>9}{'rec p95':>9}"
+    print(header)
+    print("-" * len(header))
+    for path in ("/chat", "/upload", "/feedback"):
+        row = summary.get(path)
+        if row is None:
+            continue
+        print(
+            f"{path:<10}{row['count']:>7}{row['errors']:>8}{row['p50_s']:>9.3f}{row['p95_s']:>9.3f}"
+            f"{row['p99_s']:>9.3f}{row['recorded_p50_s']:>9.3f}{row['recorded_p95_s']:>9.3f}"
+        )
+    print(
+        f"{summary['requests']} requests in {summary['wall_s']:.1f}s "
+        f"({summary['throughput_rps']} req/s); feedback skipped: {summary['skipped_feedback']}"
+    )
+
+
+def main() -> None:
+    from scripts.benchmark_tracing_overhead import git_revision
+
+    conversations, first_ts = load_conversations(LOG)
+    if not conversations:
+        print(f"No captured traffic in {LOG}")
+        return
+    with tempfile.TemporaryDirectory(prefix="replay-") as workdir:
+        if TARGET == "inprocess":
+            prepare_inprocess(workdir)
+            if RESPONSES != "live":
+                install_replay_model(recorded_replies(conversations))
+            from fastapi.testclient import TestClient
+
+            from src.backend.main import app
+
+            with TestClient(app) as client:
+                replayer = Replayer(client, first_ts)
+                wall_s = replayer.run(conversations)
+                results = replayer.results
+        else:
+            import httpx
+
+            with httpx.Client(base_url=TARGET, timeout=300) as client:
+                replayer = Replayer(client, first_ts)
+                wall_s = replayer.run(conversations)
+                results = replayer.results
+    summary = summarize(results, wall_s)
+    print_summary(summary)
+
+    os.makedirs(os.path.dirname(OUTPUT) or ".", exist_ok=True)
+    with open(OUTPUT, "a", encoding="utf-8") as handle:
+        record = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "log": LOG,
+            "target": TARGET,
+            "responses": RESPONSES if TARGET == "inprocess" else "server",
+            "speed": SPEED,
+            "model_latency": MODEL_LATENCY,
+            "conversations": len(conversations),
+            "summary": summary,
+        }
+        handle.write(json.dumps(record) + "\n")
+    print(f"appended to {OUTPUT}")
+
+
+if __name__ == "__main__":
+    main()
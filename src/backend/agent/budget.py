@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass, field
+
+from src.backend.agent.types import AgentTurnUsage
+
+FORCED_ANSWER_INSTRUCTION = (
+    "The tool budget for this turn is used up ({reason}). Do not call any more tools. "
+    "Answer now from the information gathered so far, and say briefly what you could not check."
+)
+SKIPPED_TOOL_RESULT = "Not run: the turn budget is exhausted ({reason})."
+
+
+@dataclass
+class TurnBudget:
+    """Per-turn limits; 0 disables a limit.
+
+    ``max_llm_calls`` counts the agent's own calls. When any limit is hit
+    the runtime makes one extra, tool-less call to produce the answer.
+    """
+
+    max_llm_calls: int = 8
+    max_tool_calls: int = 12
+    max_seconds: float = 90.0
+    max_tokens: int = 0
+
+    @classmethod
+    def from_env(cls) -> "TurnBudget":
+        return cls(
+            max_llm_calls=int(os.getenv("AGENT_MAX_LLM_CALLS", "8")),
+            max_tool_calls=int(os.getenv("AGENT_MAX_TOOL_CALLS", "12")),
+            max_seconds=float(os.getenv("AGENT_MAX_TURN_S", "90")),
+            max_tokens=int(os.getenv("AGENT_MAX_TURN_TOKENS", "0")),
+        )
+
+    def check(self, usage: AgentTurnUsage, elapsed_s: float, pending_tool_calls: int = 0) -> str | None:
+        """Name of the first limit that stops further tool use, if any."""
+        if self.max_llm_calls and usage.llm_calls >= self.max_llm_calls:
+            return "llm_calls"
+        if self.max_tool_calls and usage.tool_calls + pending_tool_calls > self.max_tool_calls:
+            return "tool_calls"
+        if self.max_seconds and elapsed_s >= self.max_seconds:
+            return "time"
+        if self.max_tokens and usage.total_tokens >= self.max_tokens:
+            return "tokens"
+        return None
+
+    def as_metadata(self) -> dict[str, float]:
+        return {
+            "max_llm_calls": self.max_llm_calls,
+            "max_tool_calls": self.max_tool_calls,
+            "max_seconds": self.max_seconds,
+            "max_tokens": self.max_tokens,
+        }
+
+
+@dataclass
+class BudgetTracker:
+    """Enforces a budget from inside tools and model hooks, for runtimes
+    whose agent loop is owned by the SDK."""
+
+    budget: TurnBudget
+    usage: AgentTurnUsage = field(default_factory=AgentTurnUsage)
+    started: float = field(default_factory=time.monotonic)
+    exhausted: str | None = None
+
+    def _stop(self, pending_tool_calls: int = 0) -> str | None:
+        reason = self.exhausted or self.budget.check(
+            self.usage, time.monotonic() - self.started, pending_tool_calls
+        )
+        if reason:
+            self.exhausted = reason
+        return reason
+
+    def before_llm_call(self) -> str | None:
+        """Count a model call; a reason means this call must answer without tools."""
+        reason = self._stop()
+        self.usage.llm_calls += 1
+        return reason
+
+    def allow_tool_call(self) -> bool:
+        if self._stop(pending_tool_calls=1):
+            return False
+        self.usage.tool_calls += 1
+        return True
+
+    def refusal(self) -> str:
+        return SKIPPED_TOOL_RESULT.format(reason=self.exhausted)
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Generator, TypeVar
+
+T = TypeVar("T")
+
+
+class TurnCancelled(Exception):
+    def __init__(self, reason: str) -> None:
+        super().__init__(f"turn cancelled: {reason}")
+        self.reason = reason
+
+
+class CancelToken:
+    """Set once, from any thread, to stop the turn it was handed to.
+
+    ``future`` resolves on cancel, so blocking waits can include it in
+    ``concurrent.futures.wait`` instead of polling.
+    """
+
+    def __init__(self) -> None:
+        self.future: Future = Future()
+        self._lock = threading.Lock()
+        self.reason: str | None = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.future.done()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+        self.future.set_result(reason)
+
+    def add_callback(self, fn: Callable[[], Any]) -> None:
+        """Run ``fn`` on cancel (immediately if already cancelled)."""
+        self.future.add_done_callback(lambda _: fn())
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise TurnCancelled(self.reason or "cancelled")
+
+
+_TOKEN: ContextVar[CancelToken | None] = ContextVar("turn_cancel_token", default=None)
+
+
+def current_token() -> CancelToken | None:
+    return _TOKEN.get()
+
+
+def check_cancelled() -> None:
+    token = _TOKEN.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+@contextmanager
+def cancellation_scope(token: CancelToken | None) -> Generator[None, None, None]:
+    """Make ``token`` visible to graph nodes, tools and model calls below."""
+    reset = _TOKEN.set(token)
+    try:
+        yield
+    finally:
+        _TOKEN.reset(reset)
+
+
+async def run_cancellable(awaitable: Awaitable[T]) -> T:
+    """Await ``awaitable`` as a task that the current token can cancel,
+    which also cancels its in-flight HTTP requests and tool coroutines."""
+    token = _TOKEN.get()
+    if token is None:
+        return await awaitable
+    token.raise_if_cancelled()
+    task = asyncio.ensure_future(awaitable)
+    loop = asyncio.get_running_loop()
+
+    def cancel_task() -> None:
+        try:
+            loop.call_soon_threadsafe(task.cancel)
+        except RuntimeError:
+            # The loop already finished with the task.
+            logging.getLogger(__name__).debug("Cancel arrived after the turn's loop closed")
+
+    token.add_callback(cancel_task)
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if token.cancelled:
+            raise TurnCancelled(token.reason or "cancelled") from None
+        raise
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import hashlib
+import re
+
+CHUNKER_VERSION = "cdc-1"
+# A sentence/paragraph unit ends a chunk when its hash is divisible by this,
+# i.e. roughly one unit in BOUNDARY_DIVISOR (once the chunk is long enough).
+BOUNDARY_DIVISOR = 3
+
+_UNIT_END = re.compile(r"(?<=[.!?;:])\s+|\n\s*\n|\n(?=\s*[A-Z0-9]+[.:)]\s)")
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _units(text: str, max_size: int) -> list[str]:
+    units = []
+    start = 0
+    for match in _UNIT_END.finditer(text):
+        units.append(text[start : match.end()])
+        start = match.end()
+    units.append(text[start:])
+    pieces = []
+    for unit in units:
+        while len(unit) > max_size:
+            cut = unit.rfind(" ", 0, max_size)
+            cut = cut + 1 if cut > 0 else max_size
+            pieces.append(unit[:cut])
+            unit = unit[cut:]
+        if unit:
+            pieces.append(unit)
+    return pieces
+
+
+def _is_boundary(unit: str) -> bool:
+    digest = hashlib.blake2b(unit.strip().encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % BOUNDARY_DIVISOR == 0
+
+
+def content_defined_chunks(text: str, min_size: int, max_size: int) -> list[str]:
+    """Split text into chunks whose boundaries depend only on nearby content.
+
+    Text is cut into sentence/paragraph units, and a chunk ends after a unit
+    whose own hash selects it as a boundary (or when the next unit would
+    overflow ``max_size``). An edit therefore only changes the chunks around
+    it; boundaries resynchronise at the next selected unit, so a revised
+    transcript shares almost all of its chunks with the original.
+    """
+    chunks: list[str] = []
+    current = ""
+    for unit in _units(text, max_size):
+        if current and len(current) + len(unit) > max_size:
+            chunks.append(current)
+            current = ""
+        current += unit
+        if len(current) >= min_size and _is_boundary(unit):
+            chunks.append(current)
+            current = ""
+    if current.strip():
+        chunks.append(current)
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
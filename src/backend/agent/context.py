@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Sequence, TypeVar
+
+from src.backend.agent.memory import CacheEntry, mb_env, register_cache
+
+M = TypeVar("M")
+
+SUMMARY_PREFIX = "Summary of the earlier conversation (older turns were condensed):"
+
+
+@dataclass
+class ContextBudget:
+    max_tokens: int
+    recent_messages: int
+    summary_tokens: int
+
+
+def _parse_budgets(raw: str) -> dict[str, int]:
+    budgets: dict[str, int] = {}
+    for entry in raw.split(","):
+        if "=" not in entry:
+            continue
+        model, value = entry.split("=", 1)
+        budgets[model.strip()] = int(value)
+    return budgets
+
+
+def resolve_budget(model_name: str | None) -> ContextBudget:
+    budgets = _parse_budgets(os.getenv("CONTEXT_TOKEN_BUDGETS", ""))
+    default = int(os.getenv("CONTEXT_TOKEN_BUDGET", "16000"))
+    max_tokens = budgets.get(model_name or "", default)
+    return ContextBudget(
+        max_tokens=max_tokens,
+        recent_messages=int(os.getenv("CONTEXT_RECENT_MESSAGES", "6")),
+        summary_tokens=int(os.getenv("CONTEXT_SUMMARY_TOKENS", str(max_tokens // 8))),
+    )
+
+
+@lru_cache(maxsize=8)
+def _encoding(model_name: str | None):
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model_name or "")
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # No tokenizer (or its BPE file) available; fall back to an estimate.
+        return None
+
+
+def count_tokens(text: str, model_name: str | None = None) -> int:
+    encoding = _encoding(model_name)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def summarize_with_llm(previous_summary: str, transcript: str) -> str:
+    from langchain.chat_models import init_chat_model
+
+    model = init_chat_model(
+        os.getenv("CONTEXT_SUMMARY_MODEL") or os.getenv("DEFAULT_LLM_MODEL", "gpt-4o-mini"),
+        temperature=0,
+    )
+    response = model.invoke(
+        [
+            {
+                "role": "system",
+                "content": (
+                    "You maintain a running summary of a deposition review conversation. "
+                    "Fold the new messages into the existing summary. Keep names, dates, "
+                    "document references and open questions. Reply with the summary only."
+                ),
+            },
+            {
+                "role": "user",
+                "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}",
+            },
+        ]
+    )
+    return str(response.content).strip()
+
+
+@dataclass
+class _SummaryState:
+    covered: int = 0
+    fingerprint: str = ""
+    summary: str = ""
+    pending: Future | None = None
+
+
+class ContextManager:
+    """Decides which messages are sent to the model for a single call."""
+
+    def fit_messages(
+        self,
+        key: str,
+        messages: Sequence[M],
+        *,
+        model_name: str | None,
+        role_of: Callable[[M], str],
+        text_of: Callable[[M], str],
+    ) -> tuple[str | None, list[M]]:
+        return None, list(messages)
+
+
+class RollingSummaryContextManager(ContextManager):
+    """Keeps a token-budgeted recent window verbatim and folds older turns
+    into a per-conversation summary that is refreshed in the background."""
+
+    def __init__(
+        self,
+        summarizer: Callable[[str, str], str] = summarize_with_llm,
+        token_counter: Callable[[str, str | None], int] = count_tokens,
+        max_conversations: int = 1024,
+        executor: ThreadPoolExecutor | None = None,
+    ) -> None:
+        self._summarizer = summarizer
+        self._count = token_counter
+        self._max_conversations = max_conversations
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="context-summary"
+        )
+        self._states: OrderedDict[str, _SummaryState] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _state(self, key: str) -> _SummaryState:
+        with self._lock:
+            state = self._states.pop(key, None) or _SummaryState()
+            self._states[key] = state
+            while len(self._states) > self._max_conversations:
+                self._states.popitem(last=False)
+            return state
+
+    def cache_entries(self, measure: bool = True) -> list[CacheEntry]:
+        with self._lock:
+            items = [(key, state.summary) for key, state in self._states.items()]
+        # The summary text is what grows; the rest of a state is fixed-size.
+        return [
+            CacheEntry(key=key, bytes=len(summary.encode("utf-8")) if measure else None, conversation_id=key)
+            for key, summary in items
+        ]
+
+    def forget(self, key: str) -> bool:
+        with self._lock:
+            return self._states.pop(key, None) is not None
+
+    @staticmethod
+    def _fingerprint(rendered: list[str], upto: int) -> str:
+        return hashlib.sha1("\x1e".join(rendered[:upto]).encode("utf-8")).hexdigest()
+
+    def _schedule_fold(
+        self, state: _SummaryState, rendered: list[str], start: int, end: int
+    ) -> None:
+        if state.pending is not None and not state.pending.done():
+            return
+        previous = state.summary
+        transcript = "\n".join(rendered[start:end])
+        fingerprint = self._fingerprint(rendered, end)
+
+        def fold() -> None:
+            try:
+                summary = self._summarizer(previous, transcript)
+            except Exception:
+                logging.getLogger(__name__).exception("Context summary refresh failed")
+                return
+            with self._lock:
+                state.summary = summary
+                state.covered = end
+                state.fingerprint = fingerprint
+
+        state.pending = self._executor.submit(fold)
+
+    def fit_messages(
+        self,
+        key: str,
+        messages: Sequence[M],
+        *,
+        model_name: str | None,
+        role_of: Callable[[M], str],
+        text_of: Callable[[M], str],
+    ) -> tuple[str | None, list[M]]:
+        budget = resolve_budget(model_name)
+        roles = [role_of(message) for message in messages]
+        rendered = [f"{role}: {text_of(message)}" for role, message in zip(roles, messages)]
+        costs = [self._count(text, model_name) for text in rendered]
+        pinned = [i for i, role in enumerate(roles) if role == "system"]
+        pinned_cost = sum(costs[i] for i in pinned)
+        if sum(costs) <= budget.max_tokens:
+            return None, list(messages)
+
+        # Walk back from the newest message, only cutting in front of a user
+        # message so tool calls stay next to their results.
+        window = budget.max_tokens - budget.summary_tokens - pinned_cost
+        start = len(messages)
+        used = 0
+        for index in range(len(messages) - 1, -1, -1):
+            if roles[index] != "system":
+                used += costs[index]
+            kept = len(messages) - index
+            if used > window and kept > budget.recent_messages:
+                break
+            if roles[index] == "user":
+                start = index
+        if start == len(messages) or start == 0:
+            return None, list(messages)
+
+        state = self._state(key)
+        with self._lock:
+            if state.covered > len(messages) or state.fingerprint != self._fingerprint(
+                rendered, state.covered
+            ):
+                state.covered, state.summary = 0, ""
+                state.fingerprint = self._fingerprint(rendered, 0)
+            covered, summary = state.covered, state.summary
+        if covered < start:
+            self._schedule_fold(state, rendered, covered, start)
+            # Until the refreshed summary lands, carry a clipped excerpt of the
+            # turns it will cover instead of blocking on the summarizer.
+            base = summary
+            excerpt = [
+                line[:200] for line in rendered[covered:start] if not line.startswith("system:")
+            ]
+            summary = "\n".join(filter(None, [base, *excerpt]))
+            while excerpt and self._count(summary, model_name) > budget.summary_tokens:
+                excerpt.pop(0)
+                summary = "\n".join(filter(None, [base, *excerpt]))
+        else:
+            start = covered
+
+        kept_messages = [messages[i] for i in pinned if i < start] + list(messages[start:])
+        if not summary:
+            return None, kept_messages
+        return f"{SUMMARY_PREFIX}\n{summary}", kept_messages
+
+
+_MANAGER: ContextManager | None = None
+
+
+def get_context_manager() -> ContextManager:
+    global _MANAGER
+    if _MANAGER is None:
+        selected = os.getenv("CONTEXT_MANAGER", "rolling_summary").strip().lower()
+        if selected == "none":
+            _MANAGER = ContextManager()
+        elif selected == "rolling_summary":
+            manager = RollingSummaryContextManager(
+                max_conversations=int(os.getenv("CONTEXT_MAX_CONVERSATIONS", "1024"))
+            )
+            register_cache(
+                "context_summaries",
+                manager.cache_entries,
+                manager.forget,
+                max_entries=manager._max_conversations,
+                max_bytes=mb_env("CONTEXT_SUMMARIES_MB"),
+            )
+            _MANAGER = manager
+        else:
+            raise ValueError("CONTEXT_MANAGER must be one of: rolling_summary, none")
+    return _MANAGER
+
+
+def set_context_manager(manager: ContextManager | None) -> None:
+    global _MANAGER
+    _MANAGER = manager
+
+
+def message_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(
+            part.get("text", "") if isinstance(part, dict) else str(part) for part in content
+        )
+    return str(content)
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Sequence
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class EmbeddingBuildError(RuntimeError):
+    """Raised when a batch keeps failing; completed batches stay checkpointed."""
+
+
+def _status_code(exc: BaseException) -> int | None:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after(exc: BaseException) -> float | None:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return type(exc).__name__ in {"APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout"}
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute token buckets whose rate is
+    halved on every 429 and recovers gradually on success (AIMD)."""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float) -> None:
+        self.max_rpm = requests_per_minute
+        self.max_tpm = tokens_per_minute
+        self._scale = 1.0
+        self._request_allowance = 1.0
+        self._token_allowance = float(tokens_per_minute) / 60
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.granted = 0
+        self.penalties = 0
+
+    @property
+    def scale(self) -> float:
+        with self._lock:
+            return self._scale
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        rpm, tpm = self.max_rpm * self._scale, self.max_tpm * self._scale
+        # Cap bursts at one second's worth (at least one request/batch).
+        self._request_allowance = min(
+            max(rpm / 60, 1.0), self._request_allowance + elapsed * rpm / 60
+        )
+        self._token_allowance = min(
+            max(tpm / 60, 1.0), self._token_allowance + elapsed * tpm / 60
+        )
+
+    def acquire(self, tokens: int) -> None:
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                token_cap = max(self.max_tpm * self._scale / 60, 1.0)
+                needed_tokens = min(tokens, token_cap)
+                if self._request_allowance >= 1 and self._token_allowance >= needed_tokens:
+                    self._request_allowance -= 1
+                    self._token_allowance -= needed_tokens
+                    self.granted += 1
+                    return
+                rpm, tpm = self.max_rpm * self._scale, self.max_tpm * self._scale
+                wait_requests = (1 - self._request_allowance) * 60 / rpm
+                wait_tokens = (needed_tokens - self._token_allowance) * 60 / tpm
+                delay = max(wait_requests, wait_tokens, 0.005)
+            time.sleep(min(delay, 5.0))
+
+    def penalize(self) -> None:
+        with self._lock:
+            self._scale = max(self._scale / 2, 0.05)
+            self.penalties += 1
+
+    def reward(self) -> None:
+        with self._lock:
+            self._scale = min(self._scale + 0.05, 1.0)
+
+
+@dataclass
+class BatcherConfig:
+    batch_size: int = 128
+    concurrency: int = 4
+    requests_per_minute: float = 3000
+    tokens_per_minute: float = 1_000_000
+    max_retries: int = 6
+    base_backoff_s: float = 1.0
+    max_backoff_s: float = 60.0
+
+    @classmethod
+    def from_env(cls) -> "BatcherConfig":
+        return cls(
+            batch_size=int(os.getenv("RAG_EMBED_BATCH_SIZE", "128")),
+            concurrency=int(os.getenv("RAG_EMBED_CONCURRENCY", "4")),
+            requests_per_minute=float(os.getenv("RAG_EMBED_RPM", "3000")),
+            tokens_per_minute=float(os.getenv("RAG_EMBED_TPM", "1000000")),
+            max_retries=int(os.getenv("RAG_EMBED_MAX_RETRIES", "6")),
+        )
+
+
+class EmbeddingBatcher:
+    """Embeds texts in concurrent batches under an RPM/TPM budget.
+
+    Each finished batch is handed to ``on_batch`` (so vectors reach the index
+    as they arrive) and, when ``checkpoint_dir`` is set, saved to disk so a
+    rerun after a failure only embeds the batches that are still missing.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[list[str]], list[list[float]]],
+        config: BatcherConfig | None = None,
+        token_counter: Callable[[str], int] = estimate_tokens,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.embed_batch = embed_batch
+        self.config = config or BatcherConfig.from_env()
+        self.token_counter = token_counter
+        self.sleep = sleep
+        self.limiter = RateLimiter(self.config.requests_per_minute, self.config.tokens_per_minute)
+
+    # Counted by the limiter under its lock, as batches run on several threads.
+    @property
+    def requests(self) -> int:
+        return self.limiter.granted
+
+    @property
+    def rate_limited(self) -> int:
+        return self.limiter.penalties
+
+    @staticmethod
+    def _checkpoint_path(checkpoint_dir: str, number: int) -> str:
+        return os.path.join(checkpoint_dir, f"batch-{number:06d}.npy")
+
+    def _embed_with_retry(self, texts: list[str]) -> Any:
+        import numpy as np
+
+        tokens = sum(self.token_counter(text) for text in texts)
+        attempt = 0
+        while True:
+            self.limiter.acquire(tokens)
+            try:
+                vectors = np.asarray(self.embed_batch(texts), dtype="float32")
+            except Exception as exc:
+                if not _is_retryable(exc) or attempt >= self.config.max_retries:
+                    raise
+                attempt += 1
+                delay = min(self.config.max_backoff_s, self.config.base_backoff_s * 2 ** (attempt - 1))
+                delay = delay * (0.5 + random.random() / 2)
+                if _status_code(exc) == 429:
+                    self.limiter.penalize()
+                    delay = max(delay, _retry_after(exc) or 0)
+                logging.getLogger(__name__).warning(
+                    "Embedding batch failed status=%s attempt=%s retry_in=%.2fs",
+                    _status_code(exc),
+                    attempt,
+                    delay,
+                )
+                self.sleep(delay)
+                continue
+            self.limiter.reward()
+            return vectors
+
+    def embed(
+        self,
+        texts: Sequence[str],
+        on_batch: Callable[[int, Any], None] | None = None,
+        checkpoint_dir: str | None = None,
+    ) -> Any:
+        import numpy as np
+
+        size = self.config.batch_size
+        starts = list(range(0, len(texts), size))
+        results: dict[int, Any] = {}
+        pending: list[int] = []
+        if checkpoint_dir:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+        for number, start in enumerate(starts):
+            path = self._checkpoint_path(checkpoint_dir, number) if checkpoint_dir else None
+            if path and os.path.exists(path):
+                results[number] = np.load(path)
+                if on_batch is not None:
+                    on_batch(start, results[number])
+            else:
+                pending.append(number)
+
+        def run(number: int) -> Any:
+            start = starts[number]
+            vectors = self._embed_with_retry(list(texts[start : start + size]))
+            if checkpoint_dir:
+                path = self._checkpoint_path(checkpoint_dir, number)
+                np.save(f"{path}.tmp.npy", vectors)
+                os.replace(f"{path}.tmp.npy", path)
+            return vectors
+
+        failures: list[BaseException] = []
+        with ThreadPoolExecutor(
+            max_workers=max(1, self.config.concurrency), thread_name_prefix="embed"
+        ) as pool:
+            futures = {pool.submit(run, number): number for number in pending}
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    number = futures.pop(future)
+                    try:
+                        results[number] = future.result()
+                    except Exception as exc:
+                        failures.append(exc)
+                        for queued in futures:
+                            queued.cancel()
+                        continue
+                    if on_batch is not None:
+                        on_batch(starts[number], results[number])
+        if failures:
+            raise EmbeddingBuildError(
+                f"{len(failures)} embedding batch(es) failed; "
+                f"{len(results)}/{len(starts)} batches are checkpointed"
+            ) from failures[0]
+        if not results:
+            return np.zeros((0, 0), dtype="float32")
+        return np.concatenate([results[number] for number in range(len(starts))])
@@ -2,17 +2,26 @@ from __future__ import annotations
 
 import asyncio
 import os
+from contextvars import ContextVar
 from datetime import datetime, timezone
 from typing import Any
 
+from src.backend.agent.budget import FORCED_ANSWER_INSTRUCTION, BudgetTracker, TurnBudget
+from src.backend.agent.cancellation import run_cancellable
+from src.backend.agent.context import get_context_manager
+from src.backend.agent.memory import CacheEntry, approx_size, mb_env, register_cache, trim_cache
 from src.backend.agent.prompts import build_summarizer_prompt
+from src.backend.agent.resilience import call_with_resilience_async
 from src.backend.agent.tools import rag_tool, web_search_tool
-from src.backend.agent.types import AgentTurnResult
+from src.backend.agent.types import AgentTurnResult, AgentTurnUsage
 
 _APP_NAME = "rev-langgraph-example"
 _ADK_SESSION_SERVICE = None
 _ADK_RUNNERS: dict[str, Any] = {}
 _ADK_SESSIONS_CREATED: set[tuple[str, str]] = set()
+_DOCUMENT_PATHS: ContextVar[tuple[str, ...]] = ContextVar("adk_document_paths", default=())
+_CONVERSATION_ID: ContextVar[str] = ContextVar("adk_conversation_id", default="default")
+_BUDGET: ContextVar[BudgetTracker | None] = ContextVar("adk_turn_budget", default=None)
 
 
 def _google_adk_imports():
@@ -62,36 +71,180 @@ def _extract_text_from_event(event: Any) -> str | None:
     return None
 
 
-async def _run_once(
-    *,
-    conversation_id: str,
-    thread_id: str,
-    user_message: str,
-    document_path: str | None,
-    model_name: str | None,
-) -> str:
-    global _ADK_SESSION_SERVICE
-    LlmAgent, Runner, InMemorySessionService, genai_types = _google_adk_imports()
+def _record_event_usage(event: Any, usage: AgentTurnUsage) -> None:
+    token_usage = getattr(event, "usage_metadata", None)
+    if token_usage is not None:
+        usage.llm_calls += 1
+        usage.prompt_tokens += getattr(token_usage, "prompt_token_count", 0) or 0
+        usage.completion_tokens += getattr(token_usage, "candidates_token_count", 0) or 0
+    get_function_calls = getattr(event, "get_function_calls", None)
+    if callable(get_function_calls):
+        usage.tool_calls += len(get_function_calls() or [])
+
+
+def rag_search(query: str, mode: str = "chunks") -> str:
+    """Search uploaded deposition or local documents for relevant context.
+
+    Use mode="summary" for whole-document questions (overall summary, key
+    events, timeline) to get precomputed document and section summaries
+    instead of the few best-matching passages.
+    """
+    tracker = _BUDGET.get()
+    if tracker is not None and not tracker.allow_tool_call():
+        return tracker.refusal()
+    return rag_tool(query, document_paths=list(_DOCUMENT_PATHS.get()), mode=mode)
+
+
+def web_search(query: str) -> str:
+    """Search the web for relevant context."""
+    tracker = _BUDGET.get()
+    if tracker is not None and not tracker.allow_tool_call():
+        return tracker.refusal()
+    return web_search_tool(query)
+
+
+def _content_role(content: Any) -> str:
+    parts = getattr(content, "parts", None) or []
+    if any(getattr(part, "function_response", None) for part in parts):
+        return "tool"
+    return "assistant" if getattr(content, "role", None) == "model" else "user"
+
+
+def _content_text(content: Any) -> str:
+    texts = []
+    for part in getattr(content, "parts", None) or []:
+        for attr in ("text", "function_call", "function_response"):
+            value = getattr(part, attr, None)
+            if value:
+                texts.append(value if isinstance(value, str) else str(value))
+    return "\n".join(texts)
+
+
+def _fit_context(callback_context: Any, llm_request: Any) -> None:
+    # InMemorySessionService replays every stored event; trim before each call.
+    _ = callback_context
+    summary, kept = get_context_manager().fit_messages(
+        _CONVERSATION_ID.get(),
+        list(llm_request.contents or []),
+        model_name=getattr(llm_request, "model", None),
+        role_of=_content_role,
+        text_of=_content_text,
+    )
+    llm_request.contents = kept
+    if summary:
+        llm_request.append_instructions([summary])
+    tracker = _BUDGET.get()
+    reason = tracker.before_llm_call() if tracker is not None else None
+    if reason:
+        # Budget exhausted: this call has to answer without tools.
+        llm_request.tools_dict.clear()
+        if getattr(llm_request, "config", None) is not None:
+            llm_request.config.tools = None
+        llm_request.append_instructions([FORCED_ANSWER_INSTRUCTION.format(reason=reason)])
+    return None
+
+
+def _resolve_model(model_name: str | None) -> str:
+    return model_name or os.getenv("GOOGLE_ADK_MODEL", "gemini-2.0-flash")
+
+
+def _resilient_llm(model: str):
+    """Gemini with attempt timeouts, retries and hedging around each
+    non-streaming response. Other model strings are left to ADK's registry."""
+    if not model.startswith("gemini"):
+        return model
+    from google.adk.models import Gemini
+
+    class ResilientGemini(Gemini):
+        async def generate_content_async(self, llm_request, stream: bool = False):
+            if stream:
+                async for response in super().generate_content_async(llm_request, stream=True):
+                    yield response
+                return
+
+            async def attempt():
+                # The request is mutated while it is sent; give each attempt its own.
+                request = llm_request.model_copy(deep=True)
+                return [response async for response in Gemini.generate_content_async(self, request)]
 
-    def rag_search(query: str) -> str:
-        """Search uploaded deposition or local documents for relevant context."""
-        return rag_tool(query, document_path=document_path)
+            for response in await call_with_resilience_async(attempt, key=self.model):
+                yield response
 
-    def web_search(query: str) -> str:
-        """Search the web for relevant context."""
-        return web_search_tool(query)
+    return ResilientGemini(model=model)
 
-    model = model_name or os.getenv("GOOGLE_ADK_MODEL", "gemini-2.0-flash")
+
+def _session_entries(measure: bool) -> list[CacheEntry]:
+    # InMemorySessionService keeps every session's events until deleted.
+    sessions = getattr(_ADK_SESSION_SERVICE, "sessions", None) or {}
+    found = []
+    for user_id, by_id in list(sessions.get(_APP_NAME, {}).items()):
+        for session_id, session in list(by_id.items()):
+            entry = CacheEntry(
+                key=f"{user_id}/{session_id}",
+                bytes=approx_size(session) if measure else None,
+                conversation_id=user_id,
+            )
+            found.append((getattr(session, "last_update_time", 0.0) or 0.0, entry))
+    found.sort(key=lambda item: item[0])
+    return [entry for _, entry in found]
+
+
+def _evict_session(key: str) -> bool:
+    """Drop a session's events; its next turn starts a fresh ADK session."""
+    user_id, session_id = key.rsplit("/", 1)
+    sessions = getattr(_ADK_SESSION_SERVICE, "sessions", None) or {}
+    by_id = sessions.get(_APP_NAME, {}).get(user_id, {})
+    removed = by_id.pop(session_id, None) is not None
+    if not by_id:
+        sessions.get(_APP_NAME, {}).pop(user_id, None)
+    _ADK_SESSIONS_CREATED.discard((user_id, session_id))
+    return removed
+
+
+def _runner_entries(measure: bool) -> list[CacheEntry]:
+    exclude = (_ADK_SESSION_SERVICE,) if _ADK_SESSION_SERVICE is not None else ()
+    return [
+        CacheEntry(key=model, bytes=approx_size(runner, exclude=exclude) if measure else None)
+        for model, runner in list(_ADK_RUNNERS.items())
+    ]
+
+
+def _evict_runner(model: str) -> bool:
+    return _ADK_RUNNERS.pop(model, None) is not None
+
+
+register_cache(
+    "adk_sessions",
+    _session_entries,
+    _evict_session,
+    max_entries=int(os.getenv("ADK_MAX_SESSIONS", "1000")),
+    max_bytes=mb_env("ADK_SESSIONS_MB", "256"),
+)
+register_cache(
+    "adk_runners", _runner_entries, _evict_runner, max_entries=int(os.getenv("ADK_MAX_RUNNERS", "8"))
+)
+
+
+def get_runner(model_name: str | None = None):
+    global _ADK_SESSION_SERVICE
+    LlmAgent, Runner, InMemorySessionService, _ = _google_adk_imports()
+    model = _resolve_model(model_name)
     if _ADK_SESSION_SERVICE is None:
         _ADK_SESSION_SERVICE = InMemorySessionService()
 
-    runner = _ADK_RUNNERS.get(model)
-    if runner is None:
+    # Most recently used last, which is the order the runner cap evicts in.
+    runner = _ADK_RUNNERS.pop(model, None)
+    if runner is not None:
+        _ADK_RUNNERS[model] = runner
+    else:
+        # Runners are cached per model and shared across conversations, so the
+        # tools read the turn's document from a context variable.
         agent = LlmAgent(
             name="rev_assistant_google_adk",
-            model=model,
+            model=_resilient_llm(model),
             instruction=_instructions(),
             tools=[rag_search, web_search],
+            before_model_callback=_fit_context,
         )
         runner = Runner(
             app_name=_APP_NAME,
@@ -99,6 +252,28 @@ async def _run_once(
             session_service=_ADK_SESSION_SERVICE,
         )
         _ADK_RUNNERS[model] = runner
+        trim_cache("adk_runners", measure=False)
+    return runner
+
+
+async def _run_once(
+    *,
+    conversation_id: str,
+    thread_id: str,
+    user_message: str,
+    document_paths: list[str],
+    model_name: str | None,
+    budget: TurnBudget,
+) -> tuple[str, AgentTurnUsage, str | None]:
+    _, _, _, genai_types = _google_adk_imports()
+    from google.adk.agents.invocation_context import LlmCallsLimitExceededError
+    from google.adk.agents.run_config import RunConfig
+
+    runner = get_runner(model_name)
+    tracker = BudgetTracker(budget)
+    _DOCUMENT_PATHS.set(tuple(document_paths))
+    _CONVERSATION_ID.set(conversation_id)
+    _BUDGET.set(tracker)
 
     user_id = conversation_id
     session_id = thread_id
@@ -113,6 +288,10 @@ async def _run_once(
             await maybe_coro
         _ADK_SESSIONS_CREATED.add(key)
 
+    run_config = RunConfig()
+    if budget.max_llm_calls:
+        # Hard stop one call after the forced answer should have happened.
+        run_config.max_llm_calls = budget.max_llm_calls + 1
     maybe_events = runner.run_async(
         user_id=user_id,
         session_id=session_id,
@@ -120,13 +299,24 @@ async def _run_once(
             role="user",
             parts=[genai_types.Part.from_text(text=user_message)],
         ),
+        run_config=run_config,
     )
     final_text = ""
-    async for event in maybe_events:
-        text = _extract_text_from_event(event)
-        if text:
-            final_text = text
-    return final_text.strip() or "I could not produce a response."
+    usage = AgentTurnUsage()
+    try:
+        async for event in maybe_events:
+            _record_event_usage(event, usage)
+            tracker.usage.prompt_tokens = usage.prompt_tokens
+            tracker.usage.completion_tokens = usage.completion_tokens
+            text = _extract_text_from_event(event)
+            if text:
+                final_text = text
+    except LlmCallsLimitExceededError:
+        tracker.exhausted = tracker.exhausted or "llm_calls"
+    # The count cap is cheap to hold after every turn; the byte cap is
+    # enforced by the janitor.
+    trim_cache("adk_sessions", measure=False)
+    return final_text.strip() or "I could not produce a response.", usage, tracker.exhausted
 
 
 def run_google_adk_agent(
@@ -134,16 +324,22 @@ def run_google_adk_agent(
     conversation_id: str,
     thread_id: str,
     user_message: str,
-    document_path: str | None,
+    document_paths: list[str],
     model_name: str | None = None,
+    budget: TurnBudget | None = None,
 ) -> AgentTurnResult:
-    message = asyncio.run(
-        _run_once(
-            conversation_id=conversation_id,
-            thread_id=thread_id,
-            user_message=user_message,
-            document_path=document_path,
-            model_name=model_name,
+    message, usage, exhausted = asyncio.run(
+        run_cancellable(
+            _run_once(
+                conversation_id=conversation_id,
+                thread_id=thread_id,
+                user_message=user_message,
+                document_paths=document_paths,
+                model_name=model_name,
+                budget=budget or TurnBudget.from_env(),
+            )
         )
     )
-    return AgentTurnResult(assistant_message=message, raw_state=None)
+    return AgentTurnResult(
+        assistant_message=message, raw_state=None, usage=usage, budget_exhausted=exhausted
+    )
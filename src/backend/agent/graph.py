@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import operator
 import os
+import time
 from datetime import datetime, timezone
 from functools import lru_cache
 from typing import Any, List, TypedDict, cast
@@ -13,25 +14,52 @@ from langchain.chat_models import init_chat_model
 from langchain.tools import tool
 from langgraph.graph import END, START, StateGraph
 
+from src.backend.agent.budget import FORCED_ANSWER_INSTRUCTION, SKIPPED_TOOL_RESULT, TurnBudget
+from src.backend.agent.cancellation import check_cancelled
+from src.backend.agent.context import get_context_manager, message_text
+from src.backend.agent.llm_cache import get_llm_cache
+from src.backend.agent.memory import CacheEntry, approx_size, register_cache
 from src.backend.agent.prompts import build_summarizer_prompt
+from src.backend.agent.rag import document_label
+from src.backend.agent.resilience import call_with_resilience, client_timeouts
 from src.backend.agent.tools import rag_tool, web_search_tool
+from src.backend.agent.types import AgentTurnUsage
 
 
 class MessagesState(TypedDict):
     messages: Annotated[List[AnyMessage], operator.add]
     llm_calls: int
-    document_path: str | None
+    document_paths: List[str]
+    started_at: float
+    budget_exhausted: str | None
+
+
+def _model_key(model_name: str | None = None) -> str:
+    return model_name or os.getenv("DEFAULT_LLM_MODEL", "gpt-4o-mini")
 
 
 def _model(model_name: str | None = None):
-    selected = model_name or os.getenv("DEFAULT_LLM_MODEL", "gpt-4o-mini")
-    return init_chat_model(selected, temperature=0)
+    return _chat_model(_model_key(model_name))
+
+
+@lru_cache(maxsize=8)
+def _chat_model(selected: str):
+    # Reuse the client (and its HTTP connection pool) across turns.
+    cache = get_llm_cache()
+    if cache is None:
+        return init_chat_model(selected, temperature=0, **client_timeouts())
+    return init_chat_model(selected, temperature=0, cache=cache, **client_timeouts())
 
 
 @tool("rag_search")
-def rag_search(query: str, document_path: str | None = None) -> str:
-    """Search uploaded deposition or local documents for relevant context."""
-    return rag_tool(query, document_path=document_path)
+def rag_search(query: str, mode: str = "chunks", document_paths: List[str] | None = None) -> str:
+    """Search uploaded deposition or local documents for relevant context.
+
+    Use mode="summary" for whole-document questions (overall summary, key
+    events, timeline) to get precomputed document and section summaries
+    instead of the few best-matching passages.
+    """
+    return rag_tool(query, document_paths=document_paths, mode=mode)
 
 
 @tool("web_search")
@@ -60,16 +88,88 @@ def system_prompt() -> str:
     return f"{base}\n\nToday is {today} (UTC)."
 
 
-def llm_call(state: MessagesState, config: RunnableConfig | None = None) -> dict:
+_ROLES = {"human": "user", "ai": "assistant", "tool": "tool", "system": "system"}
+
+
+def _fit_context(messages: List[AnyMessage], key: str, model_name: str | None) -> List[AnyMessage]:
+    summary, kept = get_context_manager().fit_messages(
+        key,
+        messages,
+        model_name=model_name or os.getenv("DEFAULT_LLM_MODEL", "gpt-4o-mini"),
+        role_of=lambda message: _ROLES.get(message.type, message.type),
+        text_of=lambda message: message_text(message.content),
+    )
+    if summary:
+        return [SystemMessage(content=summary)] + kept
+    return kept
+
+
+def usage_from_state(state: dict[str, Any]) -> AgentTurnUsage:
+    usage = AgentTurnUsage(llm_calls=state.get("llm_calls", 0))
+    for message in state.get("messages", []):
+        # Results final_answer fills in for calls it did not run are not tool calls.
+        if getattr(message, "type", None) == "tool" and not message.additional_kwargs.get("skipped"):
+            usage.tool_calls += 1
+        token_usage = getattr(message, "usage_metadata", None) or {}
+        usage.prompt_tokens += token_usage.get("input_tokens", 0)
+        usage.completion_tokens += token_usage.get("output_tokens", 0)
+    return usage
+
+
+def _call_settings(config: RunnableConfig | None) -> tuple[str | None, str, TurnBudget]:
     model_name = None
+    thread_id = "default"
+    budget = None
     if config:
         model_name = (config.get("metadata") or {}).get("model_name")
+        configurable = config.get("configurable") or {}
+        thread_id = configurable.get("thread_id") or thread_id
+        budget = configurable.get("turn_budget")
+    return model_name, thread_id, budget or TurnBudget.from_env()
+
+
+def llm_call(state: MessagesState, config: RunnableConfig) -> dict:
+    check_cancelled()
+    model_name, thread_id, budget = _call_settings(config)
     model = _model(model_name).bind_tools(TOOLS)
-    response = model.invoke(
-        [SystemMessage(content=system_prompt())] + state["messages"]
+    messages = [SystemMessage(content=system_prompt())] + _fit_context(state["messages"], thread_id, model_name)
+    response = call_with_resilience(lambda: model.invoke(messages), key=_model_key(model_name))
+    update: dict[str, Any] = {
+        "messages": [response],
+        "llm_calls": state.get("llm_calls", 0) + 1,
+    }
+    pending = len(getattr(response, "tool_calls", None) or [])
+    if pending:
+        # Checked before the tools run, so an exhausted turn skips them.
+        usage = usage_from_state({"messages": state["messages"] + [response], "llm_calls": update["llm_calls"]})
+        elapsed = time.monotonic() - state.get("started_at", time.monotonic())
+        update["budget_exhausted"] = budget.check(usage, elapsed, pending_tool_calls=pending)
+    return update
+
+
+def final_answer(state: MessagesState, config: RunnableConfig) -> dict:
+    """One tool-less call once the turn budget is exhausted."""
+    check_cancelled()
+    model_name, thread_id, _ = _call_settings(config)
+    reason = state.get("budget_exhausted")
+    # Every tool call needs a result before the model is called again.
+    skipped = [
+        ToolMessage(
+            content=SKIPPED_TOOL_RESULT.format(reason=reason),
+            tool_call_id=tool_call.get("id"),
+            additional_kwargs={"skipped": True},
+        )
+        for tool_call in getattr(state["messages"][-1], "tool_calls", None) or []
+    ]
+    model = _model(model_name).bind_tools(TOOLS, tool_choice="none")
+    messages = (
+        [SystemMessage(content=system_prompt())]
+        + _fit_context(state["messages"] + skipped, thread_id, model_name)
+        + [SystemMessage(content=FORCED_ANSWER_INSTRUCTION.format(reason=reason))]
     )
+    response = call_with_resilience(lambda: model.invoke(messages), key=_model_key(model_name))
     return {
-        "messages": [response],
+        "messages": skipped + [response],
         "llm_calls": state.get("llm_calls", 0) + 1,
     }
 
@@ -79,10 +179,11 @@ def tool_node(state: MessagesState) -> dict:
     last_message = state["messages"][-1]
     tool_calls = getattr(last_message, "tool_calls", None) or []
     for tool_call in tool_calls:
+        check_cancelled()
         name = tool_call.get("name")
         args = tool_call.get("args", {}) or {}
         if name == "rag_search":
-            args = {**args, "document_path": state.get("document_path")}
+            args = {**args, "document_paths": state.get("document_paths") or []}
         tool_fn = TOOLS_BY_NAME.get(name)
         if tool_fn is None:
             output = f"Unknown tool: {name}"
@@ -95,6 +196,8 @@ def tool_node(state: MessagesState) -> dict:
 
 
 def should_continue(state: MessagesState) -> str:
+    if state.get("budget_exhausted"):
+        return "final_answer"
     last_message = state["messages"][-1]
     tool_calls = getattr(last_message, "tool_calls", None)
     if tool_calls:
@@ -107,43 +210,64 @@ def get_graph():
     builder = StateGraph(MessagesState)
     builder.add_node("llm_call", llm_call)
     builder.add_node("tool_node", tool_node)
+    builder.add_node("final_answer", final_answer)
 
     builder.add_edge(START, "llm_call")
-    builder.add_conditional_edges("llm_call", should_continue, ["tool_node", END])
+    builder.add_conditional_edges("llm_call", should_continue, ["tool_node", "final_answer", END])
     builder.add_edge("tool_node", "llm_call")
+    builder.add_edge("final_answer", END)
     return builder.compile()
 
 
+def _graph_entries(measure: bool) -> list[CacheEntry]:
+    if not get_graph.cache_info().currsize:
+        return []
+    return [CacheEntry(key="graph", bytes=approx_size(get_graph()) if measure else None)]
+
+
+def _chat_model_entries(measure: bool) -> list[CacheEntry]:
+    # lru_cache does not expose its values; clients are few and bounded.
+    return [CacheEntry(key=f"model-{n}") for n in range(_chat_model.cache_info().currsize)]
+
+
+register_cache("langgraph_graph", _graph_entries)
+register_cache("langgraph_chat_models", _chat_model_entries)
+
+
 def run_graph(
     conversation_id: str,
     thread_id: str,
     user_message: str,
-    document_path: str | None,
+    document_paths: List[str],
     model_name: str | None = None,
     callbacks=None,
     metadata: dict | None = None,
+    budget: TurnBudget | None = None,
 ) -> dict:
     graph = get_graph()
     messages: List[AnyMessage] = [HumanMessage(content=user_message)]
-    if document_path:
-        filename = os.path.basename(document_path)
+    if document_paths:
+        filenames = ", ".join(document_label(path) for path in document_paths)
         messages.insert(
             0,
             SystemMessage(
                 content=(
-                    "A document is available for this conversation. "
-                    "Use the rag_search tool to answer questions about it. "
-                    f"Document filename: {filename}."
+                    f"{len(document_paths)} document(s) are available for this conversation. "
+                    "Use the rag_search tool to answer questions about them; "
+                    "results are labelled with their source document. "
+                    f"Document filenames: {filenames}."
                 )
             ),
         )
     initial_state: MessagesState = {
         "messages": messages,
         "llm_calls": 0,
-        "document_path": document_path,
+        "document_paths": list(document_paths),
+        "started_at": time.monotonic(),
+        "budget_exhausted": None,
     }
     config = {
-        "configurable": {"thread_id": thread_id},
+        "configurable": {"thread_id": thread_id, "turn_budget": budget or TurnBudget.from_env()},
     }
     if callbacks:
         config["callbacks"] = callbacks
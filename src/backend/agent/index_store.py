@@ -0,0 +1,400 @@
+from __future__ import annotations
+
+import contextlib
+import fcntl
+import json
+import logging
+import math
+import mmap
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Generator, Iterable, Sequence
+
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.bin"
+OFFSETS_FILE = "offsets.npy"
+META_FILE = "meta.json"
+MANIFEST_FILE = "manifest.json"
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "sq_fp16")
+# k-means needs this many points per centroid (PQ codebooks have 256 each).
+_POINTS_PER_CENTROID = 39
+
+
+@dataclass
+class IndexConfig:
+    """Which FAISS index to build, and its search-time knobs.
+
+    Types other than ``flat`` only apply once a document has at least
+    ``train_threshold`` chunks; smaller documents stay exact.
+    """
+
+    index_type: str = "flat"
+    train_threshold: int = 2000
+    train_sample: int = 65536
+    nlist: int = 0
+    pq_m: int = 64
+    hnsw_m: int = 32
+    nprobe: int = 16
+    ef_search: int = 64
+
+    @classmethod
+    def from_env(cls) -> "IndexConfig":
+        index_type = os.getenv("RAG_INDEX_TYPE", "flat").strip().lower()
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"RAG_INDEX_TYPE must be one of {', '.join(INDEX_TYPES)}")
+        return cls(
+            index_type=index_type,
+            train_threshold=int(os.getenv("RAG_INDEX_TRAIN_THRESHOLD", "2000")),
+            train_sample=int(os.getenv("RAG_INDEX_TRAIN_SAMPLE", "65536")),
+            nlist=int(os.getenv("RAG_INDEX_NLIST", "0")),
+            pq_m=int(os.getenv("RAG_INDEX_PQ_M", "64")),
+            hnsw_m=int(os.getenv("RAG_INDEX_HNSW_M", "32")),
+            nprobe=int(os.getenv("RAG_INDEX_NPROBE", "16")),
+            ef_search=int(os.getenv("RAG_INDEX_EF_SEARCH", "64")),
+        )
+
+    def build_key(self) -> str:
+        # Only build-time settings; search knobs can change without a rebuild.
+        if self.index_type == "flat":
+            return ""
+        return (
+            f"{self.index_type}:{self.train_threshold}:{self.nlist}:"
+            f"{self.pq_m}:{self.hnsw_m}"
+        )
+
+    def resolved_type(self, count: int) -> str:
+        minimum = 256 if self.index_type == "ivf_pq" else 1
+        if count < max(self.train_threshold, minimum):
+            return "flat"
+        return self.index_type
+
+    def nlist_for(self, count: int) -> int:
+        if self.nlist > 0:
+            return self.nlist
+        return max(1, min(int(4 * math.sqrt(count)), count // _POINTS_PER_CENTROID))
+
+    def factory_spec(self, dimension: int, count: int) -> str:
+        index_type = self.resolved_type(count)
+        if index_type == "ivf_flat":
+            return f"IVF{self.nlist_for(count)},Flat"
+        if index_type == "ivf_pq":
+            # PQ needs a sub-quantizer count that divides the dimension.
+            m = max(m for m in range(1, min(self.pq_m, dimension) + 1) if dimension % m == 0)
+            return f"IVF{self.nlist_for(count)},PQ{m}"
+        if index_type == "hnsw":
+            return f"HNSW{self.hnsw_m},Flat"
+        if index_type == "sq8":
+            return "SQ8"
+        if index_type == "sq_fp16":
+            return "SQfp16"
+        return "Flat"
+
+    def tune(self, index: Any) -> None:
+        import faiss
+
+        params = faiss.ParameterSpace()
+        for name, value in (("nprobe", self.nprobe), ("efSearch", self.ef_search)):
+            try:
+                params.set_index_parameter(index, name, value)
+            except RuntimeError:
+                pass  # Not applicable to this index type.
+
+
+class IndexWriter:
+    """Builds an index directory incrementally.
+
+    Vectors are added under their chunk positions as embedding batches
+    complete, in any order. Index types that need training buffer vectors
+    until a training sample has arrived, then add the rest directly.
+    ``finish`` writes the FAISS index alongside a
+    compact chunk sidecar: texts concatenated into one UTF-8 blob plus an
+    int64 offsets array, so readers can memory-map both instead of
+    unpickling a docstore.
+    """
+
+    def __init__(
+        self, directory: str, texts: Sequence[str], config: IndexConfig | None = None
+    ) -> None:
+        self.directory = directory
+        self.texts = texts
+        self.config = config or IndexConfig.from_env()
+        self.index: Any = None
+        self.spec = "Flat"
+        self.dimension = 0
+        self._untrained: list[tuple[Any, Any]] = []
+
+    def _train_and_flush(self) -> None:
+        import numpy as np
+
+        vectors = np.concatenate([matrix for matrix, _ in self._untrained])
+        ids = np.concatenate([ids for _, ids in self._untrained])
+        self.index.train(vectors[: self.config.train_sample])
+        self.index.add_with_ids(vectors, ids)
+        self._untrained = []
+
+    def add(self, start: int, vectors: Any) -> None:
+        import numpy as np
+
+        self.add_positions(np.arange(start, start + len(vectors), dtype="int64"), vectors)
+
+    def add_positions(self, positions: Any, vectors: Any) -> None:
+        import faiss
+        import numpy as np
+
+        matrix = np.ascontiguousarray(vectors, dtype="float32")
+        if not len(matrix):
+            return
+        if self.index is None:
+            self.dimension = int(matrix.shape[1])
+            self.spec = self.config.factory_spec(self.dimension, len(self.texts))
+            self.index = faiss.index_factory(self.dimension, f"IDMap2,{self.spec}")
+        ids = np.asarray(positions, dtype="int64")
+        if self.index.is_trained:
+            self.index.add_with_ids(matrix, ids)
+            return
+        self._untrained.append((matrix, ids))
+        buffered = sum(len(batch) for batch, _ in self._untrained)
+        if buffered >= min(self.config.train_sample, len(self.texts)):
+            self._train_and_flush()
+
+    def finish(self, meta: dict[str, Any], chunk_hashes: Sequence[str] | None = None) -> None:
+        import faiss
+        import numpy as np
+
+        if self._untrained:
+            self._train_and_flush()
+        index = self.index
+        if index is None:
+            index = faiss.IndexIDMap2(faiss.IndexFlatL2(1))
+        os.makedirs(self.directory, exist_ok=True)
+        faiss.write_index(index, os.path.join(self.directory, INDEX_FILE))
+        encoded = [text.encode("utf-8") for text in self.texts]
+        offsets = np.zeros(len(encoded) + 1, dtype="int64")
+        offsets[1:] = np.cumsum([len(blob) for blob in encoded])
+        with open(os.path.join(self.directory, CHUNKS_FILE), "wb") as handle:
+            for blob in encoded:
+                handle.write(blob)
+        np.save(os.path.join(self.directory, OFFSETS_FILE), offsets)
+        with open(os.path.join(self.directory, META_FILE), "w", encoding="utf-8") as handle:
+            json.dump(
+                {
+                    **meta,
+                    "dimension": self.dimension,
+                    "chunks": len(encoded),
+                    "index_spec": self.spec,
+                },
+                handle,
+            )
+        if chunk_hashes is not None:
+            with open(os.path.join(self.directory, MANIFEST_FILE), "w", encoding="utf-8") as handle:
+                json.dump({"chunk_hashes": list(chunk_hashes)}, handle)
+
+
+def read_manifest(directory: str) -> list[str]:
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), "r", encoding="utf-8") as handle:
+            return list(json.load(handle).get("chunk_hashes", []))
+    except (OSError, ValueError):
+        return []
+
+
+class ChunkVectorCache:
+    """Embedding vectors keyed by (model, chunk hash), shared by all indexes.
+
+    A revised document re-chunks into mostly the same chunks, so building its
+    index only embeds the chunks missing here. Completed batches are written
+    as they arrive, which also makes an interrupted build resumable.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS chunk_vectors (
+                    model TEXT NOT NULL,
+                    chunk_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (model, chunk_hash)
+                )
+                """
+            )
+            conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_many(self, model: str, hashes: Iterable[str]) -> dict[str, Any]:
+        import numpy as np
+
+        wanted = list(dict.fromkeys(hashes))
+        found: dict[str, Any] = {}
+        with self._connect() as conn:
+            for offset in range(0, len(wanted), 500):
+                batch = wanted[offset : offset + 500]
+                rows = conn.execute(
+                    "SELECT chunk_hash, vector FROM chunk_vectors WHERE model = ? "
+                    f"AND chunk_hash IN ({','.join('?' * len(batch))})",
+                    (model, *batch),
+                ).fetchall()
+                for chunk_hash, blob in rows:
+                    found[chunk_hash] = np.frombuffer(blob, dtype="float32")
+        return found
+
+    def put_many(self, model: str, items: Iterable[tuple[str, Any]]) -> None:
+        import numpy as np
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunk_vectors VALUES (?, ?, ?, ?)",
+                [
+                    (model, chunk_hash, np.asarray(vector, dtype="float32").tobytes(), now)
+                    for chunk_hash, vector in items
+                ],
+            )
+            conn.commit()
+
+    def prune(self, keep: set[str], older_than: float) -> int:
+        """Drop vectors no manifest references, sparing recent in-flight builds."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT model, chunk_hash FROM chunk_vectors WHERE created_at < ?",
+                (older_than,),
+            ).fetchall()
+            stale = [row for row in rows if row[1] not in keep]
+            conn.executemany(
+                "DELETE FROM chunk_vectors WHERE model = ? AND chunk_hash = ?", stale
+            )
+            conn.commit()
+        return len(stale)
+
+
+def publish_index_dir(build_dir: str, directory: str) -> None:
+    # Rename is atomic, so readers see either no index or a complete one.
+    try:
+        os.rename(build_dir, directory)
+    except OSError:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        if not os.path.exists(os.path.join(directory, META_FILE)):
+            raise
+
+
+def build_dir_for(directory: str) -> str:
+    return f"{directory}.build-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def index_ready(directory: str) -> bool:
+    return os.path.exists(os.path.join(directory, META_FILE))
+
+
+@contextlib.contextmanager
+def build_lock(directory: str) -> Generator[None, None, None]:
+    """Cross-process lock so only one worker builds a given index."""
+    os.makedirs(os.path.dirname(directory) or ".", exist_ok=True)
+    with open(f"{directory}.lock", "a+") as handle:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def read_mapped_index(path: str) -> tuple[Any, bool]:
+    """Open a FAISS index so its vectors are served from the file mapping.
+
+    ``IO_FLAG_MMAP`` alone still copies Flat (and HNSW/SQ) storage onto the
+    heap; ``IO_FLAG_MMAP_IFC`` maps it in place. Index types the in-place
+    reader cannot handle fall back to ``IO_FLAG_MMAP`` and are reported as
+    not mapped, since that reader may copy them.
+    """
+    import faiss
+
+    ifc = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if ifc is not None:
+        try:
+            return faiss.read_index(path, ifc | faiss.IO_FLAG_READ_ONLY), True
+        except RuntimeError as exc:
+            logging.getLogger(__name__).warning(
+                "Could not map %s in place (%s); falling back to IO_FLAG_MMAP", path, exc
+            )
+    return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY), False
+
+
+class PersistedIndex:
+    """Read-only view over an index directory.
+
+    The FAISS index, chunk blob and offsets are all memory-mapped, so every
+    worker process that opens the same directory shares one copy through the
+    OS page cache. ``mapped`` is False when the index could only be read
+    with ``IO_FLAG_MMAP``.
+    """
+
+    def __init__(
+        self, directory: str, embeddings: Any, config: IndexConfig | None = None
+    ) -> None:
+        import numpy as np
+
+        self.directory = directory
+        self.embeddings = embeddings
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as handle:
+            self.meta = json.load(handle)
+        self.index, self.mapped = read_mapped_index(os.path.join(directory, INDEX_FILE))
+        (config or IndexConfig.from_env()).tune(self.index)
+        self._offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+        self._chunks: mmap.mmap | bytes = b""
+        chunks_path = os.path.join(directory, CHUNKS_FILE)
+        if os.path.getsize(chunks_path):
+            with open(chunks_path, "rb") as handle:
+                self._chunks = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def text(self, position: int) -> str:
+        start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+        return self._chunks[start:end].decode("utf-8")
+
+    def search_by_vector(self, vector: Sequence[float], k: int) -> list[tuple[int, float]]:
+        import numpy as np
+
+        if len(self) == 0:
+            return []
+        query = np.asarray([vector], dtype="float32")
+        distances, positions = self.index.search(query, min(k, len(self)))
+        return [
+            (int(position), float(distance))
+            for position, distance in zip(positions[0], distances[0])
+            if position >= 0
+        ]
+
+    def similarity_search_by_vector_with_score(
+        self, vector: Sequence[float], k: int = 4
+    ) -> list[tuple[Any, float]]:
+        from langchain_core.documents import Document
+
+        return [
+            (
+                Document(
+                    page_content=self.text(position),
+                    metadata={"chunk": position, "source": self.meta.get("source_name")},
+                ),
+                distance,
+            )
+            for position, distance in self.search_by_vector(vector, k)
+        ]
+
+    def similarity_search_with_score(self, query: str, k: int = 4) -> list[tuple[Any, float]]:
+        return self.similarity_search_by_vector_with_score(self.embeddings.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4) -> list[Any]:
+        return [document for document, _ in self.similarity_search_with_score(query, k)]
+
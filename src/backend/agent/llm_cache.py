@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+CACHE_HIT_KEY = "llm_cache_hit"
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    return hashlib.sha256(f"{llm_string}\x1f{prompt}".encode("utf-8")).hexdigest()
+
+
+class SQLiteLLMCache(BaseCache):
+    """Exact-match response cache keyed by the rendered request (messages,
+    model parameters and bound tool schemas), with LRU eviction by size."""
+
+    def __init__(self, db_path: str, max_bytes: int) -> None:
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_db(self) -> None:
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    response_json TEXT NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache (last_access)"
+            )
+            conn.commit()
+
+    def lookup(self, prompt: str, llm_string: str) -> Sequence[Generation] | None:
+        key = cache_key(prompt, llm_string)
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT response_json FROM llm_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE llm_cache SET last_access = ? WHERE cache_key = ?",
+                (time.time(), key),
+            )
+            conn.commit()
+        generations = []
+        for entry in json.loads(row[0]):
+            message = messages_from_dict([entry["message"]])[0]
+            message.response_metadata = {**message.response_metadata, CACHE_HIT_KEY: True}
+            generation_info = {**(entry.get("generation_info") or {}), CACHE_HIT_KEY: True}
+            generations.append(ChatGeneration(message=message, generation_info=generation_info))
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        entries = []
+        for generation in return_val:
+            if not isinstance(generation, ChatGeneration):
+                return
+            entries.append(
+                {
+                    "message": message_to_dict(generation.message),
+                    "generation_info": generation.generation_info,
+                }
+            )
+        payload = json.dumps(entries)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (cache_key, response_json, size_bytes, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (cache_key(prompt, llm_string), payload, len(payload), time.time()),
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = conn.execute(
+            "SELECT cache_key, size_bytes FROM llm_cache ORDER BY last_access ASC"
+        ).fetchall()
+        expired = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            expired.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM llm_cache WHERE cache_key = ?", expired)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache")
+            conn.commit()
+
+    def stats(self) -> dict[str, int]:
+        with self._connect() as conn:
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM llm_cache"
+            ).fetchone()
+        return {"entries": entries, "bytes": size}
+
+
+_CACHE: SQLiteLLMCache | None = None
+
+
+def llm_cache_enabled() -> bool:
+    return os.getenv("LLM_CACHE_ENABLED", "false").strip().lower() in {"1", "true", "yes"}
+
+
+def get_llm_cache() -> SQLiteLLMCache | None:
+    global _CACHE
+    if not llm_cache_enabled():
+        return None
+    if _CACHE is None:
+        _CACHE = SQLiteLLMCache(
+            db_path=os.getenv("LLM_CACHE_PATH", "./data/llm_cache.db"),
+            max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024),
+        )
+    return _CACHE
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import threading
+import types
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+# Walking into these would count shared code and module state, not the entry.
+_OPAQUE = (
+    types.ModuleType,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.MethodType,
+    type,
+)
+
+
+def approx_size(obj: Any, exclude: tuple[Any, ...] = (), limit: int = 200_000) -> int:
+    """Deep ``sys.getsizeof`` over containers and object attributes.
+
+    Approximate: shared objects are counted once per call, numpy arrays by
+    ``nbytes``, and the walk stops after ``limit`` objects.
+    """
+    seen = {id(item) for item in exclude}
+    stack = [obj]
+    total = 0
+    while stack and len(seen) < limit:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, _OPAQUE):
+            continue
+        seen.add(id(item))
+        nbytes = getattr(item, "nbytes", None)
+        if isinstance(nbytes, int) and not isinstance(item, (bytes, bytearray, str)):
+            total += nbytes
+            continue
+        try:
+            total += sys.getsizeof(item)
+        except TypeError:
+            continue
+        try:
+            if isinstance(item, dict):
+                stack.extend(item.keys())
+                stack.extend(item.values())
+            elif isinstance(item, (list, tuple, set, frozenset, deque)):
+                stack.extend(item)
+            elif not isinstance(item, (str, bytes, bytearray, int, float)):
+                if hasattr(item, "__dict__"):
+                    stack.append(vars(item))
+                for slot in getattr(type(item), "__slots__", ()):
+                    if hasattr(item, slot):
+                        stack.append(getattr(item, slot))
+        except RuntimeError:
+            # Mutated by another thread mid-walk; the estimate is partial.
+            continue
+    return total
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    bytes: int | None = None
+    conversation_id: str | None = None
+
+
+# measure -> entries, least recently used first
+EntriesFn = Callable[[bool], list[CacheEntry]]
+
+
+@dataclass
+class TrackedCache:
+    name: str
+    entries: EntriesFn
+    evict: Callable[[str], bool] | None = None
+    max_entries: int = 0
+    max_bytes: int = 0
+    evicted: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def trim(self, measure: bool = True) -> int:
+        """Evict least recently used entries until both caps hold; 0 disables a cap."""
+        if self.evict is None or not (self.max_entries or (measure and self.max_bytes)):
+            return 0
+        with self._lock:
+            entries = self.entries(measure and bool(self.max_bytes))
+            count = len(entries)
+            size = sum(entry.bytes or 0 for entry in entries)
+            evicted = 0
+            for entry in entries:
+                over_entries = self.max_entries and count > self.max_entries
+                over_bytes = measure and self.max_bytes and size > self.max_bytes
+                if not (over_entries or over_bytes):
+                    break
+                if self.evict(entry.key):
+                    evicted += 1
+                count -= 1
+                size -= entry.bytes or 0
+            self.evicted += evicted
+        if evicted:
+            logging.getLogger(__name__).info("Evicted %s entries from %s", evicted, self.name)
+        return evicted
+
+
+_CACHES: dict[str, TrackedCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def register_cache(
+    name: str,
+    entries: EntriesFn,
+    evict: Callable[[str], bool] | None = None,
+    *,
+    max_entries: int = 0,
+    max_bytes: int = 0,
+) -> TrackedCache:
+    """Make a per-process cache visible in ``memory_report`` and, given
+    ``evict``, subject to ``trim_caches``. Re-registering replaces it."""
+    cache = TrackedCache(name, entries, evict, max_entries=max_entries, max_bytes=max_bytes)
+    with _CACHES_LOCK:
+        _CACHES[name] = cache
+    return cache
+
+
+def mb_env(name: str, default: str = "0") -> int:
+    return int(float(os.getenv(name, default)) * 1024 * 1024)
+
+
+def trim_cache(name: str, measure: bool = True) -> int:
+    with _CACHES_LOCK:
+        cache = _CACHES.get(name)
+    return cache.trim(measure) if cache is not None else 0
+
+
+def trim_caches() -> dict[str, int]:
+    with _CACHES_LOCK:
+        caches = list(_CACHES.values())
+    evicted = {}
+    for cache in caches:
+        try:
+            evicted[cache.name] = cache.trim()
+        except Exception:
+            logging.getLogger(__name__).exception("Could not trim %s", cache.name)
+    return evicted
+
+
+def process_rss_bytes() -> int | None:
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+
+        # Peak, not current, outside Linux; kilobytes on Linux, bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+def memory_report(top: int = 10) -> dict[str, Any]:
+    with _CACHES_LOCK:
+        caches = list(_CACHES.values())
+    reports = []
+    by_conversation: dict[str, dict[str, int]] = {}
+    for cache in sorted(caches, key=lambda cache: cache.name):
+        try:
+            entries = cache.entries(True)
+        except Exception as exc:
+            reports.append({"name": cache.name, "error": f"{type(exc).__name__}: {exc}"})
+            continue
+        measured = [entry.bytes for entry in entries if entry.bytes is not None]
+        reports.append(
+            {
+                "name": cache.name,
+                "entries": len(entries),
+                "approx_bytes": sum(measured) if measured or not entries else None,
+                "max_entries": cache.max_entries or None,
+                "max_bytes": cache.max_bytes or None,
+                "evicted": cache.evicted,
+            }
+        )
+        for entry in entries:
+            if entry.conversation_id and entry.bytes:
+                sizes = by_conversation.setdefault(entry.conversation_id, {})
+                sizes[cache.name] = sizes.get(cache.name, 0) + entry.bytes
+    conversations = sorted(by_conversation.items(), key=lambda item: sum(item[1].values()), reverse=True)
+    return {
+        "rss_bytes": process_rss_bytes(),
+        "caches": reports,
+        "top_conversations": [
+            {"conversation_id": key, "approx_bytes": sum(sizes.values()), "caches": sizes}
+            for key, sizes in conversations[:top]
+        ],
+    }
@@ -1,11 +1,20 @@
 from __future__ import annotations
 
+import asyncio
 import os
+import threading
+import weakref
 from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any
 
+from src.backend.agent.budget import FORCED_ANSWER_INSTRUCTION, BudgetTracker, TurnBudget
+from src.backend.agent.cancellation import run_cancellable
+from src.backend.agent.context import get_context_manager, message_text
 from src.backend.agent.prompts import build_summarizer_prompt
+from src.backend.agent.resilience import call_with_resilience_async, client_timeouts
 from src.backend.agent.tools import rag_tool, web_search_tool
-from src.backend.agent.types import AgentTurnResult
+from src.backend.agent.types import AgentTurnResult, AgentTurnUsage
 
 _BT_TRACE_PROCESSOR_CONFIGURED = False
 
@@ -34,6 +43,52 @@ def _ensure_braintrust_processor(add_trace_processor) -> None:
     _BT_TRACE_PROCESSOR_CONFIGURED = True
 
 
+_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+_CLIENTS_LOCK = threading.Lock()
+
+
+def _loop_client():
+    """The AsyncOpenAI client for the running event loop.
+
+    Each turn (and its forced answer) runs under its own ``asyncio.run``, and
+    a pooled keep-alive connection cannot be reused once the loop that opened
+    it has closed, so clients are not shared across loops. An entry goes
+    away with its loop.
+    """
+    from openai import AsyncOpenAI
+
+    loop = asyncio.get_running_loop()
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(loop)
+        if client is None:
+            client = _CLIENTS[loop] = AsyncOpenAI(**client_timeouts())
+    return client
+
+
+@lru_cache(maxsize=8)
+def _resilient_model(model_name: str):
+    """The SDK model for ``model_name``, with attempt timeouts, retries and
+    hedging around each response; losing attempts are cancelled. The
+    underlying model is resolved per event loop (see ``_loop_client``)."""
+    from agents.models.interface import Model
+    from agents.models.multi_provider import MultiProvider
+
+    def inner():
+        return MultiProvider(openai_client=_loop_client()).get_model(model_name)
+
+    class ResilientModel(Model):
+        async def get_response(self, *args, **kwargs):
+            model = inner()
+            return await call_with_resilience_async(
+                lambda: model.get_response(*args, **kwargs), key=model_name
+            )
+
+        def stream_response(self, *args, **kwargs):
+            return inner().stream_response(*args, **kwargs)
+
+    return ResilientModel()
+
+
 def _instructions() -> str:
     built = build_summarizer_prompt(user_message="", context_docs="", web_results="")
     for msg in built.get("messages", []):
@@ -46,26 +101,125 @@ def _instructions() -> str:
     return f"{base}\n\nToday is {today} (UTC)."
 
 
+def _item_role(item) -> str:
+    if not isinstance(item, dict):
+        return "assistant"
+    role = item.get("role")
+    if role in {"system", "developer"}:
+        return "system"
+    if role:
+        return str(role)
+    if item.get("type") == "function_call_output":
+        return "tool"
+    return "assistant"
+
+
+def _item_text(item) -> str:
+    if not isinstance(item, dict):
+        return str(item)
+    for key in ("content", "output", "arguments"):
+        if key in item:
+            return message_text(item[key])
+    return ""
+
+
+def _run_config(conversation_id: str, model_name: str, tracker: BudgetTracker):
+    try:
+        from agents import RunConfig
+        from agents.run import ModelInputData
+    except ImportError:
+        # Older SDKs have no call_model_input_filter hook.
+        return None
+
+    def fit_context(data):
+        summary, kept = get_context_manager().fit_messages(
+            conversation_id,
+            list(data.model_data.input),
+            model_name=model_name,
+            role_of=_item_role,
+            text_of=_item_text,
+        )
+        if summary:
+            kept = [{"role": "system", "content": summary}] + kept
+        reason = tracker.before_llm_call()
+        if reason:
+            # Tools stay bound here, but they refuse to run from now on.
+            kept = kept + [{"role": "system", "content": FORCED_ANSWER_INSTRUCTION.format(reason=reason)}]
+        return ModelInputData(input=kept, instructions=data.model_data.instructions)
+
+    return RunConfig(call_model_input_filter=fit_context)
+
+
+def _usage_from_result(*results) -> AgentTurnUsage:
+    """Usage summed over ``results``: a run result, or the ``run_data`` of a
+    run that was interrupted before the forced answer."""
+    usage = AgentTurnUsage()
+    for result in results:
+        context_wrapper = getattr(result, "context_wrapper", None)
+        run_usage = getattr(context_wrapper, "usage", None)
+        if run_usage is not None:
+            usage.llm_calls += getattr(run_usage, "requests", 0) or 0
+            usage.prompt_tokens += getattr(run_usage, "input_tokens", 0) or 0
+            usage.completion_tokens += getattr(run_usage, "output_tokens", 0) or 0
+        for item in getattr(result, "new_items", None) or []:
+            if getattr(item, "type", None) == "tool_call_item":
+                usage.tool_calls += 1
+    return usage
+
+
+def _forced_answer(Runner, agent, exc, user_message: str, run_config=None):
+    """Answer without tools from what the interrupted run gathered."""
+    history: Any = user_message
+    run_data = getattr(exc, "run_data", None)
+    if run_data is not None:
+        original = run_data.input
+        if isinstance(original, str):
+            original = [{"role": "user", "content": original}]
+        history = list(original) + [item.to_input_item() for item in run_data.new_items]
+    final_agent = agent.clone(
+        tools=[],
+        instructions=f"{agent.instructions}\n\n{FORCED_ANSWER_INSTRUCTION.format(reason='llm_calls')}",
+    )
+    run_kwargs: dict[str, Any] = {"max_turns": 1}
+    if run_config is not None:
+        run_kwargs["run_config"] = run_config
+    return asyncio.run(run_cancellable(Runner.run(final_agent, history, **run_kwargs)))
+
+
 def run_openai_agents_agent(
     *,
     conversation_id: str,
     thread_id: str,
     user_message: str,
-    document_path: str | None,
+    document_paths: list[str],
     model_name: str | None = None,
+    budget: TurnBudget | None = None,
 ) -> AgentTurnResult:
-    _ = (conversation_id, thread_id)
+    _ = thread_id
     Agent, Runner, add_trace_processor, function_tool = _openai_agents_imports()
+    from agents.exceptions import MaxTurnsExceeded
+
     _ensure_braintrust_processor(add_trace_processor)
+    budget = budget or TurnBudget.from_env()
+    tracker = BudgetTracker(budget)
 
     @function_tool
-    def rag_search(query: str) -> str:
-        """Search uploaded deposition or local documents for relevant context."""
-        return rag_tool(query, document_path=document_path)
+    def rag_search(query: str, mode: str = "chunks") -> str:
+        """Search uploaded deposition or local documents for relevant context.
+
+        Use mode="summary" for whole-document questions (overall summary, key
+        events, timeline) to get precomputed document and section summaries
+        instead of the few best-matching passages.
+        """
+        if not tracker.allow_tool_call():
+            return tracker.refusal()
+        return rag_tool(query, document_paths=document_paths, mode=mode)
 
     @function_tool
     def web_search(query: str) -> str:
         """Search the web for relevant context."""
+        if not tracker.allow_tool_call():
+            return tracker.refusal()
         return web_search_tool(query)
 
     selected_model = model_name or os.getenv("DEFAULT_LLM_MODEL", "gpt-4o-mini")
@@ -73,9 +227,24 @@ def run_openai_agents_agent(
         name="rev_assistant_openai_agents",
         instructions=_instructions(),
         tools=[rag_search, web_search],
-        model=selected_model,
+        model=_resilient_model(selected_model),
     )
-    result = Runner.run_sync(agent, user_message)
+    run_kwargs: dict[str, Any] = {}
+    if budget.max_llm_calls:
+        # One turn past the budget leaves room for the forced answer.
+        run_kwargs["max_turns"] = budget.max_llm_calls + 1
+    run_config = _run_config(conversation_id, selected_model, tracker)
+    if run_config is not None:
+        run_kwargs["run_config"] = run_config
+    interrupted = None
+    try:
+        # Run as a cancellable task so a cancelled turn also aborts its
+        # in-flight model requests and tool coroutines.
+        result = asyncio.run(run_cancellable(Runner.run(agent, user_message, **run_kwargs)))
+    except MaxTurnsExceeded as exc:
+        tracker.exhausted = tracker.exhausted or "llm_calls"
+        interrupted = getattr(exc, "run_data", None)
+        result = _forced_answer(Runner, agent, exc, user_message, run_config)
 
     message = None
     if hasattr(result, "final_output"):
@@ -84,4 +253,9 @@ def run_openai_agents_agent(
         message = result.output_text
     else:
         message = str(result)
-    return AgentTurnResult(assistant_message=str(message), raw_state={"result": str(result)})
+    return AgentTurnResult(
+        assistant_message=str(message),
+        raw_state={"result": str(result)},
+        usage=_usage_from_result(interrupted, result),
+        budget_exhausted=tracker.exhausted,
+    )
@@ -7,6 +7,7 @@ from braintrust import current_span, load_prompt
 SUMMARIZER_FALLBACK = (
     "You are a legal assistant helping summarize deposition testimony.\n"
     "Use tools when needed: rag_search for documents and web_search for external facts.\n"
+    "For questions about a whole document, call rag_search once with mode=\"summary\".\n"
     "Answer clearly, cite which source you used (doc or web), and be concise."
 )
 
@@ -1,12 +1,57 @@
+from __future__ import annotations
+
+import hashlib
+import heapq
+import json
+import logging
 import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
+from typing import Any
 
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-
+from src.backend.agent.chunking import CHUNKER_VERSION, chunk_hash, content_defined_chunks
+from src.backend.agent.embedding_batcher import EmbeddingBatcher
+from src.backend.agent.index_store import (
+    META_FILE,
+    ChunkVectorCache,
+    IndexConfig,
+    IndexWriter,
+    PersistedIndex,
+    build_dir_for,
+    build_lock,
+    index_ready,
+    publish_index_dir,
+    read_manifest,
+)
+from src.backend.agent.memory import CacheEntry, mb_env, register_cache
+from src.backend.agent.summary_tree import (
+    SummaryConfig,
+    build_summary_tree,
+    llm_summarizer,
+    read_summary_tree,
+    summary_nodes,
+    write_summary_tree,
+)
 
 DATA_PATH = os.getenv("DEPOSITION_SAMPLE_PATH", "./data/sample_deposition.txt")
+INDEX_DIR = os.getenv("RAG_INDEX_DIR", "./data/indexes")
+VECTORSTORE_CACHE_SIZE = int(os.getenv("RAG_VECTORSTORE_CACHE_SIZE", "8"))
+CHUNK_SIZE = 400
+CHUNK_VECTORS_FILE = "chunk_vectors.db"
+
+_VECTORSTORES: OrderedDict[str, PersistedIndex] = OrderedDict()
+_VECTORSTORES_LOCK = threading.Lock()
+_UPLOAD_PREFIX = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}_")
+
+
+def document_label(path: str) -> str:
+    """Display name for a document, without the upload id prefix."""
+    return _UPLOAD_PREFIX.sub("", os.path.basename(path))
 
 
 def _load_documents(path: str) -> list[str]:
@@ -26,17 +71,311 @@ def _load_documents(path: str) -> list[str]:
         return [file.read()]
 
 
-@lru_cache(maxsize=8)
-def get_vectorstore(path: str) -> FAISS:
-    docs = _load_documents(path)
-    splitter = RecursiveCharacterTextSplitter(chunk_size=400, chunk_overlap=40)
-    chunks = splitter.create_documents(docs)
-    embeddings = OpenAIEmbeddings()
-    return FAISS.from_documents(chunks, embeddings)
+@lru_cache(maxsize=1)
+def _embeddings():
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings()
+
+
+def _embedding_model_name(embeddings: Any) -> str:
+    return str(getattr(embeddings, "model", None) or type(embeddings).__name__)
+
+
+def _chunk_texts(path: str) -> list[str]:
+    # Content-defined boundaries keep unchanged passages of a revised
+    # document in identical chunks, so their vectors can be reused.
+    return [
+        chunk
+        for document in _load_documents(path)
+        for chunk in content_defined_chunks(document, CHUNK_SIZE // 2, CHUNK_SIZE * 2)
+    ]
+
+
+def _chunk_vector_cache() -> ChunkVectorCache:
+    return ChunkVectorCache(os.path.join(INDEX_DIR, CHUNK_VECTORS_FILE))
+
+
+def index_key(path: str, model_name: str, config: IndexConfig | None = None) -> str:
+    # Content-addressed, so identical uploads share one index on disk.
+    params = f"{model_name}:{CHUNKER_VERSION}:{CHUNK_SIZE}"
+    build_key = (config or IndexConfig.from_env()).build_key()
+    if build_key:
+        params = f"{params}:{build_key}"
+    digest = hashlib.sha256()
+    digest.update(f"{params}\n".encode())
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:32]
+
+
+def _build_index(path: str, directory: str, embeddings: Any, config: IndexConfig) -> None:
+    import numpy as np
+
+    texts = _chunk_texts(path)
+    hashes = [chunk_hash(text) for text in texts]
+    model = _embedding_model_name(embeddings)
+    cache = _chunk_vector_cache()
+    cached = cache.get_many(model, hashes)
+    build_dir = build_dir_for(directory)
+    writer = IndexWriter(build_dir, texts, config)
+
+    reused = [position for position, digest in enumerate(hashes) if digest in cached]
+    if reused:
+        writer.add_positions(reused, np.stack([cached[hashes[position]] for position in reused]))
+
+    # Only chunks never embedded before (by any document) reach the API.
+    positions_by_hash: dict[str, list[int]] = {}
+    for position, digest in enumerate(hashes):
+        if digest not in cached:
+            positions_by_hash.setdefault(digest, []).append(position)
+    missing = list(positions_by_hash)
+
+    def on_batch(start: int, vectors: Any) -> None:
+        batch = missing[start : start + len(vectors)]
+        cache.put_many(model, zip(batch, vectors))
+        rows = [row for row, digest in enumerate(batch) for _ in positions_by_hash[digest]]
+        positions = [position for digest in batch for position in positions_by_hash[digest]]
+        writer.add_positions(positions, vectors[rows])
+
+    EmbeddingBatcher(embeddings.embed_documents).embed(
+        [texts[positions_by_hash[digest][0]] for digest in missing], on_batch=on_batch
+    )
+    writer.finish(
+        {
+            "source_path": os.path.abspath(path),
+            "source_name": os.path.basename(path),
+            "embedding_model": model,
+            "chunker": CHUNKER_VERSION,
+            "reused_chunks": len(reused),
+        },
+        chunk_hashes=hashes,
+    )
+    publish_index_dir(build_dir, directory)
+    logging.getLogger(__name__).info(
+        "Built RAG index path=%s chunks=%s reused=%s embedded=%s",
+        path,
+        len(texts),
+        len(reused),
+        len(missing),
+    )
+
+
+def _open_or_build_index(path: str) -> PersistedIndex:
+    embeddings = _embeddings()
+    config = IndexConfig.from_env()
+    directory = os.path.join(INDEX_DIR, index_key(path, _embedding_model_name(embeddings), config))
+    if not index_ready(directory):
+        with build_lock(directory):
+            if not index_ready(directory):
+                _build_index(path, directory, embeddings, config)
+    return PersistedIndex(directory, embeddings, config)
+
+
+def get_vectorstore(path: str) -> PersistedIndex:
+    with _VECTORSTORES_LOCK:
+        if path in _VECTORSTORES:
+            _VECTORSTORES.move_to_end(path)
+            return _VECTORSTORES[path]
+    vectorstore = _open_or_build_index(path)
+    with _VECTORSTORES_LOCK:
+        _VECTORSTORES[path] = vectorstore
+        while len(_VECTORSTORES) > VECTORSTORE_CACHE_SIZE:
+            _VECTORSTORES.popitem(last=False)
+    return vectorstore
+
+
+def evict_vectorstore(path: str) -> bool:
+    with _VECTORSTORES_LOCK:
+        return _VECTORSTORES.pop(path, None) is not None
+
+
+def _mapped_bytes(directory: str) -> int:
+    # Index files are memory-mapped (see ``read_mapped_index``): this is
+    # what the entry can pull into RSS through the shared page cache, not
+    # private memory it holds now.
+    try:
+        return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+    except OSError:
+        return 0
+
+
+def _vectorstore_entries(measure: bool) -> list[CacheEntry]:
+    with _VECTORSTORES_LOCK:
+        items = list(_VECTORSTORES.items())
+    return [
+        CacheEntry(key=path, bytes=_mapped_bytes(index.directory) if measure else None)
+        for path, index in items
+    ]
+
+
+register_cache(
+    "rag_vectorstores",
+    _vectorstore_entries,
+    evict_vectorstore,
+    max_entries=VECTORSTORE_CACHE_SIZE,
+    max_bytes=mb_env("RAG_VECTORSTORE_CACHE_MB"),
+)
+
+
+def sweep_orphaned_indexes(live_paths: set[str]) -> list[str]:
+    """Delete persisted indexes that no live document's content maps to.
+
+    Index directories are content-addressed and shared by identical uploads,
+    so liveness comes from hashing the documents, not from the one source
+    path recorded at build time. Lock files stay: a worker may be waiting on
+    one, and a deleted lock could then be held twice.
+
+    Keys are computed with the embedding model each index records, so the
+    sweep needs no embeddings client (or API key).
+    """
+    if not os.path.isdir(INDEX_DIR):
+        return []
+    config = IndexConfig.from_env()
+    keys: dict[tuple[str, str], str | None] = {}
+
+    def key_of(path: str, model: str) -> str | None:
+        path = os.path.abspath(path)
+        if (path, model) not in keys:
+            try:
+                keys[path, model] = index_key(path, model, config)
+            except OSError:
+                keys[path, model] = None
+        return keys[path, model]
+
+    live_paths = live_paths | {DATA_PATH}
+    removed = []
+    kept_hashes: set[str] = set()
+    stale_before = time.time() - 86400
+    for entry in os.scandir(INDEX_DIR):
+        if not entry.is_dir():
+            continue
+        if ".build-" in entry.name:
+            # Leftovers from a crashed build; a live build touches them often.
+            if entry.stat().st_mtime < stale_before:
+                shutil.rmtree(entry.path, ignore_errors=True)
+            continue
+        try:
+            with open(os.path.join(entry.path, META_FILE), "r", encoding="utf-8") as handle:
+                meta = json.load(handle)
+        except (OSError, ValueError):
+            continue
+        model, source = meta.get("embedding_model"), meta.get("source_path")
+        if not model:
+            continue
+        # Documents still on disk keep their index even outside a session.
+        if any(key_of(path, model) == entry.name for path in live_paths) or (
+            source and key_of(source, model) == entry.name
+        ):
+            kept_hashes.update(read_manifest(entry.path))
+            continue
+        with build_lock(entry.path):
+            shutil.rmtree(entry.path, ignore_errors=True)
+        removed.append(entry.path)
+    if os.path.exists(os.path.join(INDEX_DIR, CHUNK_VECTORS_FILE)):
+        _chunk_vector_cache().prune(kept_hashes, older_than=stale_before)
+    return removed
+
+
+def search_documents(query: str, paths: list[str], k: int = 3) -> list[tuple[Any, float]]:
+    """Top-k chunks across several documents.
+
+    Each document keeps its own persisted index, so adding a document to a
+    conversation only embeds that document. The query is embedded once and
+    per-document hits are merged by distance.
+    """
+    vector = _embeddings().embed_query(query)
+    scored = []
+    for path in dict.fromkeys(paths):
+        for document, distance in get_vectorstore(path).similarity_search_by_vector_with_score(
+            vector, k
+        ):
+            document.metadata.update(source=document_label(path), document_path=path)
+            scored.append((document, distance))
+    return heapq.nsmallest(k, scored, key=lambda item: item[1])
+
+
+def get_summary_tree(path: str, config: SummaryConfig | None = None) -> dict[str, Any]:
+    """Section/document summary tree for a document, built on first use and
+    stored next to its index."""
+    config = config or SummaryConfig.from_env()
+    index = get_vectorstore(path)
+    tree = read_summary_tree(index.directory, config)
+    if tree is not None:
+        return tree
+    with build_lock(os.path.join(index.directory, "summary")):
+        tree = read_summary_tree(index.directory, config)
+        if tree is None:
+            started = time.monotonic()
+            chunks = [index.text(position) for position in range(len(index))]
+            tree = build_summary_tree(chunks, llm_summarizer(config.model), config)
+            write_summary_tree(index.directory, tree)
+            logging.getLogger(__name__).info(
+                "Built summary tree path=%s sections=%s levels=%s seconds=%.1f",
+                path,
+                len(tree["levels"][0]) if tree["levels"] else 0,
+                len(tree["levels"]),
+                time.monotonic() - started,
+            )
+    return tree
+
+
+@lru_cache(maxsize=1)
+def _prepare_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=int(os.getenv("RAG_PREPARE_WORKERS", "2")), thread_name_prefix="rag-prepare"
+    )
+
+
+def _prepare_document(path: str) -> None:
+    try:
+        get_summary_tree(path)
+    except Exception:
+        # The tree is rebuilt on demand if this fails.
+        logging.getLogger(__name__).exception("Could not prepare document path=%s", path)
+
+
+def prepare_document_async(path: str) -> None:
+    """Build the index and summary tree in the background after an upload."""
+    _prepare_pool().submit(_prepare_document, path)
+
+
+def summary_context(paths: list[str], config: SummaryConfig | None = None) -> str:
+    config = config or SummaryConfig.from_env()
+    unique = list(dict.fromkeys(paths))
+    budget = config.max_context_chars // max(1, len(unique))
+    blocks = []
+    for path in unique:
+        tree = get_summary_tree(path, config)
+        if not tree["levels"]:
+            continue
+        label = document_label(path)
+        root = tree["levels"][-1][0]
+        blocks.append(f"[source: {label}, document summary]\n{root['summary']}")
+        nodes = summary_nodes(tree, budget)
+        if len(nodes) > 1:
+            blocks.extend(
+                f"[source: {label}, part {n}, chunks {node['start']}-{node['end'] - 1}]\n{node['summary']}"
+                for n, node in enumerate(nodes, start=1)
+            )
+    return "\n\n".join(blocks)
 
 
-def retrieve_context(query: str, k: int = 3, path: str | None = None) -> str:
-    doc_path = path or DATA_PATH
-    vectorstore = get_vectorstore(doc_path)
-    results = vectorstore.similarity_search(query, k=k)
-    return "\n\n".join([doc.page_content for doc in results])
+def retrieve_context(
+    query: str,
+    k: int = 3,
+    path: str | None = None,
+    paths: list[str] | None = None,
+    mode: str = "chunks",
+) -> str:
+    """Context for a query: the top-k chunks, or with ``mode="summary"`` the
+    precomputed summaries of each whole document."""
+    doc_paths = list(paths or []) or [path or DATA_PATH]
+    if mode == "summary":
+        return summary_context(doc_paths)
+    results = search_documents(query, doc_paths, k=k)
+    return "\n\n".join(
+        f"[source: {doc.metadata['source']}, chunk {doc.metadata['chunk']}]\n{doc.page_content}"
+        for doc, _ in results
+    )
@@ -0,0 +1,353 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Generator, TypeVar
+
+from src.backend.agent.cancellation import TurnCancelled, check_cancelled, current_token
+
+T = TypeVar("T")
+logger = logging.getLogger(__name__)
+
+_RETRYABLE_STATUS = {408, 409, 429}
+_RETRYABLE_NAMES = {"APITimeoutError", "APIConnectionError", "ServiceUnavailable", "DeadlineExceeded"}
+
+
+class AttemptTimeout(TimeoutError):
+    pass
+
+
+@dataclass
+class ResilienceConfig:
+    """Timeouts, retries and hedging for model calls; 0 retries or hedges
+    disables that part."""
+
+    attempt_timeout_s: float = 60.0
+    max_retries: int = 2
+    retry_base_s: float = 0.5
+    retry_max_s: float = 8.0
+    max_hedges: int = 0
+    hedge_percentile: float = 95.0
+    hedge_min_s: float = 1.0
+    hedge_initial_s: float = 10.0
+    hedge_min_samples: int = 20
+
+    @classmethod
+    def from_env(cls) -> "ResilienceConfig":
+        return cls(
+            attempt_timeout_s=float(os.getenv("LLM_ATTEMPT_TIMEOUT_S", "60")),
+            max_retries=max(0, int(os.getenv("LLM_MAX_RETRIES", "2"))),
+            retry_base_s=float(os.getenv("LLM_RETRY_BASE_S", "0.5")),
+            retry_max_s=float(os.getenv("LLM_RETRY_MAX_S", "8")),
+            max_hedges=max(0, int(os.getenv("LLM_MAX_HEDGES", "0"))),
+            hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+            hedge_min_s=float(os.getenv("LLM_HEDGE_MIN_S", "1")),
+            hedge_initial_s=float(os.getenv("LLM_HEDGE_INITIAL_S", "10")),
+            hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+        )
+
+    def retry_delay(self, retry: int) -> float:
+        # Full jitter, so clients that failed together do not retry together.
+        return random.uniform(0, min(self.retry_max_s, self.retry_base_s * 2**retry))
+
+
+class LatencyWindow:
+    """Recent successful attempt latencies per model, for the hedge delay."""
+
+    def __init__(self, size: int = 200) -> None:
+        self.size = size
+        self._samples: dict[str, deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.size)).append(seconds)
+
+    def percentile(self, key: str, percentile: float) -> tuple[float | None, int]:
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if not samples:
+            return None, 0
+        index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+        return samples[index], len(samples)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+
+_latencies = LatencyWindow(int(os.getenv("LLM_HEDGE_WINDOW", "200")))
+
+
+def hedge_delay(key: str, config: ResilienceConfig) -> float | None:
+    if not config.max_hedges:
+        return None
+    value, samples = _latencies.percentile(key, config.hedge_percentile)
+    if value is None or samples < config.hedge_min_samples:
+        value = config.hedge_initial_s
+    return max(config.hedge_min_s, value)
+
+
+def client_timeouts(config: ResilienceConfig | None = None) -> dict[str, Any]:
+    """Chat model kwargs: the client enforces the attempt timeout and leaves
+    retries to this module, so they are not multiplied."""
+    config = config or ResilienceConfig.from_env()
+    return {"timeout": config.attempt_timeout_s, "max_retries": 0}
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    # By name, so provider SDKs (and wrappers that subclass them) need not be imported.
+    if any(cls.__name__ in _RETRYABLE_NAMES for cls in type(exc).__mro__):
+        return True
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    if status is None:
+        status = getattr(exc, "code", None)
+    return isinstance(status, int) and (status in _RETRYABLE_STATUS or status >= 500)
+
+
+@dataclass
+class ModelCallStats:
+    """Totals for the model calls made inside ``track_model_calls``."""
+
+    calls: int = 0
+    attempts: int = 0
+    retries: int = 0
+    timeouts: int = 0
+    hedges: int = 0
+    hedge_wins: int = 0
+    cancelled: int = 0
+    errors: list[str] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, **counts: int) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def error(self, exc: BaseException) -> None:
+        with self._lock:
+            # Enough to see what was retried without bloating the span.
+            if len(self.errors) < 5:
+                self.errors.append(f"{type(exc).__name__}: {exc}"[:200])
+
+    def as_metadata(self) -> dict[str, Any]:
+        return {
+            "llm_calls_resilient": self.calls,
+            "llm_attempts": self.attempts,
+            "llm_retries": self.retries,
+            "llm_attempt_timeouts": self.timeouts,
+            "llm_hedges": self.hedges,
+            "llm_hedge_wins": self.hedge_wins,
+            "llm_attempts_cancelled": self.cancelled,
+            "llm_attempt_errors": list(self.errors),
+        }
+
+
+_STATS: ContextVar[ModelCallStats | None] = ContextVar("model_call_stats", default=None)
+
+
+@contextmanager
+def track_model_calls() -> Generator[ModelCallStats, None, None]:
+    stats = ModelCallStats()
+    token = _STATS.set(stats)
+    try:
+        yield stats
+    finally:
+        _STATS.reset(token)
+
+
+def _stats() -> ModelCallStats:
+    # Calls outside a tracked turn still work; their counts are dropped.
+    return _STATS.get() or ModelCallStats()
+
+
+@lru_cache(maxsize=1)
+def _pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=int(os.getenv("LLM_ATTEMPT_WORKERS", "32")), thread_name_prefix="llm-attempt"
+    )
+
+
+def _hedged(fn: Callable[[], T], key: str, config: ResilienceConfig, stats: ModelCallStats) -> T:
+    delay = hedge_delay(key, config)
+    token = current_token()
+    if token is not None:
+        token.raise_if_cancelled()
+    if delay is None and token is None:
+        # Without hedging or a cancel token the call runs inline; the
+        # client's own timeout (see ``client_timeouts``) is the per-attempt
+        # timeout.
+        stats.add(attempts=1)
+        started = time.monotonic()
+        try:
+            result = fn()
+        except Exception as exc:
+            stats.error(exc)
+            raise
+        _latencies.record(key, time.monotonic() - started)
+        return result
+    # future -> (started, is_hedge)
+    attempts: dict[Future, tuple[float, bool]] = {}
+    hedges = 0
+    last_error: BaseException | None = None
+
+    def start(is_hedge: bool) -> None:
+        # Each attempt runs with the caller's context (callbacks, current span).
+        context = contextvars.copy_context()
+        attempts[_pool().submit(context.run, fn)] = (time.monotonic(), is_hedge)
+        stats.add(attempts=1)
+
+    start(False)
+    hedge_at = time.monotonic() + delay if delay is not None else None
+    while attempts:
+        wake = [started + config.attempt_timeout_s for started, _ in attempts.values()]
+        if hedge_at is not None and hedges < config.max_hedges:
+            wake.append(hedge_at)
+        waiting = list(attempts) + ([token.future] if token is not None else [])
+        done, _ = wait(waiting, timeout=max(0.0, min(wake) - time.monotonic()), return_when=FIRST_COMPLETED)
+        if token is not None and token.cancelled:
+            # Running attempts are abandoned like hedge losers.
+            for future in attempts:
+                future.cancel()
+            stats.add(cancelled=len(attempts))
+            raise TurnCancelled(token.reason or "cancelled")
+        for future in done:
+            started, is_hedge = attempts.pop(future)
+            error = future.exception()
+            if error is None:
+                _latencies.record(key, time.monotonic() - started)
+                # Threads cannot be interrupted: a losing attempt is cancelled
+                # if still queued, otherwise its result is discarded and the
+                # client timeout bounds how long it keeps running.
+                for loser in attempts:
+                    loser.cancel()
+                stats.add(hedge_wins=int(is_hedge), cancelled=len(attempts))
+                return future.result()
+            last_error = error
+            stats.error(error)
+        now = time.monotonic()
+        for future, (started, _) in list(attempts.items()):
+            if now >= started + config.attempt_timeout_s:
+                attempts.pop(future)
+                future.cancel()
+                stats.add(timeouts=1)
+                last_error = AttemptTimeout(f"model call exceeded {config.attempt_timeout_s:g}s")
+        if attempts and hedge_at is not None and hedges < config.max_hedges and now >= hedge_at:
+            hedges += 1
+            stats.add(hedges=1)
+            start(True)
+            hedge_at = now + delay
+    raise last_error or AttemptTimeout("model call produced no result")
+
+
+def call_with_resilience(fn: Callable[[], T], *, key: str, config: ResilienceConfig | None = None) -> T:
+    """Run a blocking model call with per-attempt timeouts, jittered retries
+    and, when ``LLM_MAX_HEDGES`` is set, hedged duplicates.
+
+    A hedge starts once the first attempt has been running longer than the
+    recent ``LLM_HEDGE_PERCENTILE`` latency for ``key`` (usually the model
+    name); the first attempt to succeed wins. Inside a cancellation scope
+    attempts run on the attempt pool so a cancel returns immediately.
+    """
+    config = config or ResilienceConfig.from_env()
+    stats = _stats()
+    stats.add(calls=1)
+    for retry in range(config.max_retries + 1):
+        try:
+            return _hedged(fn, key, config, stats)
+        except Exception as exc:
+            if retry == config.max_retries or not is_retryable(exc):
+                raise
+            stats.add(retries=1)
+            pause = config.retry_delay(retry)
+            logger.info("Retrying %s in %.2fs after %s", key, pause, type(exc).__name__)
+            token = current_token()
+            if token is None:
+                time.sleep(pause)
+            else:
+                wait([token.future], timeout=pause)
+    raise AssertionError("unreachable")
+
+
+async def _hedged_async(
+    factory: Callable[[], Awaitable[T]], key: str, config: ResilienceConfig, stats: ModelCallStats
+) -> T:
+    delay = hedge_delay(key, config)
+    attempts: dict[asyncio.Task, tuple[float, bool]] = {}
+    hedges = 0
+    last_error: BaseException | None = None
+
+    async def attempt() -> T:
+        return await asyncio.wait_for(factory(), timeout=config.attempt_timeout_s)
+
+    def start(is_hedge: bool) -> None:
+        attempts[asyncio.ensure_future(attempt())] = (time.monotonic(), is_hedge)
+        stats.add(attempts=1)
+
+    start(False)
+    hedge_at = time.monotonic() + delay if delay is not None else None
+    try:
+        while attempts:
+            timeout = None
+            if hedge_at is not None and hedges < config.max_hedges:
+                timeout = max(0.0, hedge_at - time.monotonic())
+            done, _ = await asyncio.wait(list(attempts), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                started, is_hedge = attempts.pop(task)
+                error = task.exception()
+                if error is None:
+                    _latencies.record(key, time.monotonic() - started)
+                    stats.add(hedge_wins=int(is_hedge), cancelled=len(attempts))
+                    return task.result()
+                if isinstance(error, asyncio.TimeoutError):
+                    stats.add(timeouts=1)
+                    error = AttemptTimeout(f"model call exceeded {config.attempt_timeout_s:g}s")
+                last_error = error
+                stats.error(error)
+            if attempts and hedge_at is not None and hedges < config.max_hedges and time.monotonic() >= hedge_at:
+                hedges += 1
+                stats.add(hedges=1)
+                start(True)
+                hedge_at = time.monotonic() + delay
+    finally:
+        # Losers (and everything, if the caller was cancelled) stop here.
+        for task in attempts:
+            task.cancel()
+        if attempts:
+            await asyncio.gather(*attempts, return_exceptions=True)
+    raise last_error or AttemptTimeout("model call produced no result")
+
+
+async def call_with_resilience_async(
+    factory: Callable[[], Awaitable[T]], *, key: str, config: ResilienceConfig | None = None
+) -> T:
+    """Async counterpart of ``call_with_resilience``; ``factory`` must create
+    a fresh awaitable per attempt. Losing attempts are cancelled."""
+    check_cancelled()
+    config = config or ResilienceConfig.from_env()
+    stats = _stats()
+    stats.add(calls=1)
+    for retry in range(config.max_retries + 1):
+        try:
+            return await _hedged_async(factory, key, config, stats)
+        except Exception as exc:
+            if retry == config.max_retries or not is_retryable(exc):
+                raise
+            stats.add(retries=1)
+            pause = config.retry_delay(retry)
+            logger.info("Retrying %s in %.2fs after %s", key, pause, type(exc).__name__)
+            await asyncio.sleep(pause)
+    raise AssertionError("unreachable")
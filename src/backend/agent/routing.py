@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+_ANALYTIC = re.compile(
+    r"\b(summar\w*|compar\w*|contradict\w*|inconsisten\w*|timeline|analy[sz]\w*|explain\w*|why|"
+    r"evidence|list (all|every)|key (events|facts|points)|cross-?referenc\w*|differen\w*|assess\w*)\b",
+    re.IGNORECASE,
+)
+_SMALL_TALK = re.compile(
+    r"^\W*((thanks?( you)?|thx|ok(ay)?|great|cool|got it|perfect|nice|hi|hello|hey|yes|no|sure|please)"
+    r"[\s,.!]*)+$",
+    re.IGNORECASE,
+)
+_REWRITE = re.compile(
+    r"\b(shorter|longer|rephrase|reword|simplif\w*|bullet( points)?|more concise|tl;?dr|"
+    r"translate|in one sentence|reformat)\b",
+    re.IGNORECASE,
+)
+
+# Logistic weights for the probability that a turn needs the strong tier.
+# Hand-set from the eval cases; every feature is computable without a model.
+WEIGHTS = {
+    "bias": -1.0,
+    "words": 0.08,
+    "analytic": 2.5,
+    "small_talk": -3.0,
+    "rewrite": -2.0,
+    "documents": 0.8,
+    "previous_tools": 0.7,
+    "question": 0.4,
+}
+
+
+def _parse_tiers(raw: str) -> dict[str, str]:
+    tiers: dict[str, str] = {}
+    for entry in raw.split(","):
+        if "=" not in entry:
+            continue
+        tier, model = entry.split("=", 1)
+        tiers[tier.strip()] = model.strip()
+    return tiers
+
+
+def default_model(framework: str) -> str | None:
+    # None lets the ADK runtime fall back to GOOGLE_ADK_MODEL.
+    if framework == "google_adk":
+        return os.getenv("GOOGLE_ADK_MODEL") or None
+    return os.getenv("DEFAULT_LLM_MODEL") or None
+
+
+@dataclass
+class RouterConfig:
+    tiers: dict[str, str] = field(default_factory=dict)
+    threshold: float = 0.5
+    force_tier: str | None = None
+
+    @classmethod
+    def from_env(cls, framework: str = "langgraph") -> "RouterConfig":
+        variable = "GOOGLE_ADK_MODEL_TIERS" if framework == "google_adk" else "MODEL_TIERS"
+        return cls(
+            tiers=_parse_tiers(os.getenv(variable, "")),
+            threshold=float(os.getenv("ROUTER_THRESHOLD", "0.5")),
+            force_tier=os.getenv("ROUTER_FORCE_TIER") or None,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.tiers)
+
+
+@dataclass
+class RoutingDecision:
+    tier: str
+    model: str | None
+    reason: str
+    score: float | None = None
+    features: dict[str, float] = field(default_factory=dict)
+
+    def as_metadata(self) -> dict[str, Any]:
+        return {
+            "routing_tier": self.tier,
+            "routing_model": self.model,
+            "routing_reason": self.reason,
+            "routing_score": None if self.score is None else round(self.score, 3),
+            "routing_features": self.features,
+        }
+
+
+def turn_features(message: str, has_documents: bool, previous_tool_calls: int | None) -> dict[str, float]:
+    text = message.strip()
+    return {
+        "words": float(min(len(text.split()), 30)),
+        "analytic": float(bool(_ANALYTIC.search(text))),
+        "small_talk": float(len(text) <= 60 and bool(_SMALL_TALK.match(text))),
+        "rewrite": float(bool(_REWRITE.search(text))),
+        "documents": float(has_documents),
+        "previous_tools": float(bool(previous_tool_calls)),
+        "question": float("?" in text),
+    }
+
+
+def strong_probability(features: dict[str, float]) -> float:
+    logit = WEIGHTS["bias"] + sum(WEIGHTS[name] * value for name, value in features.items())
+    return 1 / (1 + math.exp(-logit))
+
+
+def route_turn(
+    message: str,
+    *,
+    has_documents: bool,
+    previous_tool_calls: int | None = None,
+    framework: str = "langgraph",
+    override: str | None = None,
+    config: RouterConfig | None = None,
+) -> RoutingDecision:
+    """Pick a model tier for one turn from cheap local signals.
+
+    Without configured tiers every turn keeps the framework's default model.
+    ``override`` (per request) and ``ROUTER_FORCE_TIER`` bypass the
+    classifier but still record its score.
+    """
+    config = config or RouterConfig.from_env(framework)
+    if not config.enabled:
+        return RoutingDecision(tier="default", model=default_model(framework), reason="disabled")
+    features = turn_features(message, has_documents, previous_tool_calls)
+    score = strong_probability(features)
+    forced = override or config.force_tier
+    if forced:
+        if forced not in config.tiers:
+            raise ValueError(f"Unknown model tier {forced!r}; configured: {', '.join(config.tiers)}")
+        tier, reason = forced, "override"
+    else:
+        tier, reason = ("strong" if score >= config.threshold else "fast"), "classifier"
+    return RoutingDecision(
+        tier=tier,
+        model=config.tiers.get(tier) or default_model(framework),
+        reason=reason,
+        score=score,
+        features=features,
+    )
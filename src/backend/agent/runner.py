@@ -3,9 +3,8 @@ from __future__ import annotations
 import os
 from typing import Any, Literal
 
-from src.backend.agent.google_adk_agent import run_google_adk_agent
-from src.backend.agent.langgraph_agent import run_langgraph_agent
-from src.backend.agent.openai_agents_agent import run_openai_agents_agent
+from src.backend.agent.budget import TurnBudget
+from src.backend.agent.cancellation import CancelToken, cancellation_scope
 from src.backend.agent.types import AgentTurnResult
 
 AgentFramework = Literal["langgraph", "openai_agents", "google_adk"]
@@ -26,37 +25,88 @@ def run_agent_turn(
     conversation_id: str,
     thread_id: str,
     user_message: str,
-    document_path: str | None,
+    document_paths: list[str],
     model_name: str | None = None,
     callbacks: list[Any] | None = None,
     metadata: dict[str, Any] | None = None,
+    budget: TurnBudget | None = None,
+    cancel: CancelToken | None = None,
 ) -> AgentTurnResult:
+    """Run one turn on the selected runtime.
+
+    Cancelling ``cancel`` raises ``TurnCancelled`` from the next graph step,
+    tool call or model call, and aborts in-flight model requests.
+    """
+    with cancellation_scope(cancel):
+        return _run_agent_turn(
+            framework=framework,
+            conversation_id=conversation_id,
+            thread_id=thread_id,
+            user_message=user_message,
+            document_paths=document_paths,
+            model_name=model_name,
+            callbacks=callbacks,
+            metadata=metadata,
+            budget=budget,
+        )
+
+
+def _run_agent_turn(
+    *,
+    framework: AgentFramework,
+    conversation_id: str,
+    thread_id: str,
+    user_message: str,
+    document_paths: list[str],
+    model_name: str | None,
+    callbacks: list[Any] | None,
+    metadata: dict[str, Any] | None,
+    budget: TurnBudget | None,
+) -> AgentTurnResult:
+    # Framework modules are imported on first use so a worker only pays for
+    # the runtime it is configured to serve.
+    budget = budget or TurnBudget.from_env()
     if framework == "langgraph":
+        from src.backend.agent.graph import usage_from_state
+        from src.backend.agent.langgraph_agent import run_langgraph_agent
+
         state = run_langgraph_agent(
             conversation_id=conversation_id,
             thread_id=thread_id,
             user_message=user_message,
-            document_path=document_path,
+            document_paths=document_paths,
             model_name=model_name,
             callbacks=callbacks,
             metadata=metadata,
+            budget=budget,
         )
         last = state["messages"][-1]
-        return AgentTurnResult(assistant_message=getattr(last, "content", str(last)), raw_state=state)
+        return AgentTurnResult(
+            assistant_message=getattr(last, "content", str(last)),
+            raw_state=state,
+            usage=usage_from_state(state),
+            budget_exhausted=state.get("budget_exhausted"),
+        )
 
     if framework == "openai_agents":
+        from src.backend.agent.openai_agents_agent import run_openai_agents_agent
+
         return run_openai_agents_agent(
             conversation_id=conversation_id,
             thread_id=thread_id,
             user_message=user_message,
-            document_path=document_path,
+            document_paths=document_paths,
             model_name=model_name,
+            budget=budget,
         )
 
+    from src.backend.agent.google_adk_agent import run_google_adk_agent
+
     return run_google_adk_agent(
         conversation_id=conversation_id,
         thread_id=thread_id,
         user_message=user_message,
-        document_path=document_path,
+        document_paths=document_paths,
         model_name=model_name,
+        budget=budget,
     )
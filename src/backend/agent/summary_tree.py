@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable
+
+SUMMARY_FILE = "summary_tree.json"
+SUMMARY_VERSION = "tree-1"
+
+SECTION_INSTRUCTIONS = (
+    "Summarize this section of a deposition transcript. Keep names, dates, places, "
+    "exhibits and who said what. Reply with the summary only."
+)
+COMBINE_INSTRUCTIONS = (
+    "These are summaries of consecutive parts of one deposition transcript, in order. "
+    "Combine them into one summary of the whole span, keeping the key events in "
+    "chronological order with names, dates and exhibits. Reply with the summary only."
+)
+
+# (instructions, text) -> summary
+Summarizer = Callable[[str, str], str]
+
+
+@dataclass
+class SummaryConfig:
+    section_chars: int = 6000
+    fanout: int = 8
+    concurrency: int = 8
+    model: str = "gpt-4o-mini"
+    max_context_chars: int = 12000
+
+    @classmethod
+    def from_env(cls) -> "SummaryConfig":
+        return cls(
+            section_chars=int(os.getenv("RAG_SUMMARY_SECTION_CHARS", "6000")),
+            fanout=max(2, int(os.getenv("RAG_SUMMARY_FANOUT", "8"))),
+            concurrency=max(1, int(os.getenv("RAG_SUMMARY_CONCURRENCY", "8"))),
+            model=os.getenv("RAG_SUMMARY_MODEL") or os.getenv("DEFAULT_LLM_MODEL", "gpt-4o-mini"),
+            max_context_chars=int(os.getenv("RAG_SUMMARY_MAX_CHARS", "12000")),
+        )
+
+
+def llm_summarizer(model_name: str) -> Summarizer:
+    from langchain.chat_models import init_chat_model
+
+    model = init_chat_model(model_name, temperature=0)
+
+    def summarize(instructions: str, text: str) -> str:
+        response = model.invoke(
+            [{"role": "system", "content": instructions}, {"role": "user", "content": text}]
+        )
+        return str(response.content).strip()
+
+    return summarize
+
+
+def group_sections(chunks: list[str], section_chars: int) -> list[tuple[int, int]]:
+    """Consecutive chunk ranges ``[start, end)`` of at most ``section_chars``."""
+    sections = []
+    start, size = 0, 0
+    for position, chunk in enumerate(chunks):
+        if position > start and size + len(chunk) > section_chars:
+            sections.append((start, position))
+            start, size = position, 0
+        size += len(chunk)
+    if start < len(chunks):
+        sections.append((start, len(chunks)))
+    return sections
+
+
+def build_summary_tree(
+    chunks: list[str], summarize: Summarizer, config: SummaryConfig
+) -> dict[str, Any]:
+    """Map-reduce a document into a tree of summaries.
+
+    Sections are summarized in parallel, then every ``fanout`` neighbouring
+    summaries are combined (also in parallel) until one document summary is
+    left. ``levels[0]`` holds the sections and ``levels[-1]`` the root; each
+    node records the chunk range it covers.
+    """
+    sections = group_sections(chunks, config.section_chars)
+    levels: list[list[dict[str, Any]]] = []
+    with ThreadPoolExecutor(max_workers=config.concurrency) as pool:
+        summaries = pool.map(
+            lambda section: summarize(SECTION_INSTRUCTIONS, "\n\n".join(chunks[section[0] : section[1]])),
+            sections,
+        )
+        level = [
+            {"start": start, "end": end, "summary": summary}
+            for (start, end), summary in zip(sections, summaries)
+        ]
+        levels.append(level)
+        while len(level) > 1:
+            groups = [level[i : i + config.fanout] for i in range(0, len(level), config.fanout)]
+            summaries = pool.map(
+                lambda group: summarize(
+                    COMBINE_INSTRUCTIONS,
+                    "\n\n".join(f"Part {n}:\n{node['summary']}" for n, node in enumerate(group, start=1)),
+                ),
+                groups,
+            )
+            level = [
+                {"start": group[0]["start"], "end": group[-1]["end"], "summary": summary}
+                for group, summary in zip(groups, summaries)
+            ]
+            levels.append(level)
+    return {
+        "version": SUMMARY_VERSION,
+        "model": config.model,
+        "section_chars": config.section_chars,
+        "fanout": config.fanout,
+        "levels": levels,
+    }
+
+
+def read_summary_tree(directory: str, config: SummaryConfig) -> dict[str, Any] | None:
+    try:
+        with open(os.path.join(directory, SUMMARY_FILE), "r", encoding="utf-8") as handle:
+            tree = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    expected = (SUMMARY_VERSION, config.model, config.section_chars, config.fanout)
+    if (tree.get("version"), tree.get("model"), tree.get("section_chars"), tree.get("fanout")) != expected:
+        return None
+    return tree
+
+
+def write_summary_tree(directory: str, tree: dict[str, Any]) -> None:
+    # The index directory is already published; replace atomically.
+    temp_path = os.path.join(directory, f"{SUMMARY_FILE}.tmp-{os.getpid()}")
+    with open(temp_path, "w", encoding="utf-8") as handle:
+        json.dump(tree, handle)
+    os.replace(temp_path, os.path.join(directory, SUMMARY_FILE))
+
+
+def summary_nodes(tree: dict[str, Any], max_chars: int) -> list[dict[str, Any]]:
+    """The most detailed level that fits in ``max_chars`` (the root otherwise)."""
+    levels = tree.get("levels") or []
+    for level in levels:
+        if sum(len(node["summary"]) for node in level) <= max_chars:
+            return level
+    return levels[-1] if levels else []
@@ -1,34 +1,35 @@
 import os
 from typing import List
 
-from braintrust import Attachment, current_span, traced
-from tavily import TavilyClient
+from braintrust import current_span, traced
 
-from src.backend.agent.rag import retrieve_context
+from src.backend.agent.cancellation import check_cancelled
 
 
 @traced(name="rag_retrieve")
-def rag_tool(query: str, k: int = 3, document_path: str | None = None) -> str:
-    if document_path:
-        span = current_span()
-        try:
-            attachment = Attachment(
-                data=document_path,
-                filename=os.path.basename(document_path),
-                content_type="application/pdf" if document_path.lower().endswith(".pdf") else "text/plain",
-            )
-            span.log(
-                metadata={"rag_document_path": document_path},
-                input={"document": attachment},
-            )
-        except Exception:
-            # Avoid failing tool execution if attachment logging fails.
-            span.log(metadata={"rag_document_path": document_path})
-    return retrieve_context(query, k=k, path=document_path)
+def rag_tool(
+    query: str, k: int = 3, document_paths: List[str] | None = None, mode: str = "chunks"
+) -> str:
+    check_cancelled()
+    current_span().log(metadata={"rag_mode": mode})
+    from src.backend.agent.rag import document_label, retrieve_context
+
+    if document_paths:
+        # The documents themselves are attached once, when uploaded.
+        current_span().log(
+            metadata={
+                "rag_document_paths": document_paths,
+                "rag_documents": [document_label(path) for path in document_paths],
+            }
+        )
+    return retrieve_context(query, k=k, paths=document_paths, mode=mode)
 
 
 @traced(name="web_search")
 def web_search_tool(query: str, max_results: int = 3) -> str:
+    check_cancelled()
+    from tavily import TavilyClient
+
     api_key = os.getenv("TAVILY_API_KEY")
     client = TavilyClient(api_key=api_key)
     results = client.search(query, max_results=max_results)
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Generator
+
+_CAPTURE: ContextVar[list[Any] | None] = ContextVar("trace_capture", default=None)
+_stats_lock = threading.Lock()
+_stats = {"turns_sampled": 0, "turns_dropped": 0, "turns_forced": 0, "events_dropped": 0}
+
+
+def sample_rate() -> float:
+    return min(1.0, max(0.0, float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))))
+
+
+def head_sample(conversation_id: str, rate: float | None = None) -> bool:
+    """Deterministic per-conversation decision, so every worker agrees."""
+    rate = sample_rate() if rate is None else rate
+    if rate >= 1.0:
+        return True
+    digest = hashlib.sha256(conversation_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64 < rate
+
+
+class SamplingBackgroundLogger:
+    """Wraps the SDK background logger and diverts events logged while a
+    turn's child spans are being captured (see ``sample_children``)."""
+
+    def __init__(self, inner: Any) -> None:
+        self.inner = inner
+
+    def log(self, *events: Any) -> None:
+        buffer = _CAPTURE.get()
+        if buffer is not None:
+            buffer.extend(events)
+            return
+        self.inner.log(*events)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.inner, name)
+
+
+@dataclass
+class SamplingDecision:
+    sampled: bool
+    kept: bool = True
+    reason: str = "sampled"
+
+    def as_metadata(self) -> dict[str, Any]:
+        return {"trace_sampled": self.sampled, "trace_children_kept": self.kept, "trace_keep_reason": self.reason}
+
+
+@contextmanager
+def sample_children(sampled: bool, slow_turn_s: float | None = None) -> Generator[SamplingDecision, None, None]:
+    """Keep or drop the spans logged inside the block.
+
+    Unsampled turns buffer their child spans; the buffer is discarded when
+    the turn ends, unless it raised or took longer than ``slow_turn_s``, in
+    which case the spans are logged after all.
+    """
+    decision = SamplingDecision(sampled=sampled)
+    if sampled:
+        with _stats_lock:
+            _stats["turns_sampled"] += 1
+        yield decision
+        return
+    if slow_turn_s is None:
+        slow_turn_s = float(os.getenv("TRACE_SLOW_TURN_S", "30"))
+    buffer: list[Any] = []
+    token = _CAPTURE.set(buffer)
+    started = time.monotonic()
+    try:
+        yield decision
+    except BaseException:
+        decision.kept, decision.reason = True, "forced_error"
+        raise
+    else:
+        if time.monotonic() - started >= slow_turn_s:
+            decision.kept, decision.reason = True, "forced_slow"
+        else:
+            decision.kept, decision.reason = False, "unsampled"
+    finally:
+        _CAPTURE.reset(token)
+        with _stats_lock:
+            key = "turns_forced" if decision.kept else "turns_dropped"
+            _stats[key] += 1
+            if not decision.kept:
+                _stats["events_dropped"] += len(buffer)
+        if decision.kept and buffer:
+            _forward(buffer)
+
+
+def _forward(events: list[Any]) -> None:
+    try:
+        from braintrust.logger import _state
+
+        _state.global_bg_logger().log(*events)
+    except Exception:
+        logging.getLogger(__name__).exception("Could not log force-sampled spans")
+
+
+def sampling_stats() -> dict[str, int]:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def install_sampler() -> None:
+    from braintrust import logger as bt_logger
+    from braintrust.util import LazyValue
+
+    state = getattr(bt_logger, "_state", None)
+    if state is None or not hasattr(state, "_global_bg_logger"):
+        logging.getLogger(__name__).warning("Braintrust SDK layout changed; trace sampling disabled")
+        return
+    current = state._global_bg_logger
+    state._global_bg_logger = LazyValue(
+        lambda: SamplingBackgroundLogger(current.get()), use_mutex=True
+    )
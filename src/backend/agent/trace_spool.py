@@ -0,0 +1,618 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable
+
+SEGMENT_SUFFIX = ".jsonl"
+PROGRESS_SUFFIX = ".shipped"
+# install_spool swaps the SDK's private background logger and reads span
+# records before their parent ids resolve; both are checked against these
+# releases only.
+SUPPORTED_SDK_VERSIONS = {(0, 5)}
+# What _deferred_span_row reads from a span record's closure and its span.
+SPAN_RECORD_FREEVARS = frozenset({"self", "serializable_partial_record", "lazy_partial_record"})
+SPAN_PARENT_ATTRIBUTES = frozenset(
+    {"parent_object_type", "parent_object_id", "parent_compute_object_metadata_args"}
+)
+
+
+@dataclass
+class SpoolConfig:
+    directory: str
+    max_bytes: int
+    segment_bytes: int
+    drop_policy: str
+    max_pending_events: int
+    batch_rows: int
+    base_backoff_s: float
+    max_backoff_s: float
+    event_attempts: int = 5
+
+    @classmethod
+    def from_env(cls) -> "SpoolConfig":
+        drop_policy = os.getenv("TRACE_SPOOL_DROP_POLICY", "oldest").strip().lower()
+        if drop_policy not in {"oldest", "newest"}:
+            raise ValueError("TRACE_SPOOL_DROP_POLICY must be 'oldest' or 'newest'")
+        return cls(
+            directory=os.getenv("TRACE_SPOOL_DIR", "./data/trace_spool"),
+            max_bytes=int(float(os.getenv("TRACE_SPOOL_MAX_MB", "256")) * 1024 * 1024),
+            segment_bytes=int(float(os.getenv("TRACE_SPOOL_SEGMENT_KB", "1024")) * 1024),
+            drop_policy=drop_policy,
+            max_pending_events=int(os.getenv("TRACE_SPOOL_MAX_PENDING", "10000")),
+            batch_rows=int(os.getenv("TRACE_SPOOL_BATCH_ROWS", "100")),
+            base_backoff_s=float(os.getenv("TRACE_SPOOL_BACKOFF_S", "1")),
+            max_backoff_s=float(os.getenv("TRACE_SPOOL_MAX_BACKOFF_S", "300")),
+            event_attempts=int(os.getenv("TRACE_SPOOL_EVENT_ATTEMPTS", "5")),
+        )
+
+
+class TraceSpool:
+    """Append-only, size-capped spool of trace records on local disk.
+
+    Records are appended as JSON lines to the newest segment file; segments
+    are sealed when they reach ``segment_bytes`` (or when the shipper asks
+    for one) and are shipped and deleted oldest-first. When the spool would
+    exceed ``max_bytes``, either the oldest sealed segments are deleted or
+    the new records are rejected, depending on ``drop_policy``. How much of
+    a segment has been shipped is kept next to it, so a retry resumes there.
+    """
+
+    def __init__(self, config: SpoolConfig) -> None:
+        self.config = config
+        os.makedirs(self.attachments_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        existing = self._segments()
+        self._sequence = self._segment_number(existing[-1]) + 1 if existing else 0
+        self._size = sum(self._file_size(path) for path in existing)
+        self.dropped_records = 0
+
+    @property
+    def attachments_dir(self) -> str:
+        return os.path.join(self.config.directory, "attachments")
+
+    @staticmethod
+    def _segment_number(path: str) -> int:
+        return int(os.path.basename(path)[: -len(SEGMENT_SUFFIX)])
+
+    @staticmethod
+    def _file_size(path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def _segments(self) -> list[str]:
+        names = [
+            name
+            for name in os.listdir(self.config.directory)
+            if name.endswith(SEGMENT_SUFFIX) and name[: -len(SEGMENT_SUFFIX)].isdigit()
+        ]
+        return [os.path.join(self.config.directory, name) for name in sorted(names)]
+
+    def _current_path(self) -> str:
+        return os.path.join(self.config.directory, f"{self._sequence:012d}{SEGMENT_SUFFIX}")
+
+    def _delete(self, path: str) -> int:
+        size = self._file_size(path)
+        with open(path, "r", encoding="utf-8") as handle:
+            records = [json.loads(line) for line in handle if line.strip()]
+        for record in records:
+            if record.get("spooled_path"):
+                _remove_quietly(record["spooled_path"])
+        os.remove(path)
+        _remove_quietly(path + PROGRESS_SUFFIX)
+        self._size -= size
+        return len(records)
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._size
+
+    def append(self, records: list[dict[str, Any]]) -> int:
+        """Append records; returns how many were accepted."""
+        lines = "".join(json.dumps(record, default=str) + "\n" for record in records).encode()
+        with self._lock:
+            if self._size + len(lines) > self.config.max_bytes:
+                if self.config.drop_policy == "oldest":
+                    current = self._current_path()
+                    for path in self._segments():
+                        if self._size + len(lines) <= self.config.max_bytes:
+                            break
+                        if path == current:
+                            self._sequence += 1  # The batch starts a new segment.
+                        self.dropped_records += self._delete(path)
+                if self._size + len(lines) > self.config.max_bytes:
+                    self.dropped_records += len(records)
+                    return 0
+            with open(self._current_path(), "ab") as handle:
+                handle.write(lines)
+            self._size += len(lines)
+            if self._file_size(self._current_path()) >= self.config.segment_bytes:
+                self._sequence += 1
+        return len(records)
+
+    def oldest_segment(self) -> str | None:
+        """Oldest sealed segment, sealing the current one if nothing else is ready."""
+        with self._lock:
+            segments = self._segments()
+            current = self._current_path()
+            sealed = [path for path in segments if path != current]
+            if not sealed and current in segments:
+                self._sequence += 1
+                sealed = [current]
+            return sealed[0] if sealed else None
+
+    def read(self, path: str) -> list[dict[str, Any]]:
+        with open(path, "r", encoding="utf-8") as handle:
+            return [json.loads(line) for line in handle if line.strip()]
+
+    def progress(self, path: str) -> dict[str, int]:
+        """Rows and attachments of ``path`` already shipped."""
+        try:
+            with open(path + PROGRESS_SUFFIX, "r", encoding="utf-8") as handle:
+                return {"rows": 0, "attachments": 0, **json.load(handle)}
+        except (OSError, ValueError):
+            return {"rows": 0, "attachments": 0}
+
+    def save_progress(self, path: str, progress: dict[str, int]) -> None:
+        with self._lock:
+            if not os.path.exists(path):
+                return  # Dropped by the size cap meanwhile.
+            temporary = f"{path}{PROGRESS_SUFFIX}.tmp"
+            with open(temporary, "w", encoding="utf-8") as handle:
+                json.dump(progress, handle)
+            os.replace(temporary, path + PROGRESS_SUFFIX)
+
+    def ack(self, path: str) -> None:
+        with self._lock:
+            if os.path.exists(path):
+                self._delete(path)
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _deferred_span_row(event: Any) -> tuple[dict[str, Any], dict[str, Any]] | None:
+    """Split a project-log span record whose project id is not known yet into
+    its row and what resolves the id, so it is spooled without a login.
+
+    Returns None for anything else, which is resolved on the spot.
+    """
+    from braintrust.span_identifier_v3 import SpanObjectTypeV3
+
+    compute = getattr(event, "callable", None)
+    code = getattr(compute, "__code__", None)
+    if code is None or not compute.__closure__:
+        return None
+    try:
+        cells = {name: cell.cell_contents for name, cell in zip(code.co_freevars, compute.__closure__)}
+    except ValueError:
+        return None
+    span = cells.get("self")
+    row = cells.get("serializable_partial_record")
+    if not isinstance(row, dict) or cells.get("lazy_partial_record"):
+        return None
+    parent_id = getattr(span, "parent_object_id", None)
+    metadata_args = getattr(span, "parent_compute_object_metadata_args", None)
+    if (
+        getattr(span, "parent_object_type", None) != SpanObjectTypeV3.PROJECT_LOGS
+        or not metadata_args
+        or parent_id is None
+        or parent_id.has_succeeded
+    ):
+        return None
+    return dict(row), {"object_type": "project_logs", "metadata_args": dict(metadata_args)}
+
+
+def sdk_layout_problems() -> list[str]:
+    """List the SDK internals install_spool relies on that are missing.
+
+    An empty list means this SDK build has the layout the spool was written
+    against; anything else disables the spool rather than letting span
+    records quietly fall back to resolving their parent ids on the spot.
+    """
+    from braintrust import logger as bt_logger
+
+    problems = []
+    if not hasattr(getattr(bt_logger, "_state", None), "_global_bg_logger"):
+        problems.append("_state._global_bg_logger")
+    span_impl = getattr(bt_logger, "SpanImpl", None)
+    log_internal = getattr(span_impl, "log_internal", None)
+    records = [
+        const
+        for const in getattr(getattr(log_internal, "__code__", None), "co_consts", ())
+        if getattr(const, "co_name", None) == "compute_record"
+    ]
+    if len(records) != 1 or not SPAN_RECORD_FREEVARS <= set(records[0].co_freevars):
+        problems.append("SpanImpl.log_internal.compute_record closure")
+    init_code = getattr(getattr(span_impl, "__init__", None), "__code__", None)
+    missing = SPAN_PARENT_ATTRIBUTES - set(getattr(init_code, "co_names", ()))
+    if missing:
+        problems.append(f"SpanImpl attributes {sorted(missing)}")
+    return problems
+
+
+def _transient(exc: BaseException) -> bool:
+    from src.backend.agent.resilience import is_retryable
+
+    return is_retryable(exc) or isinstance(exc, OSError)
+
+
+def _apply_masking(row: dict[str, Any], masking_function: Callable[[Any], Any]) -> dict[str, Any]:
+    from braintrust.logger import REDACTION_FIELDS
+
+    masked = dict(row)
+    for field in REDACTION_FIELDS:
+        if field in masked:
+            try:
+                masked[field] = masking_function(masked[field])
+            except Exception:
+                masked.pop(field)
+                masked["error"] = f"Failed to mask field '{field}'"
+    return masked
+
+
+class SpoolingBackgroundLogger:
+    """Stand-in for the Braintrust SDK's background logger.
+
+    ``log`` only enqueues in memory. A writer thread resolves events (which
+    may need the API to look up project ids) and appends them to the disk
+    spool, and a shipper thread sends spooled segments with exponential
+    backoff. Request threads therefore never wait on the tracing backend.
+    Span rows whose project id is not resolved yet (no API key, backend
+    down at startup) are spooled as they are; ``resolve_parent`` fills the
+    ids in when they are shipped.
+    """
+
+    def __init__(
+        self,
+        spool: TraceSpool,
+        send_rows: Callable[[list[dict[str, Any]]], None],
+        upload_attachment: Callable[[dict[str, Any]], None],
+        resolve_parent: Callable[[dict[str, Any]], dict[str, Any]] | None = None,
+    ) -> None:
+        self.spool = spool
+        self.send_rows = send_rows
+        self.upload_attachment = upload_attachment
+        self.resolve_parent = resolve_parent
+        self._parent_fields: dict[str, dict[str, Any]] = {}
+        self.masking_function: Callable[[Any], Any] | None = None
+        self.dropped_events = 0
+        self.unconvertible_events = 0
+        # Failed conversion attempts per pending event (by identity).
+        self._attempts: dict[int, int] = {}
+        self.shipped_rows = 0
+        self._pending: deque[Any] = deque()
+        self._cond = threading.Condition()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._stop = threading.Event()
+        self._wake_shipper = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    # --- SDK background logger interface -------------------------------
+
+    def log(self, *events: Any) -> None:
+        with self._cond:
+            for event in events:
+                if len(self._pending) >= self.spool.config.max_pending_events:
+                    if self.spool.config.drop_policy == "newest":
+                        self.dropped_events += 1
+                        continue
+                    self._pending.popleft()
+                    self.dropped_events += 1
+                self._pending.append(event)
+            self._idle.clear()
+            self._cond.notify()
+
+    def flush(self, batch_size: int | None = None, timeout: float = 5.0) -> None:
+        # Only waits for events to reach the disk spool, never for the network.
+        _ = batch_size
+        self._idle.wait(timeout)
+        self._wake_shipper.set()
+
+    def enforce_queue_size_limit(self, enforce: bool) -> None:
+        _ = enforce
+
+    def set_masking_function(self, masking_function: Callable[[Any], Any] | None) -> None:
+        self.masking_function = masking_function
+
+    def internal_replace_api_conn(self, api_conn: Any) -> None:
+        _ = api_conn
+
+    # --- writer --------------------------------------------------------
+
+    def _to_records(self, event: Any) -> list[dict[str, Any]]:
+        from braintrust.logger import BaseAttachment, _extract_attachments
+
+        deferred = None if isinstance(event, dict) else _deferred_span_row(event)
+        if deferred is not None:
+            row, parent = deferred
+        else:
+            row, parent = (event if isinstance(event, dict) else event.get()), None
+        if self.masking_function is not None:
+            row = _apply_masking(row, self.masking_function)
+        attachments: list[Any] = []
+        _extract_attachments(row, attachments)
+        records: list[dict[str, Any]] = [{"kind": "row", "row": row}]
+        if parent is not None:
+            records[0]["parent"] = parent
+        for attachment in attachments:
+            if not isinstance(attachment, BaseAttachment) or not hasattr(attachment, "data"):
+                continue  # External attachments need no upload.
+            record = {"kind": "attachment", "reference": attachment.reference}
+            source = attachment.debug_info().get("input_data")
+            if isinstance(source, str) and os.path.exists(source):
+                record["path"] = source
+            else:
+                spooled = os.path.join(self.spool.attachments_dir, attachment.reference["key"])
+                with open(spooled, "wb") as handle:
+                    handle.write(attachment.data)
+                record["path"] = record["spooled_path"] = spooled
+            records.append(record)
+        return records
+
+    def write_pending(self) -> int:
+        """Spool pending events; returns how many were written.
+
+        An event that fails with a transient error (usually the backend
+        being needed to resolve ids) is retried, at most ``event_attempts``
+        times, while the events behind it go through. Any other failure, or
+        running out of attempts, drops it and counts it.
+        """
+        with self._cond:
+            events = list(self._pending)
+            self._pending.clear()
+        records: list[dict[str, Any]] = []
+        retry: list[Any] = []
+        error: Exception | None = None
+        written = 0
+        for event in events:
+            try:
+                records.extend(self._to_records(event))
+                written += 1
+            except Exception as exc:
+                attempts = self._attempts.pop(id(event), 0) + 1
+                if _transient(exc) and attempts < self.spool.config.event_attempts:
+                    self._attempts[id(event)] = attempts
+                    retry.append(event)
+                    error = error or exc
+                else:
+                    self.unconvertible_events += 1
+                    logging.getLogger(__name__).warning(
+                        "Dropping trace event after %s attempt(s)", attempts, exc_info=True
+                    )
+        if records:
+            self.spool.append(records)
+        if retry:
+            with self._cond:
+                self._pending.extendleft(reversed(retry))
+            raise error
+        return written
+
+    def _writer_loop(self) -> None:
+        failures = 0
+        while not self._stop.is_set():
+            with self._cond:
+                if not self._pending:
+                    self._idle.set()
+                    self._cond.wait(timeout=1.0)
+                    continue
+            try:
+                self.write_pending()
+                failures = 0
+                self._wake_shipper.set()
+            except Exception:
+                failures += 1
+                logging.getLogger(__name__).warning(
+                    "Could not resolve trace events; retrying", exc_info=failures == 1
+                )
+                self._stop.wait(self._backoff(failures))
+
+    # --- shipper -------------------------------------------------------
+
+    def _backoff(self, failures: int) -> float:
+        config = self.spool.config
+        delay = min(config.max_backoff_s, config.base_backoff_s * 2 ** (failures - 1))
+        return delay * (0.5 + random.random() / 2)
+
+    def _shippable_row(self, record: dict[str, Any]) -> dict[str, Any]:
+        parent = record.get("parent")
+        if parent is None:
+            return record["row"]
+        if self.resolve_parent is None:
+            raise RuntimeError("spooled row needs its parent ids resolved")
+        key = json.dumps(parent, sort_keys=True)
+        if key not in self._parent_fields:
+            self._parent_fields[key] = self.resolve_parent(parent)
+        return {**record["row"], **self._parent_fields[key]}
+
+    def ship_segment(self, path: str) -> None:
+        records = self.spool.read(path)
+        progress = self.spool.progress(path)
+        rows = [record for record in records if record.get("kind") == "row"]
+        attachments = [record for record in records if record.get("kind") == "attachment"]
+        already_shipped = progress["rows"]
+        size = max(1, self.spool.config.batch_rows)
+        for start in range(progress["rows"], len(rows), size):
+            self.send_rows([self._shippable_row(record) for record in rows[start : start + size]])
+            progress["rows"] = min(start + size, len(rows))
+            self.spool.save_progress(path, progress)
+        for position in range(progress["attachments"], len(attachments)):
+            self.upload_attachment(attachments[position])
+            progress["attachments"] = position + 1
+            self.spool.save_progress(path, progress)
+        self.spool.ack(path)
+        self.shipped_rows += len(rows) - already_shipped
+
+    def ship_once(self) -> bool:
+        """Ship the oldest segment; returns False when the spool is empty."""
+        path = self.spool.oldest_segment()
+        if path is None:
+            return False
+        try:
+            self.ship_segment(path)
+        except FileNotFoundError:
+            pass  # Dropped by the size cap while we were shipping it.
+        return True
+
+    def _shipper_loop(self) -> None:
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                shipped = self.ship_once()
+                failures = 0
+            except Exception:
+                failures += 1
+                delay = self._backoff(failures)
+                logging.getLogger(__name__).warning(
+                    "Trace shipping failed (attempt %s); retrying in %.1fs",
+                    failures,
+                    delay,
+                    exc_info=failures == 1,
+                )
+                self._stop.wait(delay)
+                continue
+            if not shipped:
+                self._wake_shipper.wait(timeout=1.0)
+                self._wake_shipper.clear()
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        for name, target in (("trace-spool-writer", self._writer_loop), ("trace-shipper", self._shipper_loop)):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Persist pending events, make one best-effort shipping pass, stop."""
+        self.flush(timeout=timeout)
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._wake_shipper.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        deadline = time.monotonic() + timeout
+        try:
+            while time.monotonic() < deadline and self.ship_once():
+                pass
+        except Exception:
+            logging.getLogger(__name__).info("Trace spool left for the next start")
+
+    def stats(self) -> dict[str, int]:
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            "pending_events": pending,
+            "spool_bytes": self.spool.size_bytes(),
+            "dropped_events": self.dropped_events + self.spool.dropped_records,
+            "unconvertible_events": self.unconvertible_events,
+            "shipped_rows": self.shipped_rows,
+        }
+
+
+def braintrust_send_rows(rows: list[dict[str, Any]]) -> None:
+    from braintrust.bt_json import bt_dumps
+    from braintrust.logger import DATA_API_VERSION, _state, login
+    from braintrust.merge_row_batch import merge_row_batch
+
+    login()
+    payload = bt_dumps({"rows": merge_row_batch(rows), "api_version": DATA_API_VERSION})
+    response = _state.api_conn().post("/logs3", data=payload.encode("utf-8"))
+    response.raise_for_status()
+
+
+def braintrust_resolve_parent(parent: dict[str, Any]) -> dict[str, Any]:
+    """Object id fields for a spooled row's project, registering it if needed."""
+    from braintrust.logger import _compute_logger_metadata, _get_exporter
+    from braintrust.span_identifier_v3 import SpanObjectTypeV3
+
+    metadata = _compute_logger_metadata(**parent["metadata_args"])
+    exporter = _get_exporter()
+    return exporter(
+        object_type=SpanObjectTypeV3[parent["object_type"].upper()], object_id=metadata.project.id
+    ).object_id_fields()
+
+
+def braintrust_upload_attachment(record: dict[str, Any]) -> None:
+    from braintrust import Attachment
+
+    reference = record["reference"]
+    try:
+        attachment = Attachment(
+            data=record["path"],
+            filename=reference["filename"],
+            content_type=reference["content_type"],
+        )
+    except OSError:
+        # The source file is gone (e.g. removed by the janitor); nothing to send.
+        logging.getLogger(__name__).warning("Dropping attachment %s: file missing", reference["key"])
+        return
+    # Keep the key the spooled row already references.
+    attachment.reference["key"] = reference["key"]
+    status = attachment.upload()
+    if status.get("upload_status") == "error":
+        raise RuntimeError(status.get("error_message") or "attachment upload failed")
+
+
+def logs3_http_sender(base_url: str, api_key: str, timeout: float = 10.0) -> Callable[[list[dict[str, Any]]], None]:
+    """Plain HTTP /logs3 sender, for tests and self-hosted ingestion endpoints."""
+    import requests
+
+    def send(rows: list[dict[str, Any]]) -> None:
+        response = requests.post(
+            f"{base_url.rstrip('/')}/logs3",
+            data=json.dumps({"rows": rows, "api_version": 2}, default=str),
+            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+            timeout=timeout,
+        )
+        response.raise_for_status()
+
+    return send
+
+
+def install_spool(config: SpoolConfig | None = None) -> SpoolingBackgroundLogger | None:
+    """Route all Braintrust SDK logging through a disk spool.
+
+    This relies on SDK internals, so it is opt-in and refuses SDK releases
+    outside ``SUPPORTED_SDK_VERSIONS`` or whose layout fails
+    ``sdk_layout_problems``.
+    """
+    from braintrust import logger as bt_logger
+    from braintrust.util import LazyValue
+    from braintrust.version import VERSION
+
+    log = logging.getLogger(__name__)
+    release = tuple(int(part) for part in VERSION.split(".")[:2] if part.isdigit())
+    if release not in SUPPORTED_SDK_VERSIONS:
+        log.warning("Trace spool does not support braintrust %s; spool disabled", VERSION)
+        return None
+    problems = sdk_layout_problems()
+    if problems:
+        log.error(
+            "Braintrust %s no longer has %s; trace spool disabled", VERSION, ", ".join(problems)
+        )
+        return None
+    spool_logger = SpoolingBackgroundLogger(
+        TraceSpool(config or SpoolConfig.from_env()),
+        send_rows=braintrust_send_rows,
+        upload_attachment=braintrust_upload_attachment,
+        resolve_parent=braintrust_resolve_parent,
+    )
+    bt_logger._state._global_bg_logger = LazyValue(lambda: spool_logger, use_mutex=False)
+    spool_logger.start()
+    return spool_logger
@@ -1,32 +1,62 @@
+import logging
 import os
 from contextlib import contextmanager
 from typing import Generator
 
 from braintrust import current_span, init_logger, parent_context, traced
-from braintrust_langchain import BraintrustCallbackHandler, set_global_handler
 from dotenv import load_dotenv
 
 _logger = None
+_spool = None
+_handler = None
 
 
 def init_tracing():
-    global _logger
+    global _logger, _spool, _handler
     if _logger is not None:
         return _logger
     load_dotenv()
     project = os.getenv("BRAINTRUST_PROJECT", "rev-langgraph-demo")
     api_key = os.getenv("BRAINTRUST_API_KEY")
     if not api_key:
-        raise RuntimeError(
-            "BRAINTRUST_API_KEY is not set. Check your .env or environment."
+        # Tracing must never take the app down. With the spool enabled,
+        # events wait on disk for a restart with a key.
+        logging.getLogger(__name__).warning(
+            "BRAINTRUST_API_KEY is not set; trace events will not be shipped."
         )
+    if os.getenv("TRACE_SPOOL_ENABLED", "false").lower() in {"1", "true", "yes"}:
+        from src.backend.agent.trace_spool import install_spool
+
+        _spool = install_spool()
+    from src.backend.agent.trace_sampling import install_sampler
+
+    install_sampler()
     _logger = init_logger(project=project, api_key=api_key)
-    handler = BraintrustCallbackHandler(logger=_logger)
-    set_global_handler(handler)
+    # braintrust_langchain pulls in langchain_core; only load it once tracing starts.
+    from braintrust_langchain import BraintrustCallbackHandler, set_global_handler
+
+    _handler = BraintrustCallbackHandler(logger=_logger)
+    set_global_handler(_handler)
     return _logger
 
 
+def shutdown_tracing(timeout: float = 5.0) -> None:
+    if _spool is not None:
+        _spool.stop(timeout=timeout)
+    elif _logger is not None and hasattr(_logger, "flush"):
+        _logger.flush()
+
+
 def build_callback_handler(logger):
+    # LangChain dedups configure-hook handlers by identity, so handing out the
+    # global handler means each LLM/tool event is processed exactly once even
+    # when it is also passed explicitly (the context var that carries the
+    # global one does not reach every request thread). Its state is keyed by
+    # run id, so one instance serves concurrent turns.
+    if logger is _logger and _handler is not None:
+        return _handler
+    from braintrust_langchain import BraintrustCallbackHandler
+
     return BraintrustCallbackHandler(logger=logger)
 
 
@@ -1,10 +1,34 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Any
 
 
+@dataclass
+class AgentTurnUsage:
+    llm_calls: int = 0
+    tool_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def as_metrics(self) -> dict[str, int]:
+        return {
+            "llm_calls": self.llm_calls,
+            "tool_calls": self.tool_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+        }
+
+
 @dataclass
 class AgentTurnResult:
     assistant_message: str
     raw_state: dict[str, Any] | None = None
+    usage: AgentTurnUsage = field(default_factory=AgentTurnUsage)
+    # Name of the turn budget limit that forced the final answer, if any.
+    budget_exhausted: str | None = None
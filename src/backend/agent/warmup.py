@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+DEFAULT_STEPS = {
+    "langgraph": ["prompt", "chat_model", "graph", "vectorstore"],
+    "openai_agents": ["prompt", "openai_agents_sdk", "vectorstore"],
+    "google_adk": ["prompt", "adk_runner", "vectorstore"],
+}
+
+
+def _warm_prompt() -> None:
+    from src.backend.agent.prompts import build_summarizer_prompt
+
+    build_summarizer_prompt(user_message="", context_docs="", web_results="")
+
+
+def _warm_chat_model() -> None:
+    from src.backend.agent.graph import _model
+
+    _model()
+
+
+def _warm_graph() -> None:
+    from src.backend.agent.graph import get_graph
+
+    get_graph()
+
+
+def _warm_openai_agents_sdk() -> None:
+    from src.backend.agent.openai_agents_agent import _openai_agents_imports
+
+    _openai_agents_imports()
+
+
+def _warm_adk_runner() -> None:
+    from src.backend.agent.google_adk_agent import get_runner
+
+    get_runner()
+
+
+def _warm_vectorstore() -> None:
+    from src.backend.agent.rag import DATA_PATH, get_vectorstore
+
+    if os.path.exists(DATA_PATH):
+        get_vectorstore(DATA_PATH)
+
+
+STEPS: dict[str, Callable[[], None]] = {
+    "prompt": _warm_prompt,
+    "chat_model": _warm_chat_model,
+    "graph": _warm_graph,
+    "openai_agents_sdk": _warm_openai_agents_sdk,
+    "adk_runner": _warm_adk_runner,
+    "vectorstore": _warm_vectorstore,
+}
+
+
+def warmup_enabled() -> bool:
+    return os.getenv("WARMUP_ENABLED", "true").strip().lower() not in {"0", "false", "no"}
+
+
+def resolve_warmup_steps(framework: str) -> list[str]:
+    raw = os.getenv("WARMUP_STEPS")
+    if raw is None:
+        return list(DEFAULT_STEPS.get(framework, []))
+    steps = [step.strip() for step in raw.split(",") if step.strip()]
+    unknown = [step for step in steps if step not in STEPS]
+    if unknown:
+        raise ValueError(
+            f"Unknown WARMUP_STEPS {unknown}; expected any of: {', '.join(STEPS)}"
+        )
+    return steps
+
+
+@dataclass
+class WarmupStatus:
+    steps: dict[str, str] = field(default_factory=dict)
+    durations_ms: dict[str, float] = field(default_factory=dict)
+    errors: dict[str, str] = field(default_factory=dict)
+    attempts: dict[str, int] = field(default_factory=dict)
+    finished: bool = False
+
+    @property
+    def ready(self) -> bool:
+        return self.finished and not self.errors
+
+    def as_dict(self) -> dict:
+        return {
+            "status": "ready" if self.ready else ("failed" if self.finished else "warming"),
+            "steps": dict(self.steps),
+            "durations_ms": dict(self.durations_ms),
+            "errors": dict(self.errors),
+            "attempts": dict(self.attempts),
+        }
+
+
+def _run_step(name: str, status: WarmupStatus) -> bool:
+    status.steps[name] = "running"
+    status.attempts[name] = status.attempts.get(name, 0) + 1
+    started = time.perf_counter()
+    try:
+        STEPS[name]()
+    except Exception as exc:
+        status.steps[name] = "failed"
+        status.errors[name] = str(exc)
+        logging.getLogger(__name__).exception(
+            "Warmup step failed step=%s attempt=%s", name, status.attempts[name]
+        )
+        ok = False
+    else:
+        status.steps[name] = "ok"
+        status.errors.pop(name, None)
+        ok = True
+    status.durations_ms[name] = round((time.perf_counter() - started) * 1000, 1)
+    return ok
+
+
+def run_warmup(
+    steps: list[str],
+    status: WarmupStatus,
+    retry_base_s: float = 1.0,
+    retry_max_s: float = 60.0,
+) -> None:
+    """Run each step once, then retry failed ones with capped exponential
+    backoff until they pass, so a transient failure at boot does not keep
+    the worker unready for good. ``retry_max_s <= 0`` disables retries."""
+    log = logging.getLogger(__name__)
+    failed = [name for name in steps if not _run_step(name, status)]
+    status.finished = True
+    log.info("Warmup finished ready=%s durations_ms=%s", status.ready, status.durations_ms)
+    delay = retry_base_s
+    while failed and retry_max_s > 0:
+        time.sleep(delay)
+        failed = [name for name in failed if not _run_step(name, status)]
+        delay = min(delay * 2, retry_max_s)
+        if not failed:
+            log.info("Warmup recovered attempts=%s", status.attempts)
+
+
+def start_warmup(framework: str) -> WarmupStatus:
+    status = WarmupStatus()
+    if not warmup_enabled():
+        status.finished = True
+        return status
+    steps = resolve_warmup_steps(framework)
+    status.steps = {name: "pending" for name in steps}
+    thread = threading.Thread(
+        target=run_warmup,
+        args=(steps, status),
+        kwargs={
+            "retry_base_s": float(os.getenv("WARMUP_RETRY_BASE_S", "1")),
+            "retry_max_s": float(os.getenv("WARMUP_RETRY_MAX_S", "60")),
+        },
+        name="warmup",
+        daemon=True,
+    )
+    thread.start()
+    return status
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import functools
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Callable, TypeVar
+
+import anyio
+
+T = TypeVar("T")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after: int, reason: str) -> None:
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+    """Caps concurrent agent turns and bounds how many may wait for a slot.
+
+    Requests beyond the wait queue, or that wait longer than the queue
+    timeout, are rejected immediately with a Retry-After estimate instead of
+    piling up behind upstream rate limits. Waiting happens on the event
+    loop, so queued requests hold no worker thread and cannot starve other
+    endpoints of the server's thread pool.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout_s: float) -> None:
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self._slots = anyio.Semaphore(max_concurrent, max_value=max_concurrent)
+        self._blocking_threads = anyio.CapacityLimiter(max_concurrent + max_queue)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._active = 0
+        self._avg_turn_s = 5.0
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            max_concurrent=int(os.getenv("CHAT_MAX_CONCURRENCY", "8")),
+            max_queue=int(os.getenv("CHAT_MAX_QUEUE", "32")),
+            queue_timeout_s=float(os.getenv("CHAT_QUEUE_TIMEOUT_S", "10")),
+        )
+
+    def retry_after(self) -> int:
+        with self._lock:
+            backlog = self._waiting + 1
+            return max(1, math.ceil(self._avg_turn_s * backlog / self.max_concurrent))
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            return {
+                "active": self._active,
+                "waiting": self._waiting,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "avg_turn_s": round(self._avg_turn_s, 3),
+            }
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncGenerator[None, None]:
+        try:
+            self._slots.acquire_nowait()
+        except anyio.WouldBlock:
+            with self._lock:
+                queue_full = self._waiting >= self.max_queue
+                if not queue_full:
+                    self._waiting += 1
+            if queue_full:
+                raise AdmissionRejected(self.retry_after(), "chat wait queue is full") from None
+            acquired = False
+            try:
+                with anyio.move_on_after(self.queue_timeout_s):
+                    await self._slots.acquire()
+                    acquired = True
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            if not acquired:
+                raise AdmissionRejected(self.retry_after(), "timed out waiting for a chat slot") from None
+        with self._lock:
+            self._active += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._active -= 1
+                self._avg_turn_s = 0.8 * self._avg_turn_s + 0.2 * elapsed
+            self._slots.release()
+
+    async def run_blocking(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run ``fn`` on threads set aside for requests that block while they
+        wait on other turns, at most ``max_concurrent + max_queue`` of them,
+        so the shared pool stays free for other endpoints."""
+        return await anyio.to_thread.run_sync(
+            functools.partial(fn, *args), limiter=self._blocking_threads
+        )
+
+
+class _TurnQueue:
+    def __init__(self) -> None:
+        self.advanced = anyio.Event()
+        self.next_ticket = 0
+        self.serving = 0
+        self.abandoned: set[int] = set()
+        self.holders = 0
+
+
+class ConversationLocks:
+    """Serializes turns within a conversation in arrival (ticket) order.
+
+    Used from the event loop only; waiting turns hold no thread.
+    """
+
+    def __init__(self) -> None:
+        self._queues: dict[str, _TurnQueue] = {}
+
+    def __len__(self) -> int:
+        return len(self._queues)
+
+    def _leave(self, conversation_id: str, queue: _TurnQueue, ticket: int) -> None:
+        if queue.serving == ticket:
+            queue.serving += 1
+            while queue.serving in queue.abandoned:
+                queue.abandoned.discard(queue.serving)
+                queue.serving += 1
+            queue.advanced.set()
+            queue.advanced = anyio.Event()
+        else:
+            queue.abandoned.add(ticket)
+        queue.holders -= 1
+        if queue.holders == 0:
+            del self._queues[conversation_id]
+
+    @asynccontextmanager
+    async def hold(self, conversation_id: str, timeout: float) -> AsyncGenerator[None, None]:
+        queue = self._queues.get(conversation_id)
+        if queue is None:
+            queue = self._queues[conversation_id] = _TurnQueue()
+        ticket = queue.next_ticket
+        queue.next_ticket += 1
+        queue.holders += 1
+        try:
+            with anyio.move_on_after(timeout):
+                while queue.serving != ticket:
+                    await queue.advanced.wait()
+        except BaseException:
+            self._leave(conversation_id, queue, ticket)
+            raise
+        if queue.serving != ticket:
+            self._leave(conversation_id, queue, ticket)
+            raise AdmissionRejected(
+                max(1, math.ceil(timeout)),
+                "a previous turn in this conversation is still running",
+            )
+        try:
+            yield
+        finally:
+            self._leave(conversation_id, queue, ticket)
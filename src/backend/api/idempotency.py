@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
+
+from src.backend.storage.session_store import SessionStore
+
+
+class IdempotencyKeyReused(Exception):
+    """The key was already used for a different request body."""
+
+
+class IdempotencyInProgress(Exception):
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("a request with this Idempotency-Key is still running")
+        self.retry_after = retry_after
+
+
+@dataclass
+class IdempotencyConfig:
+    wait_s: float = 120.0
+    pending_timeout_s: float = 600.0
+    ttl_s: float = 24 * 3600
+    poll_s: float = 0.25
+
+    @classmethod
+    def from_env(cls) -> "IdempotencyConfig":
+        return cls(
+            wait_s=float(os.getenv("IDEMPOTENCY_WAIT_S", "120")),
+            pending_timeout_s=float(os.getenv("IDEMPOTENCY_PENDING_TIMEOUT_S", "600")),
+            ttl_s=float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24")) * 3600,
+        )
+
+
+def request_fingerprint(payload: dict[str, Any]) -> str:
+    body = {key: value for key, value in payload.items() if key != "idempotency_key"}
+    return hashlib.sha256(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class IdempotentTurns:
+    """Runs each (conversation, Idempotency-Key) turn at most once.
+
+    The first request claims the key in the session DB and runs the turn;
+    its response is stored under the key. A retry while it runs waits for
+    that result instead of starting a second turn: on a future within this
+    process, or by polling the row when another worker holds the claim. A
+    retry afterwards gets the stored response. If the turn fails, the claim
+    is dropped and the next attempt runs it again.
+    """
+
+    def __init__(self, store: SessionStore, config: IdempotencyConfig) -> None:
+        self.store = store
+        self.config = config
+        self._lock = threading.Lock()
+        self._inflight: dict[tuple[str, str], tuple[str, Future]] = {}
+
+    def _stale_before(self) -> str:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.config.pending_timeout_s)
+        return cutoff.isoformat()
+
+    def run(
+        self, conversation_id: str, key: str, fingerprint: str, turn: Callable[[], dict[str, Any]]
+    ) -> tuple[dict[str, Any], bool]:
+        """Return the turn's response and whether it was replayed rather than run."""
+        slot = (conversation_id, key)
+        deadline = time.monotonic() + self.config.wait_s
+        while True:
+            record = None
+            with self._lock:
+                inflight = self._inflight.get(slot)
+                if inflight is None:
+                    # A placeholder, so retries in this process wait on it
+                    # while the key is claimed in the DB outside the lock.
+                    future: Future = Future()
+                    self._inflight[slot] = (fingerprint, future)
+            if inflight is None:
+                try:
+                    record = self.store.claim_idempotency_key(
+                        conversation_id, key, fingerprint, self._stale_before()
+                    )
+                except BaseException:
+                    self._step_aside(slot, future)
+                    raise
+                if record is None:
+                    return self._run_claimed(slot, future, turn), False
+                # Held by another worker, or already answered.
+                self._step_aside(slot, future)
+
+            claimed_hash = inflight[0] if inflight is not None else record.request_hash
+            if claimed_hash != fingerprint:
+                raise IdempotencyKeyReused("Idempotency-Key was already used with a different request")
+            if record is not None and record.response is not None:
+                return record.response, True
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise IdempotencyInProgress(retry_after=1)
+            if inflight is not None:
+                try:
+                    return inflight[1].result(timeout=remaining), True
+                except FutureTimeout:
+                    continue
+                except Exception:
+                    # The original attempt failed and released the key, or
+                    # its claim went to another worker; look again.
+                    continue
+            time.sleep(min(self.config.poll_s, remaining))
+
+    def _step_aside(self, slot: tuple[str, str], future: Future) -> None:
+        with self._lock:
+            self._inflight.pop(slot, None)
+        # Waiters on the placeholder go back and look at the DB themselves.
+        future.cancel()
+
+    def _run_claimed(
+        self, slot: tuple[str, str], future: Future, turn: Callable[[], dict[str, Any]]
+    ) -> dict[str, Any]:
+        conversation_id, key = slot
+        try:
+            response = turn()
+        except BaseException as exc:
+            self.store.release_idempotency_key(conversation_id, key)
+            with self._lock:
+                self._inflight.pop(slot, None)
+            future.set_exception(exc)
+            raise
+        self.store.complete_idempotency_key(conversation_id, key, response)
+        with self._lock:
+            self._inflight.pop(slot, None)
+        future.set_result(response)
+        return response
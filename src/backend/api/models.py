@@ -7,6 +7,10 @@ class ChatRequest(BaseModel):
     conversation_id: str
     message: str
     document_id: Optional[str] = None
+    # Skips the model router for this turn, e.g. "fast" or "strong".
+    model_tier: Optional[str] = None
+    # Same as the Idempotency-Key header, for clients that cannot set headers.
+    idempotency_key: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
@@ -20,6 +24,9 @@ class UploadResponse(BaseModel):
     status: str
     conversation_id: str
     document_id: str
+    document_ids: list[str] = []
+    replaced_document_id: Optional[str] = None
+    warnings: list[str] = []
 
 
 class FeedbackRequest(BaseModel):
@@ -30,3 +37,18 @@ class FeedbackRequest(BaseModel):
 
 class FeedbackResponse(BaseModel):
     status: str
+
+
+class ConversationMessage(BaseModel):
+    seq: int
+    role: str
+    content: str
+    span_id: Optional[str] = None
+    created_at: str
+
+
+class ConversationMessagesResponse(BaseModel):
+    conversation_id: str
+    messages: list[ConversationMessage]
+    last_seq: int
+    next_before: Optional[int] = None
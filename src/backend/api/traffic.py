@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Iterator
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+CAPTURED_PATHS = ("/chat", "/upload", "/feedback")
+TRAFFIC_VERSION = 1
+
+
+@dataclass
+class CaptureConfig:
+    path: str | None = None
+    max_mb: float = 512.0
+    max_response_kb: int = 64
+
+    @classmethod
+    def from_env(cls) -> "CaptureConfig":
+        return cls(
+            path=os.getenv("TRAFFIC_CAPTURE_PATH") or None,
+            max_mb=float(os.getenv("TRAFFIC_CAPTURE_MAX_MB", "512")),
+            max_response_kb=int(os.getenv("TRAFFIC_CAPTURE_MAX_RESPONSE_KB", "64")),
+        )
+
+
+def blob_dir(path: str) -> str:
+    return f"{path}.blobs"
+
+
+class TrafficLog:
+    """Append-only JSONL of captured requests, one line per request in
+    completion order. Upload bodies are stored once per content hash in
+    ``<path>.blobs``. Capture stops (with a warning) at ``max_mb``."""
+
+    def __init__(self, config: CaptureConfig) -> None:
+        if not config.path:
+            raise ValueError("TrafficLog needs a path")
+        self.config = config
+        self.path = config.path
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        os.makedirs(blob_dir(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._handle = open(self.path, "a", encoding="utf-8")
+        self._size = self._handle.tell()
+        self._seq = 0
+        self._full = False
+
+    @classmethod
+    def from_env(cls) -> "TrafficLog | None":
+        config = CaptureConfig.from_env()
+        return cls(config) if config.path else None
+
+    def _has_room(self, size: int) -> bool:
+        if self._size + size <= self.config.max_mb * 1024 * 1024:
+            return True
+        if not self._full:
+            self._full = True
+            logging.getLogger(__name__).warning(
+                "Traffic capture reached TRAFFIC_CAPTURE_MAX_MB=%s; no longer recording", self.config.max_mb
+            )
+        return False
+
+    def store_blob(self, data: bytes) -> str | None:
+        digest = hashlib.sha256(data).hexdigest()
+        target = os.path.join(blob_dir(self.path), digest)
+        with self._lock:
+            if os.path.exists(target):
+                return digest
+            if not self._has_room(len(data)):
+                return None
+            self._size += len(data)
+        temp_path = f"{target}.tmp-{threading.get_ident()}"
+        with open(temp_path, "wb") as handle:
+            handle.write(data)
+        os.replace(temp_path, target)
+        return digest
+
+    def record(self, entry: dict[str, Any]) -> None:
+        with self._lock:
+            line = json.dumps({"v": TRAFFIC_VERSION, "seq": self._seq, **entry}, separators=(",", ":")) + "\n"
+            if not self._has_room(len(line)):
+                return
+            self._seq += 1
+            self._handle.write(line)
+            self._handle.flush()
+            self._size += len(line)
+
+    def close(self) -> None:
+        with self._lock:
+            self._handle.close()
+
+
+def read_traffic(path: str) -> Iterator[dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_blob(path: str, digest: str) -> bytes:
+    with open(os.path.join(blob_dir(path), digest), "rb") as handle:
+        return handle.read()
+
+
+def _json_or_none(body: bytes) -> Any:
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+
+async def _upload_request(scope: dict, body: bytes, log: TrafficLog) -> dict[str, Any]:
+    async def receive() -> dict:
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    form = await Request(scope, receive).form()
+    upload = form.get("file")
+    captured: dict[str, Any] = {"conversation_id": form.get("conversation_id")}
+    if upload is not None and hasattr(upload, "read"):
+        data = await upload.read()
+        captured.update(
+            filename=upload.filename,
+            content_type=upload.content_type,
+            size=len(data),
+            sha256=await run_in_threadpool(log.store_blob, data),
+        )
+    await form.close()
+    return captured
+
+
+class TrafficCaptureMiddleware:
+    """Records POSTs to /chat, /upload and /feedback in ``app.state.traffic_log``.
+
+    Pure ASGI, so request bodies are observed as they stream through rather
+    than re-read, and it sits inside the gzip middleware to see plain
+    responses. Nothing is recorded when capture is not configured.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        log = None
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in CAPTURED_PATHS:
+            log = getattr(scope["app"].state, "traffic_log", None)
+        if log is None:
+            await self.app(scope, receive, send)
+            return
+
+        request_body = bytearray()
+        response_body = bytearray()
+        response: dict[str, Any] = {"status": None}
+        limit = log.config.max_response_kb * 1024
+
+        async def capture_receive() -> dict:
+            message = await receive()
+            if message["type"] == "http.request":
+                request_body.extend(message.get("body", b""))
+            return message
+
+        async def capture_send(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body" and len(response_body) <= limit:
+                response_body.extend(message.get("body", b""))
+            await send(message)
+
+        started_at = time.time()
+        started = time.monotonic()
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            duration_ms = (time.monotonic() - started) * 1000
+            try:
+                if scope["path"] == "/upload":
+                    request = await _upload_request(scope, bytes(request_body), log)
+                else:
+                    request = _json_or_none(bytes(request_body))
+                entry = {
+                    "ts": round(started_at, 3),
+                    "path": scope["path"],
+                    "status": response["status"],
+                    "duration_ms": round(duration_ms, 1),
+                    "conversation_id": (request or {}).get("conversation_id"),
+                    "request": request,
+                    "response": _json_or_none(bytes(response_body)) if len(response_body) <= limit else None,
+                }
+                await run_in_threadpool(log.record, entry)
+            except Exception:
+                logging.getLogger(__name__).exception("Could not capture %s request", scope["path"])
@@ -1,23 +1,57 @@
+import asyncio
+import hashlib
 import logging
 import os
+import time
 import uuid
 from contextlib import asynccontextmanager
 
+from anyio import from_thread
 from dotenv import load_dotenv
 
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi import FastAPI, File, Form, Header, HTTPException, Query, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
 
-from braintrust import update_span
+from braintrust import Attachment, update_span
+from src.backend.agent.budget import TurnBudget
+from src.backend.agent.cancellation import (
+    CancelToken,
+    TurnCancelled,
+    cancellation_scope,
+    run_cancellable,
+)
+from src.backend.agent.memory import memory_report, trim_caches
+from src.backend.agent.resilience import track_model_calls
+from src.backend.agent.routing import RoutingDecision, route_turn
 from src.backend.agent.runner import resolve_agent_framework, run_agent_turn
-from src.backend.agent.tracing import build_callback_handler, init_tracing
+from src.backend.agent.trace_sampling import head_sample, sample_children
+from src.backend.agent.tracing import build_callback_handler, init_tracing, shutdown_tracing
+from src.backend.agent.warmup import start_warmup
+from src.backend.api.admission import (
+    AdmissionController,
+    AdmissionRejected,
+    ConversationLocks,
+)
+from src.backend.api.idempotency import (
+    IdempotencyConfig,
+    IdempotencyInProgress,
+    IdempotencyKeyReused,
+    IdempotentTurns,
+    request_fingerprint,
+)
 from src.backend.api.models import (
     ChatRequest,
     ChatResponse,
+    ConversationMessagesResponse,
     FeedbackRequest,
     FeedbackResponse,
     UploadResponse,
 )
+from src.backend.api.traffic import TrafficCaptureMiddleware, TrafficLog
+from src.backend.storage.janitor import JanitorConfig, SessionJanitor
 from src.backend.storage.session_store import SessionStore
 
 load_dotenv()
@@ -30,25 +64,56 @@ async def lifespan(app: FastAPI):
     session_store = SessionStore()
     app.state.logger = logger
     app.state.session_store = session_store
+    app.state.admission = AdmissionController.from_env()
+    app.state.conversation_locks = ConversationLocks()
+    app.state.idempotency = IdempotentTurns(session_store, IdempotencyConfig.from_env())
+    app.state.warmup = start_warmup(resolve_agent_framework())
+    app.state.traffic_log = TrafficLog.from_env()
+    janitor = SessionJanitor(session_store, JanitorConfig.from_env())
+    janitor.start()
     yield
-    if hasattr(logger, "flush"):
-        logger.flush()
+    janitor.stop()
+    if app.state.traffic_log is not None:
+        app.state.traffic_log.close()
+    shutdown_tracing()
 
 
 app = FastAPI(lifespan=lifespan)
+# Innermost, so captured responses are not gzipped.
+app.add_middleware(TrafficCaptureMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
+app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv("GZIP_MIN_BYTES", "1000")))
 
 @app.get("/health")
 def health() -> dict:
     return {"status": "ok"}
 
 
+@app.get("/ready")
+def ready() -> JSONResponse:
+    status = app.state.warmup
+    return JSONResponse(status.as_dict(), status_code=200 if status.ready else 503)
+
+
+@app.get("/debug/memory")
+def debug_memory(top: int = Query(10, ge=1, le=100), trim: bool = False) -> dict:
+    # Lists conversation ids, so it is off unless explicitly enabled.
+    if os.getenv("DEBUG_ENDPOINTS_ENABLED", "false").lower() not in {"1", "true", "yes"}:
+        raise HTTPException(status_code=404, detail="Not Found")
+    evicted = trim_caches() if trim else {}
+    report = memory_report(top=top)
+    if trim:
+        report["evicted"] = evicted
+    return report
+
+
 @app.get("/frameworks")
 def frameworks() -> dict:
     return {
@@ -61,33 +126,73 @@ def _handle_chat_turn(
     conversation_id: str,
     thread_id: str,
     message: str,
-    document_path: str | None,
+    document_paths: list[str],
     logger,
     root_parent: str | None,
     framework: str,
+    trace_sampled: bool = True,
+    routing: RoutingDecision | None = None,
+    cancel: CancelToken | None = None,
 ):
     handler = build_callback_handler(logger)
+    budget = TurnBudget.from_env()
+    routing = routing or route_turn(message, has_documents=bool(document_paths), framework=framework)
+    # The root and chat_turn spans (which receive feedback) are always
+    # logged; LLM/tool child spans follow the conversation's sampling.
     with logger.start_span(name="chat_turn", parent=root_parent) as span:
-        turn = run_agent_turn(
-            framework=framework,
-            conversation_id=conversation_id,
-            thread_id=thread_id,
-            user_message=message,
-            document_path=document_path,
-            model_name=os.getenv("DEFAULT_LLM_MODEL"),
-            callbacks=[handler],
-            metadata={
-                "conversation_id": conversation_id,
-                "thread_id": thread_id,
-                "document_path": document_path,
-                "agent_framework": framework,
-            },
-        )
+        started = time.monotonic()
+        try:
+            with sample_children(trace_sampled) as sampling, track_model_calls() as model_calls:
+                turn = run_agent_turn(
+                    framework=framework,
+                    conversation_id=conversation_id,
+                    thread_id=thread_id,
+                    user_message=message,
+                    document_paths=document_paths,
+                    model_name=routing.model,
+                    callbacks=[handler],
+                    budget=budget,
+                    cancel=cancel,
+                    metadata={
+                        "conversation_id": conversation_id,
+                        "thread_id": thread_id,
+                        "document_paths": document_paths,
+                        "agent_framework": framework,
+                        "model_tier": routing.tier,
+                    },
+                )
+        except TurnCancelled as exc:
+            # The partial turn: what it cost before the client went away.
+            span.log(
+                input={"conversation_id": conversation_id, "thread_id": thread_id, "message": message},
+                output={"cancelled": True},
+                metadata={
+                    "conversation_id": conversation_id,
+                    "thread_id": thread_id,
+                    "agent_framework": framework,
+                    "turn_outcome": "cancelled",
+                    "turn_cancel_reason": exc.reason,
+                    "turn_cancelled_after_s": round(time.monotonic() - started, 3),
+                    **routing.as_metadata(),
+                    **sampling.as_metadata(),
+                    **model_calls.as_metadata(),
+                },
+            )
+            logging.getLogger(__name__).info(
+                "Cancelled chat turn conversation_id=%s reason=%s", conversation_id, exc.reason
+            )
+            raise
         span.log(
             metadata={
                 "conversation_id": conversation_id,
                 "thread_id": thread_id,
                 "agent_framework": framework,
+                "turn_budget": budget.as_metadata(),
+                "turn_budget_outcome": turn.budget_exhausted or "completed",
+                "turn_usage": turn.usage.as_metrics(),
+                **routing.as_metadata(),
+                **sampling.as_metadata(),
+                **model_calls.as_metadata(),
             }
         )
         span.log(
@@ -95,7 +200,7 @@ def _handle_chat_turn(
                 "conversation_id": conversation_id,
                 "thread_id": thread_id,
                 "message": message,
-                "document_path": document_path,
+                "document_paths": document_paths,
             },
             output={
                 "assistant_message": turn.assistant_message,
@@ -106,17 +211,107 @@ def _handle_chat_turn(
 
 
 @app.post("/chat", response_model=ChatResponse)
-def chat(request: ChatRequest) -> ChatResponse:
+async def chat(
+    request: ChatRequest,
+    http_request: Request,
+    response: Response,
+    idempotency_key: str | None = Header(None, max_length=255),
+) -> ChatResponse:
+    key = idempotency_key or request.idempotency_key
+    if key:
+        # Not cancelled on disconnect: a client that sends a key is expected
+        # to retry and attach to this turn.
+        return await app.state.admission.run_blocking(_idempotent_chat, request, key, response)
+    cancel = CancelToken()
+    watcher = asyncio.create_task(_cancel_on_disconnect(http_request, cancel))
+    try:
+        # As a cancellable task, a disconnect also abandons a wait for the
+        # conversation lock or a chat slot, not just a running turn.
+        with cancellation_scope(cancel):
+            return await run_cancellable(_admitted_chat(request, cancel))
+    except TurnCancelled as exc:
+        # Nobody is left to read this; it shows up in access logs.
+        raise HTTPException(status_code=499, detail=str(exc)) from exc
+    finally:
+        watcher.cancel()
+
+
+async def _cancel_on_disconnect(request: Request, cancel: CancelToken) -> None:
+    poll_s = float(os.getenv("CHAT_DISCONNECT_POLL_S", "0.5"))
+    if poll_s <= 0:
+        return
+    while not await request.is_disconnected():
+        await asyncio.sleep(poll_s)
+    cancel.cancel("client_disconnected")
+
+
+def _idempotent_chat(request: ChatRequest, key: str, response: Response) -> ChatResponse:
+    try:
+        body, replayed = app.state.idempotency.run(
+            request.conversation_id,
+            key,
+            request_fingerprint(request.model_dump()),
+            lambda: from_thread.run(_admitted_chat, request).model_dump(),
+        )
+    except IdempotencyKeyReused as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+    except IdempotencyInProgress as exc:
+        raise HTTPException(
+            status_code=409,
+            detail=str(exc),
+            headers={"Retry-After": str(exc.retry_after)},
+        ) from exc
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return ChatResponse(**body)
+
+
+async def _admitted_chat(request: ChatRequest, cancel: CancelToken | None = None) -> ChatResponse:
+    admission = app.state.admission
+    try:
+        # Both waits happen on the event loop; only an admitted turn takes
+        # a worker thread.
+        async with app.state.conversation_locks.hold(
+            request.conversation_id, timeout=admission.queue_timeout_s
+        ), admission.admit():
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            # Only the waits above are cancelled. A running turn keeps its
+            # conversation lock and chat slot until its thread returns.
+            turn = asyncio.ensure_future(run_in_threadpool(_run_chat, request, cancel))
+            try:
+                return await asyncio.shield(turn)
+            except asyncio.CancelledError:
+                while not turn.done():
+                    try:
+                        await asyncio.shield(turn)
+                    except asyncio.CancelledError:
+                        continue
+                    except Exception:
+                        break
+                raise
+    except AdmissionRejected as exc:
+        raise HTTPException(
+            status_code=429,
+            detail=exc.reason,
+            headers={"Retry-After": str(exc.retry_after)},
+        ) from exc
+
+
+def _run_chat(request: ChatRequest, cancel: CancelToken | None = None) -> ChatResponse:
     session_store = app.state.session_store
     logger = app.state.logger
     session = session_store.get_or_create_session(request.conversation_id)
     root_span_export = session.root_span_export or None
     root_span_id = session.root_span_id or None
-    created_root = False
     framework = resolve_agent_framework()
     thread_id = session.thread_id or str(uuid.uuid4())
     if session.thread_id is None:
         session_store.update_thread_id(request.conversation_id, thread_id)
+    trace_sampled = session.trace_sampled
+    if trace_sampled is None:
+        trace_sampled = head_sample(request.conversation_id)
+        session_store.update_trace_sampled(request.conversation_id, trace_sampled)
 
     if not root_span_export or not root_span_id:
         with logger.start_span(name="Rev Agent") as root_span:
@@ -134,7 +329,6 @@ def chat(request: ChatRequest) -> ChatResponse:
             root_span_id=root_span_id,
             root_span_export=root_span_export,
         )
-        created_root = True
         logging.getLogger(__name__).info(
             "Created root span conversation_id=%s root_span_id=%s export_len=%s export_prefix=%s",
             request.conversation_id,
@@ -143,15 +337,30 @@ def chat(request: ChatRequest) -> ChatResponse:
             (root_span_export or "")[:12],
         )
 
+    try:
+        routing = route_turn(
+            request.message,
+            has_documents=bool(session.document_paths),
+            previous_tool_calls=session.last_tool_calls,
+            framework=framework,
+            override=request.model_tier,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
     turn, span_id, span_export = _handle_chat_turn(
         conversation_id=request.conversation_id,
         thread_id=thread_id,
         message=request.message,
-        document_path=session.document_path,
+        document_paths=session.document_paths,
         logger=logger,
         root_parent=root_span_export,
         framework=framework,
+        trace_sampled=trace_sampled,
+        routing=routing,
+        cancel=cancel,
     )
+    session_store.update_last_tool_calls(request.conversation_id, turn.usage.tool_calls)
 
     logging.getLogger(__name__).info(
         "Using root span for conversation_id=%s root_span_id=%s export_len=%s",
@@ -161,16 +370,23 @@ def chat(request: ChatRequest) -> ChatResponse:
     )
 
     assistant_message = turn.assistant_message
-    transcript = session.transcript or []
-    input_messages = transcript + [{"role": "user", "content": request.message}]
-    output_messages = input_messages + [
-        {"role": "assistant", "content": assistant_message}
-    ]
-    session_store.update_transcript(request.conversation_id, output_messages)
+    if cancel is not None:
+        # The client left while the last model call was finishing.
+        cancel.raise_if_cancelled()
+    output_messages = session_store.append_transcript(
+        request.conversation_id,
+        [
+            {"role": "user", "content": request.message},
+            {"role": "assistant", "content": assistant_message},
+        ],
+        span_id=span_id,
+        agent_framework=framework,
+    )
+    input_messages = output_messages[:-1]
 
     if root_span_export:
-        if created_root:
-            logger.flush()
+        # Events are queued in order, so this update lands after the root
+        # span's creation without an inline flush.
         try:
             update_span(
                 root_span_export,
@@ -182,7 +398,6 @@ def chat(request: ChatRequest) -> ChatResponse:
                     "agent_framework": framework,
                 },
             )
-            logger.flush()
             logging.getLogger(__name__).info(
                 "Updated root span input/output conversation_id=%s messages_in=%s messages_out=%s export_prefix=%s",
                 request.conversation_id,
@@ -205,13 +420,80 @@ def chat(request: ChatRequest) -> ChatResponse:
     )
 
 
+def _messages_etag(
+    conversation_id: str,
+    created_at: str,
+    last_seq: int,
+    before: int | None,
+    after: int | None,
+    limit: int,
+) -> str:
+    # Transcripts are append-only, so a page is fixed by the seq range it
+    # covers: older pages keep their ETag as the conversation grows.
+    if after is not None:
+        window = f"after:{after}:{min(after + limit, last_seq)}"
+    else:
+        window = f"before:{min(before or last_seq + 1, last_seq + 1)}:{limit}"
+    digest = hashlib.sha256(f"{conversation_id}:{created_at}:{window}".encode("utf-8"))
+    # Weak, because the gzip middleware may change the bytes on the wire.
+    return f'W/"{digest.hexdigest()[:32]}"'
+
+
+@app.get(
+    "/conversations/{conversation_id}/messages",
+    response_model=ConversationMessagesResponse,
+)
+def conversation_messages(
+    conversation_id: str,
+    before: int | None = Query(None, ge=1),
+    after: int | None = Query(None, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    if_none_match: str | None = Header(None),
+):
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="use either before or after, not both")
+    session_store = app.state.session_store
+    head = session_store.message_head(conversation_id)
+    if head is None:
+        raise HTTPException(status_code=404, detail="conversation not found")
+    etag = _messages_etag(conversation_id, *head, before, after, limit)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and (
+        if_none_match.strip() == "*"
+        or etag in {tag.strip() for tag in if_none_match.split(",")}
+    ):
+        return Response(status_code=304, headers=headers)
+    if before is None and after is None:
+        # Pin the newest page to the head the ETag was computed from.
+        before = head[1] + 1
+    page = session_store.list_messages(conversation_id, before=before, after=after, limit=limit)
+    if page is None:
+        raise HTTPException(status_code=404, detail="conversation not found")
+    body = ConversationMessagesResponse(
+        conversation_id=conversation_id,
+        messages=page.messages,
+        last_seq=page.last_seq,
+        next_before=page.next_before,
+    )
+    return JSONResponse(body.model_dump(), headers=headers)
+
+
 @app.post("/upload", response_model=UploadResponse)
 def upload(
-    conversation_id: str = Form(...), file: UploadFile = File(...)
+    conversation_id: str = Form(...),
+    file: UploadFile = File(...),
+    replaces: str | None = Form(None),
 ) -> UploadResponse:
     session_store = app.state.session_store
     logger = app.state.logger
-    session_store.get_or_create_session(conversation_id)
+    session = session_store.get_or_create_session(conversation_id)
+    replaced = None
+    if replaces:
+        replaced = next(
+            (path for path in session.document_paths if os.path.basename(path) == replaces), None
+        )
+        if replaced is None:
+            raise HTTPException(status_code=404, detail="document to replace not found")
     uploads_dir = os.getenv("UPLOADS_DIR", "./data/uploads")
     os.makedirs(uploads_dir, exist_ok=True)
     safe_name = file.filename or "document.txt"
@@ -219,12 +501,49 @@ def upload(
     file_path = os.path.join(uploads_dir, document_id)
     with open(file_path, "wb") as handle:
         handle.write(file.file.read())
+    try:
+        # Attached to the trace once here; rag_search spans only name it.
+        with logger.start_span(name="document_upload") as span:
+            span.log(
+                input={
+                    "document": Attachment(
+                        data=file_path,
+                        filename=safe_name,
+                        content_type="application/pdf"
+                        if safe_name.lower().endswith(".pdf")
+                        else "text/plain",
+                    )
+                },
+                metadata={"conversation_id": conversation_id, "document_id": document_id},
+            )
+    except Exception:
+        logging.getLogger(__name__).warning("Could not attach %s to the trace", document_id, exc_info=True)
+
+    from src.backend.agent.rag import document_label, prepare_document_async
 
-    session_store.update_document_path(conversation_id, file_path)
+    # A revision names the document it replaces; its index reuses the
+    # vectors of unchanged chunks either way.
+    warnings = []
+    if replaced is not None:
+        session_store.remove_document(conversation_id, replaced)
+    else:
+        warnings = [
+            f"{safe_name} has the same name as {os.path.basename(previous)}; both are kept. "
+            "Upload with replaces=<document_id> to revise a document."
+            for previous in session.document_paths
+            if document_label(previous) == safe_name
+        ]
+    document_paths = session_store.add_document(conversation_id, file_path)
+    if os.getenv("RAG_SUMMARY_ON_UPLOAD", "true").lower() in {"1", "true", "yes"}:
+        # Index and summary tree are built off the request path.
+        prepare_document_async(file_path)
     return UploadResponse(
         status="ok",
         conversation_id=conversation_id,
         document_id=document_id,
+        document_ids=[os.path.basename(path) for path in document_paths],
+        replaced_document_id=os.path.basename(replaced) if replaced else None,
+        warnings=warnings,
     )
 
 
@@ -247,6 +566,10 @@ def feedback(request: FeedbackRequest) -> FeedbackResponse:
         comment=request.comment,
         tags=tags,
     )
+    # Kept locally too, so transcript exports can filter on ratings.
+    app.state.session_store.record_feedback(
+        request.span_id, scores["thumbs_up"] if scores else None, request.comment
+    )
     return FeedbackResponse(status="ok")
 
 
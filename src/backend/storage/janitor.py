@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from src.backend.storage.session_store import SessionStore
+
+
+@dataclass
+class JanitorConfig:
+    session_ttl_s: float
+    interval_s: float
+    uploads_dir: str
+    orphan_grace_s: float
+    vacuum_pages: int
+    idempotency_ttl_s: float = 24 * 3600
+
+    @classmethod
+    def from_env(cls) -> "JanitorConfig":
+        return cls(
+            session_ttl_s=float(os.getenv("SESSION_TTL_HOURS", "720")) * 3600,
+            interval_s=float(os.getenv("JANITOR_INTERVAL_S", "3600")),
+            uploads_dir=os.getenv("UPLOADS_DIR", "./data/uploads"),
+            orphan_grace_s=float(os.getenv("UPLOAD_ORPHAN_GRACE_S", "3600")),
+            vacuum_pages=int(os.getenv("SQLITE_VACUUM_PAGES", "2000")),
+            idempotency_ttl_s=float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24")) * 3600,
+        )
+
+
+@dataclass
+class JanitorReport:
+    expired_sessions: int = 0
+    deleted_uploads: list[str] = field(default_factory=list)
+    deleted_indexes: list[str] = field(default_factory=list)
+    vacuumed_pages: int = 0
+    expired_idempotency_keys: int = 0
+    evicted_cache_entries: dict[str, int] = field(default_factory=dict)
+
+
+def _evict_document_caches(path: str) -> None:
+    from src.backend.agent.rag import evict_vectorstore
+
+    evict_vectorstore(path)
+
+
+def _sweep_persisted_indexes(live_paths: set[str]) -> list[str]:
+    from src.backend.agent.rag import sweep_orphaned_indexes
+
+    return sweep_orphaned_indexes(live_paths)
+
+
+def _trim_memory_caches() -> dict[str, int]:
+    from src.backend.agent.memory import trim_caches
+
+    return trim_caches()
+
+
+class SessionJanitor:
+    """Expires idle sessions and old idempotency keys, removes their (and
+    any orphaned) uploads and derived indexes, then incrementally vacuums
+    the session DB."""
+
+    def __init__(
+        self,
+        store: SessionStore,
+        config: JanitorConfig,
+        on_document_removed: Callable[[str], None] = _evict_document_caches,
+        sweep_indexes: Callable[[set[str]], list[str]] = _sweep_persisted_indexes,
+        trim_caches: Callable[[], dict[str, int]] = _trim_memory_caches,
+    ) -> None:
+        self.store = store
+        self.config = config
+        self.on_document_removed = on_document_removed
+        self.sweep_indexes = sweep_indexes
+        self.trim_caches = trim_caches
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _within_uploads(self, path: str) -> bool:
+        uploads = os.path.realpath(self.config.uploads_dir)
+        return os.path.commonpath([uploads, os.path.realpath(path)]) == uploads
+
+    def _remove_document(self, path: str, report: JanitorReport) -> None:
+        if self._within_uploads(path) and os.path.exists(path):
+            os.remove(path)
+            report.deleted_uploads.append(path)
+        self.on_document_removed(path)
+
+    def run_once(self) -> JanitorReport:
+        report = JanitorReport()
+        if self.config.session_ttl_s > 0:
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.config.session_ttl_s)
+            report.expired_sessions, expired_documents = self.store.expire_sessions(
+                cutoff.isoformat()
+            )
+            referenced = self.store.referenced_document_paths()
+            for path in set(expired_documents) - referenced:
+                self._remove_document(path, report)
+
+        if self.config.idempotency_ttl_s > 0:
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.config.idempotency_ttl_s)
+            report.expired_idempotency_keys = self.store.expire_idempotency_keys(cutoff.isoformat())
+
+        if os.path.isdir(self.config.uploads_dir):
+            referenced = {os.path.realpath(path) for path in self.store.referenced_document_paths()}
+            # Files younger than the grace period may belong to an upload whose
+            # session row has not been updated yet.
+            newest_allowed = time.time() - self.config.orphan_grace_s
+            for entry in os.scandir(self.config.uploads_dir):
+                if not entry.is_file() or os.path.realpath(entry.path) in referenced:
+                    continue
+                if entry.stat().st_mtime < newest_allowed:
+                    self._remove_document(entry.path, report)
+
+        report.deleted_indexes = self.sweep_indexes(self.store.referenced_document_paths())
+        report.vacuumed_pages = self.store.incremental_vacuum(self.config.vacuum_pages)
+        # Byte caps need every entry measured, so they are held here rather
+        # than on each request.
+        report.evicted_cache_entries = self.trim_caches()
+        logging.getLogger(__name__).info(
+            "Janitor run expired_sessions=%s expired_idempotency_keys=%s deleted_uploads=%s deleted_indexes=%s vacuumed_pages=%s evicted=%s",
+            report.expired_sessions,
+            report.expired_idempotency_keys,
+            len(report.deleted_uploads),
+            len(report.deleted_indexes),
+            report.vacuumed_pages,
+            sum(report.evicted_cache_entries.values()),
+        )
+        return report
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.config.interval_s):
+            try:
+                self.run_once()
+            except Exception:
+                logging.getLogger(__name__).exception("Janitor run failed")
+
+    def start(self) -> None:
+        if self.config.interval_s <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="session-janitor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -1,8 +1,15 @@
 import json
+import logging
 import os
 import sqlite3
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
+from typing import Iterator
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
 
 
 @dataclass
@@ -14,6 +21,39 @@ class SessionRecord:
     document_path: str | None
     transcript: list[dict]
     created_at: str
+    document_paths: list[str] = field(default_factory=list)
+    trace_sampled: bool | None = None
+    last_tool_calls: int | None = None
+
+
+@dataclass
+class ExportTurn:
+    conversation_id: str
+    seq: int
+    question: str
+    answer: str
+    span_id: str | None
+    created_at: str
+    agent_framework: str | None
+    feedback_score: float | None
+    feedback_comment: str | None
+    document_paths: list[str]
+
+
+@dataclass
+class IdempotencyRecord:
+    request_hash: str
+    # None while the turn that claimed the key is still running.
+    response: dict | None
+    updated_at: str
+
+
+@dataclass
+class MessagePage:
+    messages: list[dict]
+    # Sequence numbers are 1-based positions in the transcript.
+    last_seq: int
+    next_before: int | None
 
 
 class SessionStore:
@@ -27,6 +67,12 @@ class SessionStore:
 
     def _init_db(self) -> None:
         with self._connect() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                # Incremental auto-vacuum lets the janitor hand freed pages
+                # back to the OS without a full VACUUM.
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                if conn.execute("SELECT count(*) FROM sqlite_master").fetchone()[0]:
+                    self._convert_to_incremental_vacuum(conn)
             conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS sessions (
@@ -40,9 +86,72 @@ class SessionStore:
                 )
                 """
             )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS session_documents (
+                    conversation_id TEXT NOT NULL,
+                    document_path TEXT NOT NULL,
+                    added_at TEXT NOT NULL,
+                    PRIMARY KEY (conversation_id, document_path)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS session_messages (
+                    conversation_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    span_id TEXT,
+                    created_at TEXT NOT NULL,
+                    PRIMARY KEY (conversation_id, seq)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS session_feedback (
+                    span_id TEXT PRIMARY KEY,
+                    conversation_id TEXT,
+                    score REAL,
+                    comment TEXT,
+                    updated_at TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    conversation_id TEXT NOT NULL,
+                    idempotency_key TEXT NOT NULL,
+                    request_hash TEXT NOT NULL,
+                    response_json TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (conversation_id, idempotency_key)
+                )
+                """
+            )
             conn.commit()
             self._ensure_columns(conn)
 
+    def _convert_to_incremental_vacuum(self, conn: sqlite3.Connection) -> None:
+        # An existing file only switches after a full VACUUM, which rewrites
+        # it and holds the write lock until done. This happens once per
+        # database, before the app serves requests.
+        log = logging.getLogger(__name__)
+        size_mb = os.path.getsize(self.db_path) / (1024 * 1024)
+        log.warning(
+            "One-time VACUUM of %s (%.1f MB) to enable incremental auto-vacuum; "
+            "startup waits for it",
+            self.db_path,
+            size_mb,
+        )
+        started = time.monotonic()
+        conn.execute("VACUUM")
+        log.warning("VACUUM of %s finished in %.1fs", self.db_path, time.monotonic() - started)
+
     def _ensure_columns(self, conn: sqlite3.Connection) -> None:
         cursor = conn.execute("PRAGMA table_info(sessions)")
         columns = {row[1] for row in cursor.fetchall()}
@@ -50,26 +159,55 @@ class SessionStore:
             conn.execute("ALTER TABLE sessions ADD COLUMN transcript_json TEXT")
         if "document_path" not in columns:
             conn.execute("ALTER TABLE sessions ADD COLUMN document_path TEXT")
+        if "trace_sampled" not in columns:
+            conn.execute("ALTER TABLE sessions ADD COLUMN trace_sampled INTEGER")
+        if "last_tool_calls" not in columns:
+            conn.execute("ALTER TABLE sessions ADD COLUMN last_tool_calls INTEGER")
+        if "last_active_at" not in columns:
+            conn.execute("ALTER TABLE sessions ADD COLUMN last_active_at TEXT")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS sessions_last_active_at ON sessions (last_active_at)"
+        )
+        message_columns = {row[1] for row in conn.execute("PRAGMA table_info(session_messages)")}
+        if "agent_framework" not in message_columns:
+            conn.execute("ALTER TABLE session_messages ADD COLUMN agent_framework TEXT")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS session_messages_span_id ON session_messages (span_id)"
+        )
         conn.commit()
 
     def get_or_create_session(self, conversation_id: str) -> SessionRecord:
         with self._connect() as conn:
             cursor = conn.execute(
-                "SELECT conversation_id, root_span_id, root_span_export, thread_id, document_path, transcript_json, created_at "
+                "SELECT conversation_id, root_span_id, root_span_export, thread_id, document_path, transcript_json, created_at, trace_sampled, last_tool_calls "
                 "FROM sessions WHERE conversation_id = ?",
                 (conversation_id,),
             )
             row = cursor.fetchone()
             if row:
+                # A turn starts here; keep the janitor from expiring the
+                # session while it runs.
+                conn.execute(
+                    "UPDATE sessions SET last_active_at = ? WHERE conversation_id = ?",
+                    (_now(), conversation_id),
+                )
+                conn.commit()
                 transcript_raw = row[5] or "[]"
                 transcript = json.loads(transcript_raw)
-                return SessionRecord(row[0], row[1], row[2], row[3], row[4], transcript, row[6])
+                document_paths = self._document_paths(conn, conversation_id)
+                if not document_paths and row[4]:
+                    # Sessions from before multi-document support.
+                    document_paths = [row[4]]
+                trace_sampled = None if row[7] is None else bool(row[7])
+                return SessionRecord(
+                    row[0], row[1], row[2], row[3], row[4], transcript, row[6], document_paths, trace_sampled, row[8]
+                )
 
             created_at = datetime.now(timezone.utc).isoformat()
             conn.execute(
-                "INSERT INTO sessions (conversation_id, root_span_id, root_span_export, thread_id, document_path, transcript_json, created_at) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (conversation_id, None, None, None, None, "[]", created_at),
+                "INSERT INTO sessions (conversation_id, root_span_id, root_span_export, thread_id, document_path, transcript_json, created_at, last_active_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (conversation_id, None, None, None, None, "[]", created_at, created_at),
             )
             conn.commit()
             return SessionRecord(conversation_id, None, None, None, None, [], created_at)
@@ -88,6 +226,22 @@ class SessionStore:
             )
             conn.commit()
 
+    def update_trace_sampled(self, conversation_id: str, sampled: bool) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE sessions SET trace_sampled = ? WHERE conversation_id = ?",
+                (int(sampled), conversation_id),
+            )
+            conn.commit()
+
+    def update_last_tool_calls(self, conversation_id: str, tool_calls: int) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE sessions SET last_tool_calls = ? WHERE conversation_id = ?",
+                (tool_calls, conversation_id),
+            )
+            conn.commit()
+
     def update_thread_id(self, conversation_id: str, thread_id: str) -> None:
         with self._connect() as conn:
             conn.execute(
@@ -99,8 +253,56 @@ class SessionStore:
     def update_document_path(self, conversation_id: str, document_path: str) -> None:
         with self._connect() as conn:
             conn.execute(
-                "UPDATE sessions SET document_path = ? WHERE conversation_id = ?",
-                (document_path, conversation_id),
+                "UPDATE sessions SET document_path = ?, last_active_at = ? WHERE conversation_id = ?",
+                (document_path, _now(), conversation_id),
+            )
+            conn.commit()
+
+    @staticmethod
+    def _document_paths(conn: sqlite3.Connection, conversation_id: str) -> list[str]:
+        rows = conn.execute(
+            "SELECT document_path FROM session_documents WHERE conversation_id = ? "
+            "ORDER BY added_at, rowid",
+            (conversation_id,),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def add_document(self, conversation_id: str, document_path: str) -> list[str]:
+        """Attach a document to the session and return all of its documents.
+
+        ``document_path`` keeps pointing at the most recent upload.
+        """
+        now = _now()
+        with self._connect() as conn:
+            legacy = conn.execute(
+                "SELECT document_path, created_at FROM sessions WHERE conversation_id = ?",
+                (conversation_id,),
+            ).fetchone()
+            if legacy and legacy[0]:
+                conn.execute(
+                    "INSERT OR IGNORE INTO session_documents VALUES (?, ?, ?)",
+                    (conversation_id, legacy[0], legacy[1] or now),
+                )
+            conn.execute(
+                "INSERT OR IGNORE INTO session_documents VALUES (?, ?, ?)",
+                (conversation_id, document_path, now),
+            )
+            conn.execute(
+                "UPDATE sessions SET document_path = ?, last_active_at = ? WHERE conversation_id = ?",
+                (document_path, now, conversation_id),
+            )
+            conn.commit()
+            return self._document_paths(conn, conversation_id)
+
+    def remove_document(self, conversation_id: str, document_path: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM session_documents WHERE conversation_id = ? AND document_path = ?",
+                (conversation_id, document_path),
+            )
+            conn.execute(
+                "UPDATE sessions SET document_path = NULL WHERE conversation_id = ? AND document_path = ?",
+                (conversation_id, document_path),
             )
             conn.commit()
 
@@ -111,3 +313,326 @@ class SessionStore:
                 (json.dumps(transcript), conversation_id),
             )
             conn.commit()
+
+    def append_transcript(
+        self,
+        conversation_id: str,
+        messages: list[dict],
+        span_id: str | None = None,
+        agent_framework: str | None = None,
+    ) -> list[dict]:
+        """Append messages to the transcript and to ``session_messages``.
+
+        ``span_id`` and ``agent_framework`` are stored on the assistant rows
+        so history can carry feedback targets and exports can filter by
+        runtime.
+        """
+        # BEGIN IMMEDIATE takes the write lock before reading, so concurrent
+        # writers (including other worker processes) append instead of
+        # overwriting each other.
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT transcript_json FROM sessions WHERE conversation_id = ?",
+                (conversation_id,),
+            ).fetchone()
+            previous = json.loads((row[0] if row else None) or "[]")
+            self._backfill_messages(conn, conversation_id, previous)
+            now = _now()
+            conn.executemany(
+                "INSERT INTO session_messages "
+                "(conversation_id, seq, role, content, span_id, created_at, agent_framework) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        conversation_id,
+                        len(previous) + offset + 1,
+                        message["role"],
+                        message["content"],
+                        span_id if message["role"] == "assistant" else None,
+                        now,
+                        agent_framework if message["role"] == "assistant" else None,
+                    )
+                    for offset, message in enumerate(messages)
+                ],
+            )
+            transcript = previous + messages
+            conn.execute(
+                "UPDATE sessions SET transcript_json = ?, last_active_at = ? WHERE conversation_id = ?",
+                (json.dumps(transcript), now, conversation_id),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return transcript
+
+    @staticmethod
+    def _backfill_messages(
+        conn: sqlite3.Connection, conversation_id: str, transcript: list[dict]
+    ) -> None:
+        # Sessions written before session_messages existed only have the blob.
+        stored = conn.execute(
+            "SELECT COUNT(*) FROM session_messages WHERE conversation_id = ?",
+            (conversation_id,),
+        ).fetchone()[0]
+        if stored >= len(transcript):
+            return
+        created_at = _now()
+        conn.executemany(
+            "INSERT OR IGNORE INTO session_messages (conversation_id, seq, role, content, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (conversation_id, seq, message["role"], message["content"], created_at)
+                for seq, message in enumerate(transcript, start=1)
+            ],
+        )
+
+    def message_head(self, conversation_id: str) -> tuple[str, int] | None:
+        """Return ``(created_at, last_seq)`` for a session, or None if unknown.
+
+        This is the cheap check behind history revalidation.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT created_at, (SELECT MAX(seq) FROM session_messages WHERE conversation_id = ?), "
+                "transcript_json IS NOT NULL AND transcript_json != '[]' "
+                "FROM sessions WHERE conversation_id = ?",
+                (conversation_id, conversation_id),
+            ).fetchone()
+            if row is None:
+                return None
+            created_at, last_seq, has_transcript = row
+            if last_seq is None and has_transcript:
+                transcript_raw = conn.execute(
+                    "SELECT transcript_json FROM sessions WHERE conversation_id = ?",
+                    (conversation_id,),
+                ).fetchone()[0]
+                transcript = json.loads(transcript_raw)
+                self._backfill_messages(conn, conversation_id, transcript)
+                conn.commit()
+                last_seq = len(transcript)
+        return created_at, last_seq or 0
+
+    def list_messages(
+        self,
+        conversation_id: str,
+        before: int | None = None,
+        after: int | None = None,
+        limit: int = 50,
+    ) -> MessagePage | None:
+        """Page through a conversation by sequence number.
+
+        With no cursor this returns the newest ``limit`` messages; ``before``
+        walks back from there and ``after`` fetches messages newer than the
+        client's last one. Messages are always in ascending order.
+        """
+        head = self.message_head(conversation_id)
+        if head is None:
+            return None
+        with self._connect() as conn:
+            if after is not None:
+                rows = conn.execute(
+                    "SELECT seq, role, content, span_id, created_at FROM session_messages "
+                    "WHERE conversation_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                    (conversation_id, after, limit),
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT seq, role, content, span_id, created_at FROM session_messages "
+                    "WHERE conversation_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+                    (conversation_id, before if before is not None else head[1] + 1, limit),
+                ).fetchall()[::-1]
+        messages = [
+            {"seq": row[0], "role": row[1], "content": row[2], "span_id": row[3], "created_at": row[4]}
+            for row in rows
+        ]
+        next_before = None
+        if after is None and messages and messages[0]["seq"] > 1:
+            next_before = messages[0]["seq"]
+        return MessagePage(messages, head[1], next_before)
+
+    def expire_sessions(self, idle_before: str) -> tuple[int, list[str]]:
+        """Delete sessions idle since before ``idle_before`` (ISO timestamp) and
+        return how many were deleted and the document paths they referenced."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT conversation_id, document_path FROM sessions "
+                "WHERE COALESCE(last_active_at, created_at) < ?",
+                (idle_before,),
+            ).fetchall()
+            paths = {row[1] for row in rows if row[1]}
+            for row in rows:
+                paths.update(self._document_paths(conn, row[0]))
+            ids = [(row[0],) for row in rows]
+            conn.executemany("DELETE FROM session_documents WHERE conversation_id = ?", ids)
+            conn.executemany("DELETE FROM session_messages WHERE conversation_id = ?", ids)
+            conn.executemany("DELETE FROM session_feedback WHERE conversation_id = ?", ids)
+            conn.executemany("DELETE FROM idempotency_keys WHERE conversation_id = ?", ids)
+            conn.executemany("DELETE FROM sessions WHERE conversation_id = ?", ids)
+            conn.commit()
+        return len(rows), sorted(paths)
+
+    def claim_idempotency_key(
+        self, conversation_id: str, key: str, request_hash: str, stale_before: str
+    ) -> IdempotencyRecord | None:
+        """Claim ``key`` for a new turn, or return the record already holding it.
+
+        A pending claim last touched before ``stale_before`` (ISO timestamp)
+        belongs to a worker that died mid-turn and is taken over.
+        """
+        now = _now()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT request_hash, response_json, updated_at FROM idempotency_keys "
+                "WHERE conversation_id = ? AND idempotency_key = ?",
+                (conversation_id, key),
+            ).fetchone()
+            if row is not None and (row[1] is not None or row[2] >= stale_before):
+                conn.rollback()
+                return IdempotencyRecord(
+                    request_hash=row[0],
+                    response=json.loads(row[1]) if row[1] is not None else None,
+                    updated_at=row[2],
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO idempotency_keys VALUES (?, ?, ?, NULL, ?, ?)",
+                (conversation_id, key, request_hash, now, now),
+            )
+            conn.commit()
+        return None
+
+    def complete_idempotency_key(self, conversation_id: str, key: str, response: dict) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE idempotency_keys SET response_json = ?, updated_at = ? "
+                "WHERE conversation_id = ? AND idempotency_key = ?",
+                (json.dumps(response), _now(), conversation_id, key),
+            )
+            conn.commit()
+
+    def release_idempotency_key(self, conversation_id: str, key: str) -> None:
+        """Drop a pending claim whose turn failed, so a retry runs it again."""
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM idempotency_keys WHERE conversation_id = ? AND idempotency_key = ? "
+                "AND response_json IS NULL",
+                (conversation_id, key),
+            )
+            conn.commit()
+
+    def expire_idempotency_keys(self, created_before: str) -> int:
+        with self._connect() as conn:
+            deleted = conn.execute(
+                "DELETE FROM idempotency_keys WHERE created_at < ?", (created_before,)
+            ).rowcount
+            conn.commit()
+        return deleted
+
+    def record_feedback(self, span_id: str, score: float | None, comment: str | None) -> None:
+        """Keep the latest rating and comment per span alongside the transcript."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT conversation_id FROM session_messages WHERE span_id = ? LIMIT 1", (span_id,)
+            ).fetchone()
+            conn.execute(
+                "INSERT INTO session_feedback (span_id, conversation_id, score, comment, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(span_id) DO UPDATE SET "
+                "score = COALESCE(excluded.score, score), comment = COALESCE(excluded.comment, comment), "
+                "updated_at = excluded.updated_at",
+                (span_id, row[0] if row else None, score, comment, _now()),
+            )
+            conn.commit()
+
+    def iter_turns(
+        self,
+        *,
+        since: str | None = None,
+        until: str | None = None,
+        agent_framework: str | None = None,
+        rated: bool | None = None,
+        min_score: float | None = None,
+        max_score: float | None = None,
+        page_size: int = 1000,
+    ) -> Iterator[ExportTurn]:
+        """Stream question/answer turns in (conversation, seq) order.
+
+        Turns are read in keyset pages of ``page_size``, so memory stays
+        constant however many sessions match, and no read transaction is
+        held open long enough to block the app's writes between pages.
+        ``since``/``until`` bound the answer's ISO timestamp; a score bound
+        implies ``rated``.
+        """
+        clauses = ["a.role = 'assistant'"]
+        params: list = []
+        for clause, value in (
+            ("a.created_at >= ?", since),
+            ("a.created_at < ?", until),
+            ("a.agent_framework = ?", agent_framework),
+            ("f.score >= ?", min_score),
+            ("f.score <= ?", max_score),
+        ):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        if rated is True:
+            clauses.append("f.span_id IS NOT NULL")
+        elif rated is False:
+            clauses.append("f.span_id IS NULL")
+        query = (
+            "SELECT a.conversation_id, a.seq, u.content, a.content, a.span_id, a.created_at, "
+            "a.agent_framework, f.score, f.comment FROM session_messages a "
+            "JOIN session_messages u ON u.conversation_id = a.conversation_id "
+            "AND u.seq = a.seq - 1 AND u.role = 'user' "
+            "LEFT JOIN session_feedback f ON f.span_id = a.span_id "
+            f"WHERE {' AND '.join(clauses)} AND (a.conversation_id, a.seq) > (?, ?) "
+            "ORDER BY a.conversation_id, a.seq LIMIT ?"
+        )
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            current, documents = None, []
+            last: tuple[str, int] = ("", 0)
+            while True:
+                rows = conn.execute(query, [*params, *last, page_size]).fetchall()
+                if not rows:
+                    break
+                last = (rows[-1][0], rows[-1][1])
+                for row in rows:
+                    if row[0] != current:
+                        current = row[0]
+                        documents = conn.execute(
+                            "SELECT document_path, added_at FROM session_documents "
+                            "WHERE conversation_id = ? ORDER BY added_at",
+                            (current,),
+                        ).fetchall()
+                    yield ExportTurn(
+                        conversation_id=row[0],
+                        seq=row[1],
+                        question=row[2],
+                        answer=row[3],
+                        span_id=row[4],
+                        created_at=row[5],
+                        agent_framework=row[6],
+                        feedback_score=row[7],
+                        feedback_comment=row[8],
+                        # Documents attached by the time of the answer.
+                        document_paths=[path for path, added_at in documents if added_at <= row[5]],
+                    )
+        finally:
+            conn.close()
+
+    def referenced_document_paths(self) -> set[str]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT document_path FROM sessions WHERE document_path IS NOT NULL "
+                "UNION SELECT document_path FROM session_documents"
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def incremental_vacuum(self, pages: int) -> int:
+        with self._connect() as conn:
+            freelist_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+            freelist_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return freelist_before - freelist_after
@@ -1,6 +1,6 @@
-import { useState } from "react";
+import { useEffect, useState } from "react";
 
-import { sendChat, sendFeedback, uploadDocument } from "./api";
+import { fetchMessages, sendChat, sendFeedback, uploadDocument } from "./api";
 import { ChatHeader } from "@/components/chat/ChatHeader";
 import { Composer } from "@/components/chat/Composer";
 import { MessageList } from "@/components/chat/MessageList";
@@ -32,6 +32,28 @@ export default function App() {
   const [loading, setLoading] = useState(false);
   const [uploading, setUploading] = useState(false);
 
+  useEffect(() => {
+    let cancelled = false;
+    // Only the newest page is loaded when a conversation is reopened.
+    fetchMessages(conversationId)
+      .then((page) => {
+        if (cancelled || !page) return;
+        setMessages(
+          page.messages.map((message) => ({
+            role: message.role,
+            content: message.content,
+            spanId: message.span_id ?? undefined,
+          }))
+        );
+      })
+      .catch(() => {
+        // History is best effort; the conversation still works without it.
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [conversationId]);
+
   const handleNewChat = () => {
     const id = crypto.randomUUID();
     localStorage.setItem("conversation_id", id);
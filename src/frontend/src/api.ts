@@ -52,3 +52,55 @@ export async function uploadDocument(
     throw new Error("Upload failed");
   }
 }
+
+export type ConversationMessage = {
+  seq: number;
+  role: "user" | "assistant";
+  content: string;
+  span_id?: string | null;
+  created_at: string;
+};
+
+export type ConversationMessagesResponse = {
+  conversation_id: string;
+  messages: ConversationMessage[];
+  last_seq: number;
+  next_before?: number | null;
+};
+
+// Last response per URL, revalidated with If-None-Match.
+const messagePages = new Map<
+  string,
+  { etag: string; body: ConversationMessagesResponse }
+>();
+
+export async function fetchMessages(
+  conversationId: string,
+  options: { before?: number; after?: number; limit?: number } = {}
+): Promise<ConversationMessagesResponse | null> {
+  const params = new URLSearchParams();
+  if (options.before !== undefined) params.set("before", String(options.before));
+  if (options.after !== undefined) params.set("after", String(options.after));
+  if (options.limit !== undefined) params.set("limit", String(options.limit));
+  const query = params.toString();
+  const url = `${API_BASE}/conversations/${encodeURIComponent(conversationId)}/messages${query ? `?${query}` : ""}`;
+  const cached = messagePages.get(url);
+  const res = await fetch(url, {
+    headers: cached ? { "If-None-Match": cached.etag } : {},
+  });
+  if (res.status === 304 && cached) {
+    return cached.body;
+  }
+  if (res.status === 404) {
+    return null;
+  }
+  if (!res.ok) {
+    throw new Error("History request failed");
+  }
+  const body: ConversationMessagesResponse = await res.json();
+  const etag = res.headers.get("ETag");
+  if (etag) {
+    messagePages.set(url, { etag, body });
+  }
+  return body;
+}
@@ -0,0 +1,97 @@
+import anyio
+import pytest
+
+from src.backend.api.admission import AdmissionController, AdmissionRejected, ConversationLocks
+
+
+async def test_rejects_when_wait_queue_is_full():
+    controller = AdmissionController(max_concurrent=1, max_queue=0, queue_timeout_s=1)
+    async with controller.admit():
+        with pytest.raises(AdmissionRejected) as excinfo:
+            async with controller.admit():
+                pass
+    assert excinfo.value.retry_after >= 1
+    async with controller.admit():
+        assert controller.stats()["active"] == 1
+
+
+async def test_queued_request_times_out_with_retry_after():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout_s=0.05)
+    async with controller.admit():
+        with pytest.raises(AdmissionRejected, match="timed out"):
+            async with controller.admit():
+                pass
+    assert controller.stats()["waiting"] == 0
+
+
+async def test_queued_requests_hold_no_worker_threads():
+    # More waiters than the server's 40 pool threads.
+    controller = AdmissionController(max_concurrent=2, max_queue=60, queue_timeout_s=5)
+    release = anyio.Event()
+    finished = []
+
+    async def turn():
+        async with controller.admit():
+            await release.wait()
+        finished.append(True)
+
+    async with anyio.create_task_group() as group:
+        for _ in range(50):
+            group.start_soon(turn)
+        while controller.stats()["waiting"] < 48:
+            await anyio.sleep(0.01)
+        assert anyio.to_thread.current_default_thread_limiter().borrowed_tokens == 0
+        assert await anyio.to_thread.run_sync(lambda: "pool is free") == "pool is free"
+        release.set()
+    assert len(finished) == 50
+    assert controller.stats()["active"] == 0
+
+
+async def test_conversation_turns_run_in_arrival_order():
+    locks = ConversationLocks()
+    order = []
+    release_first = anyio.Event()
+
+    async def turn(label, hold_open=None):
+        async with locks.hold("conv-1", timeout=5):
+            order.append(label)
+            if hold_open is not None:
+                await hold_open.wait()
+
+    async with anyio.create_task_group() as group:
+        group.start_soon(turn, "first", release_first)
+        while not order:
+            await anyio.sleep(0.01)
+        for label in ("second", "third"):
+            group.start_soon(turn, label)
+            await anyio.sleep(0.05)
+        release_first.set()
+    assert order == ["first", "second", "third"]
+    assert len(locks) == 0
+
+
+async def test_abandoned_turn_does_not_block_the_next():
+    locks = ConversationLocks()
+    order = []
+    release_first = anyio.Event()
+
+    async def first():
+        async with locks.hold("conv-1", timeout=5):
+            order.append("first")
+            await release_first.wait()
+
+    async with anyio.create_task_group() as group:
+        group.start_soon(first)
+        while not order:
+            await anyio.sleep(0.01)
+        with pytest.raises(AdmissionRejected):
+            async with locks.hold("conv-1", timeout=0.05):
+                pass
+        with anyio.move_on_after(0.05):
+            async with locks.hold("conv-1", timeout=5):
+                pass
+        release_first.set()
+    async with locks.hold("conv-1", timeout=1):
+        order.append("next")
+    assert order == ["first", "next"]
+    assert len(locks) == 0
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from src.backend.agent.graph import usage_from_state
+from src.backend.agent.openai_agents_agent import _usage_from_result
+
+
+def test_usage_from_state_counts_calls_and_tokens():
+    state = {
+        "llm_calls": 2,
+        "messages": [
+            HumanMessage(content="Summarize the deposition."),
+            AIMessage(
+                content="",
+                tool_calls=[{"name": "rag_search", "args": {"query": "events"}, "id": "call_1"}],
+                usage_metadata={"input_tokens": 120, "output_tokens": 10, "total_tokens": 130},
+            ),
+            ToolMessage(content="context", tool_call_id="call_1"),
+            AIMessage(
+                content="Summary.",
+                usage_metadata={"input_tokens": 200, "output_tokens": 40, "total_tokens": 240},
+            ),
+        ],
+    }
+    usage = usage_from_state(state)
+    assert usage.llm_calls == 2
+    assert usage.tool_calls == 1
+    assert usage.prompt_tokens == 320
+    assert usage.completion_tokens == 50
+    assert usage.as_metrics()["total_tokens"] == 370
+
+
+def test_skipped_tool_results_are_not_counted():
+    state = {
+        "llm_calls": 2,
+        "messages": [
+            AIMessage(
+                content="",
+                tool_calls=[{"name": "web_search", "args": {"query": "q"}, "id": "call_1"}],
+            ),
+            ToolMessage(
+                content="Not run: the turn budget is exhausted (tool_calls).",
+                tool_call_id="call_1",
+                additional_kwargs={"skipped": True},
+            ),
+            AIMessage(content="Answer from what I have."),
+        ],
+    }
+    assert usage_from_state(state).tool_calls == 0
+
+
+class _Run:
+    def __init__(self, requests, input_tokens, output_tokens, item_types):
+        usage = SimpleNamespace(requests=requests, input_tokens=input_tokens, output_tokens=output_tokens)
+        self.context_wrapper = SimpleNamespace(usage=usage)
+        self.new_items = [SimpleNamespace(type=item_type) for item_type in item_types]
+
+
+def test_forced_answer_usage_includes_the_interrupted_run():
+    interrupted = _Run(3, 900, 60, ["tool_call_item", "tool_call_output_item", "tool_call_item"])
+    forced = _Run(1, 1200, 80, ["message_output_item"])
+    usage = _usage_from_result(interrupted, forced)
+    assert usage.llm_calls == 4
+    assert usage.tool_calls == 2
+    assert usage.prompt_tokens == 2100
+    assert usage.completion_tokens == 140
+    assert _usage_from_result(None, forced).llm_calls == 1
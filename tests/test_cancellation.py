@@ -0,0 +1,169 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+from langchain_core.messages import AIMessage
+
+from src.backend import main
+from src.backend.agent import graph
+from src.backend.agent.cancellation import CancelToken, TurnCancelled, cancellation_scope, run_cancellable
+from src.backend.agent.resilience import ResilienceConfig, call_with_resilience, track_model_calls
+from src.backend.agent.runner import run_agent_turn
+from src.backend.api.admission import AdmissionController, ConversationLocks
+from src.backend.api.models import ChatRequest, ChatResponse
+
+
+def test_blocking_model_call_is_abandoned_on_cancel():
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel, ("client_disconnected",)).start()
+    started = time.monotonic()
+    with cancellation_scope(token), track_model_calls() as stats:
+        with pytest.raises(TurnCancelled) as raised:
+            call_with_resilience(lambda: time.sleep(2), key="slow", config=ResilienceConfig(max_retries=2))
+    assert time.monotonic() - started < 1
+    assert raised.value.reason == "client_disconnected"
+    assert stats.as_metadata()["llm_attempts_cancelled"] == 1
+    assert stats.as_metadata()["llm_retries"] == 0
+
+
+def test_async_turn_task_is_cancelled():
+    token = CancelToken()
+    cleaned_up = []
+
+    async def slow_turn():
+        try:
+            await asyncio.sleep(5)
+        finally:
+            cleaned_up.append(True)
+
+    threading.Timer(0.1, token.cancel).start()
+    started = time.monotonic()
+    with cancellation_scope(token), pytest.raises(TurnCancelled):
+        asyncio.run(run_cancellable(slow_turn()))
+    assert time.monotonic() - started < 1
+    assert cleaned_up == [True]
+
+
+def test_langgraph_stops_between_steps(monkeypatch):
+    token = CancelToken()
+    searches = []
+
+    class CancellingModel:
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+        def invoke(self, messages):
+            # The client goes away while the model is answering.
+            token.cancel("client_disconnected")
+            return AIMessage(content="", tool_calls=[{"name": "web_search", "args": {"query": "q"}, "id": "call-1"}])
+
+    monkeypatch.setattr(graph, "_model", lambda model_name=None: CancellingModel())
+    monkeypatch.setattr(graph, "system_prompt", lambda: "test")
+    monkeypatch.setattr(graph, "web_search_tool", lambda query: searches.append(query))
+    with pytest.raises(TurnCancelled):
+        run_agent_turn(
+            framework="langgraph",
+            conversation_id="conv",
+            thread_id="thread",
+            user_message="Look this up",
+            document_paths=[],
+            cancel=token,
+        )
+    assert searches == []
+
+
+class DisconnectedRequest:
+    async def is_disconnected(self):
+        return True
+
+
+async def test_disconnect_frees_the_chat_slot(monkeypatch):
+    monkeypatch.setenv("CHAT_DISCONNECT_POLL_S", "0.01")
+
+    def run_chat(request, cancel=None):
+        cancel.future.result(timeout=2)
+        cancel.raise_if_cancelled()
+
+    monkeypatch.setattr(main, "_run_chat", run_chat)
+    admission = AdmissionController(max_concurrent=1, max_queue=0, queue_timeout_s=1)
+    main.app.state.admission = admission
+    main.app.state.conversation_locks = ConversationLocks()
+
+    started = time.monotonic()
+    with pytest.raises(HTTPException) as raised:
+        await main.chat(ChatRequest(conversation_id="conv", message="hi"), DisconnectedRequest(), None, None)
+    assert raised.value.status_code == 499
+    assert time.monotonic() - started < 1
+    assert admission.stats()["active"] == 0
+
+
+async def test_disconnect_while_queued_gives_up_the_wait(monkeypatch):
+    monkeypatch.setenv("CHAT_DISCONNECT_POLL_S", "0.01")
+    ran = []
+    monkeypatch.setattr(main, "_run_chat", lambda request, cancel=None: ran.append(request))
+    admission = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout_s=5)
+    locks = ConversationLocks()
+    main.app.state.admission = admission
+    main.app.state.conversation_locks = locks
+
+    async with admission.admit():
+        started = time.monotonic()
+        with pytest.raises(HTTPException) as raised:
+            await main.chat(ChatRequest(conversation_id="conv", message="hi"), DisconnectedRequest(), None, None)
+        assert raised.value.status_code == 499
+        assert time.monotonic() - started < 1
+        assert admission.stats()["waiting"] == 0
+    assert ran == []
+    assert len(locks) == 0
+
+
+class DisconnectsLater:
+    def __init__(self, after_s):
+        self.at = time.monotonic() + after_s
+
+    async def is_disconnected(self):
+        return time.monotonic() >= self.at
+
+
+class StaysConnected:
+    async def is_disconnected(self):
+        return False
+
+
+async def test_cancelled_turn_keeps_its_lock_until_the_thread_returns(monkeypatch):
+    monkeypatch.setenv("CHAT_DISCONNECT_POLL_S", "0.01")
+    spans = []
+
+    def run_chat(request, cancel=None):
+        started = time.monotonic()
+        if request.message == "first":
+            cancel.future.result(timeout=2)
+            # A tool call in progress finishes before the turn notices.
+            time.sleep(0.3)
+        spans.append((request.message, started, time.monotonic()))
+        if cancel is not None:
+            cancel.raise_if_cancelled()
+        return ChatResponse(conversation_id=request.conversation_id, assistant_message="ok", span_id="s")
+
+    monkeypatch.setattr(main, "_run_chat", run_chat)
+    admission = AdmissionController(max_concurrent=2, max_queue=2, queue_timeout_s=5)
+    main.app.state.admission = admission
+    main.app.state.conversation_locks = ConversationLocks()
+
+    async def first():
+        with pytest.raises(HTTPException) as raised:
+            await main.chat(ChatRequest(conversation_id="conv", message="first"), DisconnectsLater(0.1), None, None)
+        assert raised.value.status_code == 499
+        # The slot was held until the thread returned.
+        assert [span[0] for span in spans] == ["first"]
+
+    async def second():
+        await asyncio.sleep(0.05)
+        await main.chat(ChatRequest(conversation_id="conv", message="second"), StaysConnected(), None, None)
+
+    await asyncio.gather(first(), second())
+    (_, _, first_end), (_, second_start, _) = spans
+    assert second_start >= first_end
+    assert admission.stats()["active"] == 0
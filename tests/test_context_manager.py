@@ -0,0 +1,63 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from src.backend.agent.context import SUMMARY_PREFIX, RollingSummaryContextManager
+
+
+def _conversation(turns: int) -> list[dict]:
+    messages = [{"role": "system", "content": "document attached"}]
+    for index in range(turns):
+        messages.append({"role": "user", "content": f"question {index} " + "word " * 20})
+        messages.append({"role": "assistant", "content": f"answer {index} " + "word " * 20})
+    return messages
+
+
+def _fit(manager, messages):
+    return manager.fit_messages(
+        "conv-1",
+        messages,
+        model_name="test-model",
+        role_of=lambda message: message["role"],
+        text_of=lambda message: message["content"],
+    )
+
+
+def _manager(monkeypatch, summaries):
+    monkeypatch.setenv("CONTEXT_TOKEN_BUDGET", "150")
+    monkeypatch.setenv("CONTEXT_RECENT_MESSAGES", "2")
+    monkeypatch.setenv("CONTEXT_SUMMARY_TOKENS", "40")
+
+    def summarizer(previous, transcript):
+        summaries.append(transcript)
+        return f"condensed {len(summaries)}"
+
+    return RollingSummaryContextManager(
+        summarizer=summarizer,
+        token_counter=lambda text, model: len(text.split()),
+        executor=ThreadPoolExecutor(max_workers=1),
+    )
+
+
+def test_history_under_budget_is_untouched(monkeypatch):
+    manager = _manager(monkeypatch, [])
+    messages = _conversation(2)
+    assert _fit(manager, messages) == (None, messages)
+
+
+def test_older_turns_fold_into_background_summary(monkeypatch):
+    summaries = []
+    manager = _manager(monkeypatch, summaries)
+    messages = _conversation(6)
+
+    summary, kept = _fit(manager, messages)
+    assert summary.startswith(SUMMARY_PREFIX)
+    assert kept[0] == messages[0]
+    assert kept[1]["role"] == "user"
+    assert kept[-1] == messages[-1]
+    assert len(kept) < len(messages)
+
+    manager._state("conv-1").pending.result(timeout=5)
+    assert len(summaries) == 1
+
+    summary, kept_again = _fit(manager, messages)
+    assert summary == f"{SUMMARY_PREFIX}\ncondensed 1"
+    assert kept_again == kept
@@ -0,0 +1,83 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src.backend.main import app
+from src.backend.storage.session_store import SessionStore
+
+
+@pytest.fixture
+def client(tmp_path):
+    # No context manager: the lifespan (tracing, warmup, janitor) is not needed.
+    app.state.session_store = SessionStore(str(tmp_path / "sessions.db"))
+    return TestClient(app)
+
+
+def _turns(store, conversation_id, count, start=0):
+    for turn in range(start, start + count):
+        store.append_transcript(
+            conversation_id,
+            [
+                {"role": "user", "content": f"question {turn}"},
+                {"role": "assistant", "content": f"answer {turn} " + "x" * 200},
+            ],
+            span_id=f"span-{turn}",
+        )
+
+
+def test_long_session_fetches_last_page_and_revalidates(client):
+    store = app.state.session_store
+    store.get_or_create_session("conv")
+    _turns(store, "conv", 300)
+
+    latest = client.get("/conversations/conv/messages", headers={"Accept-Encoding": "gzip"})
+    assert latest.status_code == 200
+    assert latest.headers["content-encoding"] == "gzip"
+    body = latest.json()
+    assert [message["seq"] for message in body["messages"]] == list(range(551, 601))
+    assert body["last_seq"] == 600
+    assert body["next_before"] == 551
+    assert body["messages"][-1]["span_id"] == "span-299"
+    assert body["messages"][-2]["span_id"] is None
+
+    etag = latest.headers["etag"]
+    cached = client.get("/conversations/conv/messages", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    older = client.get("/conversations/conv/messages", params={"before": 551, "limit": 100})
+    assert [message["seq"] for message in older.json()["messages"]] == list(range(451, 551))
+
+    _turns(store, "conv", 1, start=300)
+    assert client.get("/conversations/conv/messages", headers={"If-None-Match": etag}).status_code == 200
+    # Older pages do not change as the conversation grows.
+    revalidated = client.get(
+        "/conversations/conv/messages",
+        params={"before": 551, "limit": 100},
+        headers={"If-None-Match": older.headers["etag"]},
+    )
+    assert revalidated.status_code == 304
+
+    newer = client.get("/conversations/conv/messages", params={"after": 600})
+    assert [message["content"] for message in newer.json()["messages"]] == [
+        "question 300",
+        "answer 300 " + "x" * 200,
+    ]
+
+
+def test_legacy_transcript_is_backfilled(client):
+    store = app.state.session_store
+    store.get_or_create_session("legacy")
+    store.update_transcript(
+        "legacy",
+        [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}],
+    )
+    body = client.get("/conversations/legacy/messages").json()
+    assert [(message["seq"], message["content"]) for message in body["messages"]] == [(1, "hi"), (2, "hello")]
+
+    _turns(store, "legacy", 1)
+    assert client.get("/conversations/legacy/messages").json()["last_seq"] == 4
+
+
+def test_unknown_conversation_is_not_found(client):
+    assert client.get("/conversations/missing/messages").status_code == 404
+    assert app.state.session_store.message_head("missing") is None
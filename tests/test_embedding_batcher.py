@@ -0,0 +1,125 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from langchain_openai import OpenAIEmbeddings
+
+from src.backend.agent.embedding_batcher import (
+    BatcherConfig,
+    EmbeddingBatcher,
+    EmbeddingBuildError,
+)
+
+
+class FakeEmbeddingsServer:
+    """OpenAI-compatible /v1/embeddings endpoint with scripted failures."""
+
+    def __init__(self):
+        self.requests = []
+        self.failures = []
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with server.lock:
+                    server.requests.append(body["input"])
+                    status = server.failures.pop(0) if server.failures else 200
+                if status != 200:
+                    payload = json.dumps({"error": {"message": "slow down", "type": "rate_limit"}})
+                    self.send_response(status)
+                    self.send_header("Retry-After", "0")
+                else:
+                    data = [
+                        {"object": "embedding", "index": i, "embedding": [float(len(text)), float(i), 1.0]}
+                        for i, text in enumerate(body["input"])
+                    ]
+                    payload = json.dumps(
+                        {
+                            "object": "list",
+                            "data": data,
+                            "model": body["model"],
+                            "usage": {"prompt_tokens": 1, "total_tokens": 1},
+                        }
+                    )
+                    self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(payload.encode())
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def close(self):
+        self.httpd.shutdown()
+
+
+@pytest.fixture
+def fake_server():
+    server = FakeEmbeddingsServer()
+    yield server
+    server.close()
+
+
+def _batcher(server, **overrides):
+    client = OpenAIEmbeddings(
+        base_url=server.base_url,
+        api_key="test",
+        check_embedding_ctx_length=False,
+        max_retries=0,
+    )
+    settings = {"batch_size": 2, "concurrency": 3, "base_backoff_s": 0, **overrides}
+    return EmbeddingBatcher(
+        client.embed_documents, config=BatcherConfig(**settings), sleep=lambda _: None
+    )
+
+
+def test_batches_run_concurrently_and_recover_from_429(fake_server):
+    fake_server.failures = [429, 429]
+    batcher = _batcher(fake_server)
+    texts = [f"chunk {i}" * (i + 1) for i in range(7)]
+    added = {}
+
+    vectors = batcher.embed(texts, on_batch=lambda start, batch: added.update({start: len(batch)}))
+
+    assert vectors.shape == (7, 3)
+    assert [row[0] for row in vectors] == [len(text) for text in texts]
+    assert added == {0: 2, 2: 2, 4: 2, 6: 1}
+    assert batcher.rate_limited == 2
+    assert batcher.requests == len(fake_server.requests) == 6
+    assert batcher.limiter.scale < 1.0
+
+
+def test_request_count_is_exact_across_threads():
+    config = BatcherConfig(batch_size=1, concurrency=8, requests_per_minute=1e9, tokens_per_minute=1e12)
+    batcher = EmbeddingBatcher(lambda texts: [[1.0] for _ in texts], config=config)
+    batcher.embed([f"chunk {i}" for i in range(2000)])
+    assert batcher.requests == 2000
+
+
+def test_failed_build_resumes_from_checkpoints(fake_server, tmp_path):
+    texts = [f"chunk {i}" for i in range(6)]
+    fake_server.failures = [200, 500]
+    with pytest.raises(EmbeddingBuildError):
+        _batcher(fake_server, max_retries=0, concurrency=1).embed(
+            texts, checkpoint_dir=str(tmp_path)
+        )
+    first_attempt = len(fake_server.requests)
+
+    vectors = _batcher(fake_server).embed(texts, checkpoint_dir=str(tmp_path))
+
+    assert vectors.shape == (6, 3)
+    assert [row[0] for row in vectors] == [len(text) for text in texts]
+    resumed = fake_server.requests[first_attempt:]
+    assert ["chunk 0", "chunk 1"] not in resumed
+    assert ["chunk 2", "chunk 3"] in resumed
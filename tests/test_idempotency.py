@@ -0,0 +1,138 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.backend import main
+from src.backend.api.admission import AdmissionController, ConversationLocks
+from src.backend.api.idempotency import (
+    IdempotencyConfig,
+    IdempotencyInProgress,
+    IdempotencyKeyReused,
+    IdempotentTurns,
+)
+from src.backend.api.models import ChatResponse
+from src.backend.storage.session_store import SessionStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SessionStore(db_path=str(tmp_path / "sessions.db"))
+
+
+def test_retry_during_turn_attaches_to_it(store):
+    turns = IdempotentTurns(store, IdempotencyConfig(wait_s=5))
+    started = threading.Event()
+    calls = []
+
+    def turn():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return {"assistant_message": "once"}
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(turns.run("conv", "key-1", "hash", turn)))
+    first.start()
+    started.wait(1)
+    retried = turns.run("conv", "key-1", "hash", turn)
+    first.join()
+
+    assert len(calls) == 1
+    assert results == [({"assistant_message": "once"}, False)]
+    assert retried == ({"assistant_message": "once"}, True)
+    # After the turn, the stored response is returned without running it.
+    assert turns.run("conv", "key-1", "hash", turn) == ({"assistant_message": "once"}, True)
+    assert len(calls) == 1
+    with pytest.raises(IdempotencyKeyReused):
+        turns.run("conv", "key-1", "other-hash", turn)
+
+
+def test_failed_turn_releases_key(store):
+    turns = IdempotentTurns(store, IdempotencyConfig())
+
+    def failing():
+        raise RuntimeError("model unavailable")
+
+    with pytest.raises(RuntimeError):
+        turns.run("conv", "key-1", "hash", failing)
+    assert turns.run("conv", "key-1", "hash", lambda: {"ok": True}) == ({"ok": True}, False)
+
+
+def test_retry_on_another_worker_polls_the_claim(store):
+    other_worker = IdempotentTurns(store, IdempotencyConfig(wait_s=0.3, poll_s=0.05))
+    assert store.claim_idempotency_key("conv", "key-1", "hash", "1970-01-01") is None
+    with pytest.raises(IdempotencyInProgress):
+        other_worker.run("conv", "key-1", "hash", lambda: {"ran": True})
+
+    threading.Timer(0.1, store.complete_idempotency_key, ("conv", "key-1", {"ran": False})).start()
+    other_worker.config.wait_s = 2
+    assert other_worker.run("conv", "key-1", "hash", lambda: {"ran": True}) == ({"ran": False}, True)
+
+    # A claim left pending past the timeout is taken over.
+    assert store.claim_idempotency_key("conv", "key-2", "hash", "1970-01-01") is None
+    other_worker.config.pending_timeout_s = 0
+    time.sleep(0.01)
+    assert other_worker.run("conv", "key-2", "hash", lambda: {"ran": True}) == ({"ran": True}, False)
+
+
+def test_chat_replays_stored_response(store, monkeypatch):
+    calls = []
+
+    def run_chat(request, cancel=None):
+        calls.append(request.message)
+        return ChatResponse(conversation_id=request.conversation_id, assistant_message="hi", span_id="span-1")
+
+    monkeypatch.setattr(main, "_run_chat", run_chat)
+    main.app.state.session_store = store
+    main.app.state.admission = AdmissionController(max_concurrent=2, max_queue=2, queue_timeout_s=1)
+    main.app.state.conversation_locks = ConversationLocks()
+    main.app.state.idempotency = IdempotentTurns(store, IdempotencyConfig())
+    client = TestClient(main.app)
+    payload = {"conversation_id": "conv", "message": "hello"}
+
+    first = client.post("/chat", json=payload, headers={"Idempotency-Key": "abc"})
+    retry = client.post("/chat", json=payload, headers={"Idempotency-Key": "abc"})
+    assert first.json() == retry.json()
+    assert "idempotent-replayed" not in first.headers
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert calls == ["hello"]
+
+    reused = client.post("/chat", json={**payload, "message": "other"}, headers={"Idempotency-Key": "abc"})
+    assert reused.status_code == 422
+    client.post("/chat", json={**payload, "idempotency_key": "def"})
+    client.post("/chat", json=payload)
+    assert calls == ["hello", "hello", "hello"]
+
+
+def test_db_claim_is_made_outside_the_process_lock(store, monkeypatch):
+    turns = IdempotentTurns(store, IdempotencyConfig(wait_s=5))
+    claim = store.claim_idempotency_key
+    claiming = threading.Event()
+    finish_claim = threading.Event()
+
+    def slow_claim(*args):
+        claiming.set()
+        finish_claim.wait(2)
+        return claim(*args)
+
+    monkeypatch.setattr(store, "claim_idempotency_key", slow_claim)
+    first = threading.Thread(target=turns.run, args=("conv", "key-1", "hash", lambda: {"n": 1}))
+    first.start()
+    claiming.wait(1)
+    # Other keys are not held up by the claim in progress...
+    monkeypatch.setattr(store, "claim_idempotency_key", claim)
+    assert turns.run("conv", "key-2", "hash", lambda: {"n": 2}) == ({"n": 2}, False)
+    # ...and a retry of the same key waits on it instead of claiming again.
+    threading.Timer(0.1, finish_claim.set).start()
+    assert turns.run("conv", "key-1", "hash", lambda: {"n": 3}) == ({"n": 1}, True)
+    first.join()
+
+
+def test_claim_held_elsewhere_leaves_no_placeholder(store):
+    turns = IdempotentTurns(store, IdempotencyConfig(wait_s=1, poll_s=0.05))
+    assert store.claim_idempotency_key("conv", "key-1", "hash", "1970-01-01") is None
+    store.complete_idempotency_key("conv", "key-1", {"n": 0})
+    assert turns.run("conv", "key-1", "hash", lambda: {"n": 1}) == ({"n": 0}, True)
+    assert turns._inflight == {}
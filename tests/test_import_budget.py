@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+HEAVY_MODULES = [
+    "langgraph",
+    "langchain_community",
+    "langchain_openai",
+    "braintrust_langchain",
+    "faiss",
+    "pypdf",
+    "tavily",
+    "agents",
+    "google.adk",
+]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import src.backend.main  # noqa: F401
+elapsed = time.perf_counter() - started
+print(json.dumps({"elapsed": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def _probe_startup_import() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=Path(__file__).resolve().parents[1],
+        env={**os.environ, "AGENT_FRAMEWORK": "google_adk"},
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_startup_does_not_import_framework_or_rag_stack():
+    loaded = set(_probe_startup_import()["modules"])
+    assert not [name for name in HEAVY_MODULES if name in loaded]
+
+
+def test_startup_import_time_within_budget():
+    budget = float(os.getenv("IMPORT_TIME_BUDGET_S", "1.5"))
+    elapsed = min(_probe_startup_import()["elapsed"] for _ in range(3))
+    assert elapsed < budget, f"importing src.backend.main took {elapsed:.2f}s (budget {budget}s)"
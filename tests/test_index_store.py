@@ -0,0 +1,200 @@
+import os
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.backend.agent import rag
+
+
+def _use_fake_embeddings(monkeypatch, tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    monkeypatch.setattr(rag, "_embeddings", lambda: embeddings)
+    monkeypatch.setattr(rag, "INDEX_DIR", str(tmp_path / "indexes"))
+    monkeypatch.setattr(rag, "_VECTORSTORES", type(rag._VECTORSTORES)())
+    return embeddings
+
+
+def test_index_is_persisted_and_reopened_memory_mapped(monkeypatch, tmp_path):
+    _use_fake_embeddings(monkeypatch, tmp_path)
+    source = tmp_path / "deposition.txt"
+    source.write_text("\n\n".join(f"Paragraph {i}: the witness saw car {i}." for i in range(40)))
+
+    built = rag.get_vectorstore(str(source))
+    chunk = built.text(0)
+    assert len(built) > 1
+
+    rag.evict_vectorstore(str(source))
+    reopened = rag.get_vectorstore(str(source))
+    assert reopened is not built
+    assert reopened.directory == built.directory
+    assert reopened.text(0) == chunk
+    # Deterministic fake embeddings map identical text to identical vectors.
+    assert reopened.similarity_search(chunk, k=1)[0].page_content == chunk
+
+
+def test_sweep_removes_indexes_for_deleted_documents(monkeypatch, tmp_path):
+    _use_fake_embeddings(monkeypatch, tmp_path)
+    kept = tmp_path / "kept.txt"
+    dropped = tmp_path / "dropped.txt"
+    kept.write_text("kept exhibit text")
+    dropped.write_text("dropped exhibit text")
+    kept_dir = rag.get_vectorstore(str(kept)).directory
+    dropped_dir = rag.get_vectorstore(str(dropped)).directory
+    dropped.unlink()
+
+    assert rag.sweep_orphaned_indexes({str(kept)}) == [dropped_dir]
+    assert rag.sweep_orphaned_indexes({str(kept)}) == []
+    assert kept_dir != dropped_dir
+
+
+def test_sweep_keeps_index_shared_by_identical_upload(monkeypatch, tmp_path):
+    _use_fake_embeddings(monkeypatch, tmp_path)
+    first = tmp_path / "first.txt"
+    second = tmp_path / "second.txt"
+    first.write_text("same exhibit text")
+    second.write_text("same exhibit text")
+    directory = rag.get_vectorstore(str(first)).directory
+    assert rag.get_vectorstore(str(second)).directory == directory
+    first.unlink()
+
+    assert rag.sweep_orphaned_indexes({str(second)}) == []
+    second.unlink()
+    assert rag.sweep_orphaned_indexes(set()) == [directory]
+    # Another worker may be blocked on the lock file.
+    assert os.path.exists(f"{directory}.lock")
+
+
+def test_sweep_needs_no_embeddings_client(monkeypatch, tmp_path):
+    _use_fake_embeddings(monkeypatch, tmp_path)
+    kept = tmp_path / "kept.txt"
+    dropped = tmp_path / "dropped.txt"
+    kept.write_text("kept exhibit text")
+    dropped.write_text("dropped exhibit text")
+    rag.get_vectorstore(str(kept))
+    dropped_dir = rag.get_vectorstore(str(dropped)).directory
+    dropped.unlink()
+
+    def no_api_key():
+        raise RuntimeError("OPENAI_API_KEY is not set")
+
+    monkeypatch.setattr(rag, "_embeddings", no_api_key)
+    assert rag.sweep_orphaned_indexes({str(kept)}) == [dropped_dir]
+
+
+def test_trained_index_types_build_and_fall_back_to_flat(tmp_path):
+    import numpy as np
+
+    from src.backend.agent.index_store import IndexConfig, IndexWriter, PersistedIndex
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(600, 16)).astype("float32")
+    texts = [f"chunk {i}" for i in range(len(vectors))]
+
+    for index_type, threshold, expected_spec in [
+        ("ivf_flat", 500, "IVF15,Flat"),
+        ("sq8", 500, "SQ8"),
+        ("ivf_flat", 1000, "Flat"),
+    ]:
+        config = IndexConfig(index_type=index_type, train_threshold=threshold, nprobe=15)
+        directory = str(tmp_path / f"{index_type}-{threshold}")
+        writer = IndexWriter(directory, texts, config)
+        # Out of order, as concurrent embedding batches complete.
+        for start in (300, 0, 450, 150):
+            writer.add(start, vectors[start : start + 150])
+        writer.finish({"source_name": "exhibit.txt"})
+
+        index = PersistedIndex(directory, embeddings=None, config=config)
+        assert index.meta["index_spec"] == expected_spec
+        assert index.search_by_vector(vectors[42], k=1)[0][0] == 42
+        assert index.text(42) == "chunk 42"
+
+
+def test_retrieval_merges_documents_with_source_attribution(monkeypatch, tmp_path):
+    _use_fake_embeddings(monkeypatch, tmp_path)
+    first = tmp_path / "3f2b8c1e-0000-4000-8000-000000000000_exhibit-a.txt"
+    second = tmp_path / "exhibit-b.txt"
+    first.write_text("The invoice was dated March 3.")
+    second.write_text("The witness signed the contract in Denver.")
+    built = []
+    real_open = rag._open_or_build_index
+    monkeypatch.setattr(rag, "_open_or_build_index", lambda path: built.append(path) or real_open(path))
+
+    context = rag.retrieve_context(
+        "The witness signed the contract in Denver.", k=1, paths=[str(first), str(second)]
+    )
+    assert context == "[source: exhibit-b.txt, chunk 0]\nThe witness signed the contract in Denver."
+
+    third = tmp_path / "exhibit-c.txt"
+    third.write_text("Payment was wired on April 9.")
+    context = rag.retrieve_context(
+        "The invoice was dated March 3.", k=2, paths=[str(first), str(second), str(third)]
+    )
+    assert context.startswith("[source: exhibit-a.txt, chunk 0]\nThe invoice was dated March 3.")
+    # The earlier exhibits come from cache; only the new one is indexed.
+    assert built == [str(first), str(second), str(third)]
+
+
+def test_revised_document_only_embeds_changed_chunks(monkeypatch, tmp_path):
+    embeddings = _use_fake_embeddings(monkeypatch, tmp_path)
+    embedded = []
+    real_embed = embeddings.embed_documents
+    monkeypatch.setattr(
+        type(embeddings), "embed_documents", lambda self, texts: embedded.extend(texts) or real_embed(texts)
+    )
+    pages = [
+        f"Page {page}. " + " ".join(f"Q. Did you see car {page}-{line}? A. Yes, I did." for line in range(12))
+        for page in range(20)
+    ]
+    original = tmp_path / "original.txt"
+    original.write_text("\n\n".join(pages))
+    before = rag.get_vectorstore(str(original))
+    first_build = len(embedded)
+    assert first_build == len(before)
+
+    pages[7] = pages[7].replace("Yes, I did.", "No, I did not.", 1)
+    del pages[15]
+    revised = tmp_path / "revised.txt"
+    revised.write_text("\n\n".join(pages))
+    embedded.clear()
+    after = rag.get_vectorstore(str(revised))
+
+    assert after.directory != before.directory
+    assert 0 < len(embedded) <= 3
+    # Only the edited page and the seam left by the deleted page are new.
+    assert all("car 7-" in text or "Page 16." in text for text in embedded)
+    texts = {after.text(position) for position in range(len(after))}
+    assert not any("car 15-" in text for text in texts)
+    assert any("No, I did not." in text for text in texts)
+
+
+def _private_rss_bytes():
+    with open("/proc/self/status", "r", encoding="ascii") as handle:
+        for line in handle:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1]) * 1024
+    return None
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="needs /proc")
+def test_large_flat_index_is_mapped_not_copied(tmp_path):
+    import numpy as np
+
+    from src.backend.agent.index_store import IndexConfig, IndexWriter, PersistedIndex
+
+    config = IndexConfig(index_type="flat")
+    rng = np.random.default_rng(0)
+    for name, count in (("warm", 100), ("large", 64 * 1024)):
+        writer = IndexWriter(str(tmp_path / name), [""] * count, config)
+        for start in range(0, count, 8192):
+            writer.add(start, rng.random((min(8192, count - start), 256), dtype="float32"))
+        writer.finish({"source_name": f"{name}.txt"})
+        del writer
+    # FAISS's own first-use allocations are not part of the measurement.
+    PersistedIndex(str(tmp_path / "warm"), embeddings=None, config=config).search_by_vector([0.0] * 256, k=1)
+
+    size = os.path.getsize(tmp_path / "large" / "index.faiss")
+    before = _private_rss_bytes()
+    index = PersistedIndex(str(tmp_path / "large"), embeddings=None, config=config)
+    assert index.search_by_vector([0.5] * 256, k=3)
+    assert index.mapped
+    assert _private_rss_bytes() - before < size / 4
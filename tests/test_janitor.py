@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import time
+
+from src.backend.storage.janitor import JanitorConfig, SessionJanitor
+from src.backend.storage.session_store import SessionStore
+
+
+def _config(uploads_dir):
+    return JanitorConfig(
+        session_ttl_s=3600,
+        interval_s=0,
+        uploads_dir=str(uploads_dir),
+        orphan_grace_s=60,
+        vacuum_pages=100,
+    )
+
+
+def _age_session(db_path, conversation_id):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "UPDATE sessions SET last_active_at = ? WHERE conversation_id = ?",
+            ("2000-01-01T00:00:00+00:00", conversation_id),
+        )
+
+
+def test_janitor_expires_idle_sessions_and_their_uploads(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    store = SessionStore(db_path=db_path)
+    stale_doc = uploads / "stale.txt"
+    live_doc = uploads / "live.txt"
+    for path in (stale_doc, live_doc):
+        path.write_text("deposition")
+    store.get_or_create_session("stale")
+    store.update_document_path("stale", str(stale_doc))
+    store.get_or_create_session("live")
+    store.update_document_path("live", str(live_doc))
+    _age_session(db_path, "stale")
+
+    evicted = []
+    report = SessionJanitor(
+        store,
+        _config(uploads),
+        on_document_removed=evicted.append,
+        sweep_indexes=lambda live: [],
+    ).run_once()
+
+    assert report.expired_sessions == 1
+    assert evicted == [str(stale_doc)]
+    assert not stale_doc.exists()
+    assert live_doc.exists()
+    assert store.referenced_document_paths() == {str(live_doc)}
+
+
+def test_janitor_removes_orphans_only_after_grace_period(tmp_path):
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    store = SessionStore(db_path=str(tmp_path / "sessions.db"))
+    old_orphan = uploads / "old.txt"
+    new_orphan = uploads / "new.txt"
+    old_orphan.write_text("x")
+    new_orphan.write_text("x")
+    old = time.time() - 3600
+    os.utime(old_orphan, (old, old))
+
+    report = SessionJanitor(
+        store,
+        _config(uploads),
+        on_document_removed=lambda path: None,
+        sweep_indexes=lambda live: [],
+    ).run_once()
+
+    assert report.deleted_uploads == [str(old_orphan)]
+    assert new_orphan.exists()
+
+
+def test_turn_start_keeps_idle_session_from_expiring(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+    store = SessionStore(db_path=db_path)
+    store.get_or_create_session("conv")
+    _age_session(db_path, "conv")
+
+    # A turn reads the session, then runs while the janitor passes by.
+    store.get_or_create_session("conv")
+    report = SessionJanitor(store, _config(tmp_path), sweep_indexes=lambda live: []).run_once()
+    assert report.expired_sessions == 0
+    store.append_transcript("conv", [{"role": "user", "content": "hi"}])
+    assert store.get_or_create_session("conv").transcript == [{"role": "user", "content": "hi"}]
+
+
+def test_existing_database_is_converted_to_incremental_vacuum_once(tmp_path, caplog):
+    db_path = str(tmp_path / "sessions.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE sessions (conversation_id TEXT PRIMARY KEY)")
+    with caplog.at_level("WARNING", logger="src.backend.storage.session_store"):
+        SessionStore(db_path=db_path)
+        assert "One-time VACUUM" in caplog.text
+        caplog.clear()
+        SessionStore(db_path=db_path)
+        SessionStore(db_path=str(tmp_path / "new.db"))
+    assert caplog.text == ""
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    with sqlite3.connect(str(tmp_path / "new.db")) as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
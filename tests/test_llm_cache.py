@@ -0,0 +1,37 @@
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration
+
+from src.backend.agent.llm_cache import CACHE_HIT_KEY, SQLiteLLMCache
+
+
+def test_repeated_request_is_served_from_cache(tmp_path):
+    cache = SQLiteLLMCache(db_path=str(tmp_path / "llm_cache.db"), max_bytes=1024 * 1024)
+    model = GenericFakeChatModel(
+        messages=iter([AIMessage(content="first"), AIMessage(content="second")]),
+        cache=cache,
+    )
+    request = [HumanMessage(content="Who is the witness?")]
+
+    miss = model.invoke(request)
+    hit = model.invoke(request)
+
+    assert miss.content == "first"
+    assert hit.content == "first"
+    assert hit.response_metadata[CACHE_HIT_KEY] is True
+    assert cache.stats()["entries"] == 1
+
+
+def test_cache_evicts_least_recently_used_entries(tmp_path):
+    cache = SQLiteLLMCache(db_path=str(tmp_path / "llm_cache.db"), max_bytes=600)
+
+    def store(prompt):
+        cache.update(prompt, "model", [ChatGeneration(message=AIMessage(content=prompt * 20))])
+
+    store("a")
+    store("b")
+    assert cache.lookup("a", "model") is not None
+    store("c")
+    assert cache.lookup("b", "model") is None
+    assert cache.lookup("a", "model") is not None
+    assert cache.stats()["bytes"] <= 600
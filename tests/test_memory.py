@@ -0,0 +1,92 @@
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from src.backend.agent import memory
+from src.backend.agent.context import RollingSummaryContextManager
+from src.backend.agent.memory import CacheEntry, approx_size, memory_report, register_cache, trim_caches
+from src.backend.main import app
+
+
+@pytest.fixture
+def conversations():
+    # conversation id -> retained payload, least recently used first
+    store = OrderedDict(
+        (f"conv-{n}", {"events": ["x" * 1000 * (n + 1)]}) for n in range(4)
+    )
+
+    def entries(measure):
+        return [
+            CacheEntry(key=key, bytes=approx_size(value) if measure else None, conversation_id=key)
+            for key, value in list(store.items())
+        ]
+
+    def evict(key):
+        return store.pop(key, None) is not None
+
+    cache = register_cache("test_conversations", entries, evict)
+    yield store, cache
+    memory._CACHES.pop("test_conversations", None)
+
+
+def test_approx_size_follows_contents():
+    small = approx_size({"summary": "x" * 10})
+    large = approx_size({"summary": "x" * 10_000})
+    assert large - small >= 9_000
+    shared = "y" * 5_000
+    assert approx_size([shared, shared]) < 2 * approx_size(shared)
+    assert approx_size({"vectors": np.zeros((100, 64), dtype="float32")}) >= 100 * 64 * 4
+
+
+def test_trim_evicts_least_recently_used_to_caps(conversations):
+    store, cache = conversations
+    cache.max_entries = 3
+    assert trim_caches()["test_conversations"] == 1
+    assert list(store) == ["conv-1", "conv-2", "conv-3"]
+
+    cache.max_entries = 0
+    cache.max_bytes = approx_size(store["conv-3"]) + approx_size(store["conv-2"]) + 100
+    assert cache.trim() == 1
+    assert list(store) == ["conv-2", "conv-3"]
+    assert cache.evicted == 2
+    # Without measuring, only the entry cap applies.
+    cache.max_bytes = 1
+    assert cache.trim(measure=False) == 0
+
+
+def test_report_ranks_conversations_by_retained_bytes(conversations):
+    report = memory_report(top=2)
+    cache = next(item for item in report["caches"] if item["name"] == "test_conversations")
+    assert cache["entries"] == 4
+    assert cache["approx_bytes"] > 10_000
+    top = [item for item in report["top_conversations"] if "test_conversations" in item["caches"]]
+    assert [item["conversation_id"] for item in top] == ["conv-3", "conv-2"]
+    assert report["rss_bytes"] is None or report["rss_bytes"] > 0
+
+
+def test_context_summaries_can_be_listed_and_forgotten():
+    manager = RollingSummaryContextManager(summarizer=lambda previous, text: "s")
+    manager._state("thread-a").summary = "a" * 300
+    manager._state("thread-b")
+    entries = manager.cache_entries()
+    assert [(entry.key, entry.bytes) for entry in entries] == [("thread-a", 300), ("thread-b", 0)]
+    assert manager.forget("thread-a")
+    assert [entry.key for entry in manager.cache_entries()] == ["thread-b"]
+
+
+def test_debug_memory_endpoint(conversations, monkeypatch):
+    store, cache = conversations
+    client = TestClient(app)
+    assert client.get("/debug/memory").status_code == 404
+
+    monkeypatch.setenv("DEBUG_ENDPOINTS_ENABLED", "true")
+    body = client.get("/debug/memory", params={"top": 1}).json()
+    assert "test_conversations" in {item["name"] for item in body["caches"]}
+    assert len(body["top_conversations"]) == 1
+
+    cache.max_entries = 1
+    body = client.get("/debug/memory", params={"trim": "true"}).json()
+    assert body["evicted"]["test_conversations"] == 3
+    assert list(store) == ["conv-3"]
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from langchain_openai import ChatOpenAI
+
+from src.backend.agent import openai_agents_agent, resilience
+from src.backend.agent.resilience import (
+    ResilienceConfig,
+    call_with_resilience,
+    call_with_resilience_async,
+    client_timeouts,
+    track_model_calls,
+)
+
+
+class FakeChatServer:
+    """OpenAI-compatible /v1/chat/completions with scripted (delay, status) per request."""
+
+    def __init__(self, keep_alive=False):
+        self.script = []
+        self.requests = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" if keep_alive else "HTTP/1.0"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with server.lock:
+                    number = server.requests
+                    server.requests += 1
+                    delay, status = server.script.pop(0) if server.script else (0.0, 200)
+                time.sleep(delay)
+                if status != 200:
+                    payload = json.dumps({"error": {"message": "unavailable", "type": "server_error"}})
+                else:
+                    payload = json.dumps(
+                        {
+                            "id": f"chatcmpl-{number}",
+                            "object": "chat.completion",
+                            "created": 0,
+                            "model": body["model"],
+                            "choices": [
+                                {
+                                    "index": 0,
+                                    "message": {"role": "assistant", "content": f"reply {number}"},
+                                    "finish_reason": "stop",
+                                }
+                            ],
+                            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+                        }
+                    )
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload.encode())))
+                    self.end_headers()
+                    self.wfile.write(payload.encode())
+                except OSError:
+                    pass  # the client gave up on this attempt
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def close(self):
+        self.httpd.shutdown()
+
+
+@pytest.fixture
+def fake_server():
+    resilience._latencies.clear()
+    server = FakeChatServer()
+    yield server
+    server.close()
+
+
+def _config(**overrides):
+    values = dict(attempt_timeout_s=5.0, max_retries=2, retry_base_s=0.01, retry_max_s=0.05)
+    values.update(overrides)
+    return ResilienceConfig(**values)
+
+
+def _model(server, config):
+    return ChatOpenAI(model="fake-model", base_url=server.base_url, api_key="test", **client_timeouts(config))
+
+
+def test_hedge_wins_over_slow_attempt(fake_server):
+    config = _config(max_hedges=1, hedge_initial_s=0.2, hedge_min_s=0.1)
+    fake_server.script = [(1.5, 200), (0.0, 200)]
+    model = _model(fake_server, config)
+    started = time.monotonic()
+    with track_model_calls() as stats:
+        response = call_with_resilience(lambda: model.invoke("hi"), key="fake-model", config=config)
+    assert time.monotonic() - started < 1.0
+    assert response.content == "reply 1"
+    assert (stats.attempts, stats.hedges, stats.hedge_wins, stats.cancelled) == (2, 1, 1, 1)
+
+
+def test_fast_primary_needs_no_hedge(fake_server):
+    config = _config(max_hedges=1, hedge_initial_s=0.5, hedge_min_s=0.1)
+    model = _model(fake_server, config)
+    with track_model_calls() as stats:
+        response = call_with_resilience(lambda: model.invoke("hi"), key="fake-model", config=config)
+    assert response.content == "reply 0"
+    assert (stats.attempts, stats.hedges) == (1, 0)
+
+
+def test_hedge_delay_follows_recent_latency():
+    resilience._latencies.clear()
+    config = _config(max_hedges=1, hedge_percentile=90, hedge_min_s=0.05, hedge_initial_s=3.0, hedge_min_samples=10)
+    assert resilience.hedge_delay("m", config) == 3.0
+    for value in range(1, 11):
+        resilience._latencies.record("m", value / 10)
+    assert resilience.hedge_delay("m", config) == pytest.approx(1.0)
+    assert resilience.hedge_delay("m", _config()) is None
+
+
+def test_server_errors_are_retried(fake_server):
+    config = _config()
+    fake_server.script = [(0.0, 503), (0.0, 200)]
+    model = _model(fake_server, config)
+    with track_model_calls() as stats:
+        response = call_with_resilience(lambda: model.invoke("hi"), key="fake-model", config=config)
+    assert response.content == "reply 1"
+    assert stats.retries == 1
+    assert len(stats.errors) == 1
+
+
+def test_attempt_timeout_is_retried(fake_server):
+    config = _config(attempt_timeout_s=0.3)
+    fake_server.script = [(1.0, 200)]
+    model = _model(fake_server, config)
+    with track_model_calls() as stats:
+        response = call_with_resilience(lambda: model.invoke("hi"), key="fake-model", config=config)
+    assert response.content == "reply 1"
+    assert stats.retries == 1
+
+
+def test_client_errors_are_not_retried(fake_server):
+    config = _config()
+    fake_server.script = [(0.0, 400)]
+    model = _model(fake_server, config)
+    with track_model_calls() as stats, pytest.raises(Exception):
+        call_with_resilience(lambda: model.invoke("hi"), key="fake-model", config=config)
+    assert fake_server.requests == 1
+    assert stats.retries == 0
+
+
+def test_async_hedge_cancels_loser():
+    config = _config(max_hedges=1, hedge_initial_s=0.05, hedge_min_s=0.01)
+    delays = [1.0, 0.0]
+    cancelled = []
+
+    async def attempt():
+        delay = delays.pop(0)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(delay)
+            raise
+        return delay
+
+    async def run():
+        with track_model_calls() as stats:
+            result = await call_with_resilience_async(attempt, key="fake-model", config=config)
+        return result, stats
+
+    resilience._latencies.clear()
+    result, stats = asyncio.run(run())
+    assert result == 0.0
+    assert cancelled == [1.0]
+    assert (stats.hedges, stats.hedge_wins, stats.cancelled) == (1, 1, 1)
+
+
+def test_async_attempt_timeout_then_retry():
+    config = _config(attempt_timeout_s=0.05)
+    delays = [1.0, 0.0]
+
+    async def attempt():
+        await asyncio.sleep(delays.pop(0))
+        return "ok"
+
+    with track_model_calls() as stats:
+        assert asyncio.run(call_with_resilience_async(attempt, key="fake-model", config=config)) == "ok"
+    assert (stats.timeouts, stats.retries) == (1, 1)
+
+
+def test_openai_agents_client_survives_consecutive_turns(monkeypatch):
+    server = FakeChatServer(keep_alive=True)
+    monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+    async def turn():
+        client = openai_agents_agent._loop_client()
+        assert openai_agents_agent._loop_client() is client
+        reply = await client.chat.completions.create(
+            model="fake-model", messages=[{"role": "user", "content": "hi"}]
+        )
+        return reply.choices[0].message.content
+
+    try:
+        # Each turn runs under its own asyncio.run, as the agent does.
+        assert [asyncio.run(turn()), asyncio.run(turn())] == ["reply 0", "reply 1"]
+    finally:
+        server.close()
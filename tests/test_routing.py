@@ -0,0 +1,53 @@
+import pytest
+
+from src.backend.agent.routing import RouterConfig, route_turn
+from src.backend.storage.session_store import SessionStore
+
+TIERS = RouterConfig(tiers={"fast": "small-model", "strong": "large-model"})
+
+
+@pytest.mark.parametrize(
+    ("message", "has_documents", "previous_tool_calls", "tier"),
+    [
+        ("Thanks!", True, 3, "fast"),
+        ("ok, got it", False, 0, "fast"),
+        ("shorter please", True, 1, "fast"),
+        ("Summarize the key events described in the deposition.", True, None, "strong"),
+        ("Who is the witness and what role do they describe?", True, None, "strong"),
+        ("What is the capital of France?", False, None, "fast"),
+    ],
+)
+def test_classifier_routes_by_local_signals(message, has_documents, previous_tool_calls, tier):
+    decision = route_turn(
+        message, has_documents=has_documents, previous_tool_calls=previous_tool_calls, config=TIERS
+    )
+    assert (decision.tier, decision.reason) == (tier, "classifier")
+    assert decision.model == TIERS.tiers[tier]
+    assert decision.as_metadata()["routing_features"]["documents"] == float(has_documents)
+
+
+def test_override_disabled_and_framework_defaults(monkeypatch):
+    decision = route_turn("Thanks!", has_documents=False, override="strong", config=TIERS)
+    assert (decision.tier, decision.model, decision.reason) == ("strong", "large-model", "override")
+    assert decision.score < 0.5
+    with pytest.raises(ValueError):
+        route_turn("Thanks!", has_documents=False, override="medium", config=TIERS)
+
+    monkeypatch.setenv("DEFAULT_LLM_MODEL", "gpt-4o-mini")
+    monkeypatch.setenv("GOOGLE_ADK_MODEL", "gemini-2.0-flash")
+    monkeypatch.delenv("MODEL_TIERS", raising=False)
+    monkeypatch.setenv("GOOGLE_ADK_MODEL_TIERS", "fast=gemini-2.0-flash-lite")
+    assert route_turn("hi", has_documents=False).model == "gpt-4o-mini"
+    assert route_turn("hi", has_documents=False).reason == "disabled"
+    adk = route_turn("hi", has_documents=False, framework="google_adk")
+    assert (adk.tier, adk.model) == ("fast", "gemini-2.0-flash-lite")
+    # A tier without a model keeps the framework default.
+    adk = route_turn("Summarize the deposition timeline", has_documents=True, framework="google_adk")
+    assert (adk.tier, adk.model) == ("strong", "gemini-2.0-flash")
+
+
+def test_previous_turn_tool_calls_are_stored(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.db"))
+    assert store.get_or_create_session("conv").last_tool_calls is None
+    store.update_last_tool_calls("conv", 2)
+    assert store.get_or_create_session("conv").last_tool_calls == 2
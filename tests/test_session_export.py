@@ -0,0 +1,91 @@
+import json
+import sqlite3
+
+from scripts import export_sessions
+from src.backend.storage.session_store import SessionStore
+
+
+def _turn(store, conversation_id, question, answer, span_id, framework="langgraph"):
+    store.append_transcript(
+        conversation_id,
+        [{"role": "user", "content": question}, {"role": "assistant", "content": answer}],
+        span_id=span_id,
+        agent_framework=framework,
+    )
+
+
+def _store(tmp_path):
+    store = SessionStore(db_path=str(tmp_path / "sessions.db"))
+    exhibit = tmp_path / "exhibit.txt"
+    exhibit.write_text("Q. Where were you?\nA. At home.\n")
+    for conversation_id in ("conv-a", "conv-b"):
+        store.get_or_create_session(conversation_id)
+    _turn(store, "conv-a", "Who is the witness?", "Jane Doe.", "span-1")
+    store.add_document("conv-a", str(exhibit))
+    _turn(store, "conv-a", "Where was she?", "At home.", "span-2")
+    _turn(store, "conv-b", "Any exhibits?", "None.", "span-3", framework="google-adk")
+    store.record_feedback("span-1", 1.0, None)
+    store.record_feedback("span-3", 0.0, None)
+    store.record_feedback("span-3", None, "missed the exhibit")
+    return store
+
+
+def test_iter_turns_pairs_and_filters(tmp_path):
+    store = _store(tmp_path)
+    turns = list(store.iter_turns(page_size=1))
+    assert [(turn.conversation_id, turn.seq, turn.question, turn.answer) for turn in turns] == [
+        ("conv-a", 2, "Who is the witness?", "Jane Doe."),
+        ("conv-a", 4, "Where was she?", "At home."),
+        ("conv-b", 2, "Any exhibits?", "None."),
+    ]
+    # Only documents attached by the time of the answer.
+    assert turns[0].document_paths == []
+    assert turns[1].document_paths == [str(tmp_path / "exhibit.txt")]
+    assert (turns[2].feedback_score, turns[2].feedback_comment) == (0.0, "missed the exhibit")
+
+    assert [turn.span_id for turn in store.iter_turns(agent_framework="google-adk")] == ["span-3"]
+    assert [turn.span_id for turn in store.iter_turns(rated=True)] == ["span-1", "span-3"]
+    assert [turn.span_id for turn in store.iter_turns(rated=False)] == ["span-2"]
+    assert [turn.span_id for turn in store.iter_turns(min_score=0.5)] == ["span-1"]
+    assert list(store.iter_turns(since="2999-01-01")) == []
+
+
+def test_iter_turns_reads_while_writes_continue(tmp_path):
+    store = _store(tmp_path)
+    turns = store.iter_turns()
+    assert next(turns).span_id == "span-1"
+    _turn(store, "conv-c", "Later question", "Later answer", "span-4")
+    assert len(list(turns)) >= 2
+
+
+def test_jsonl_export_references_documents_by_hash(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    output = tmp_path / "export.jsonl"
+    monkeypatch.setattr(export_sessions, "OUTPUT", str(output))
+    manifest = export_sessions.DocumentManifest(f"{output}.documents.jsonl")
+    turns = export_sessions.batched(store.iter_turns(), 2)
+    assert export_sessions.write_jsonl(turns, manifest) == 3
+    manifest.close()
+
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [row["id"] for row in rows] == ["conv-a:2", "conv-a:4", "conv-b:2"]
+    assert rows[0]["expected"] == "Jane Doe."
+    assert rows[0]["tags"] == ["framework:langgraph", "thumbs_up"]
+    [document] = rows[1]["input"]["documents"]
+    assert len(document["sha256"]) == 64 and document["filename"] == "exhibit.txt"
+    listed = [json.loads(line) for line in open(manifest.path)]
+    assert [item["sha256"] for item in listed] == [document["sha256"]]
+
+
+def test_existing_message_rows_gain_framework_column(tmp_path):
+    db_path = tmp_path / "sessions.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "CREATE TABLE session_messages (conversation_id TEXT NOT NULL, seq INTEGER NOT NULL, "
+            "role TEXT NOT NULL, content TEXT NOT NULL, span_id TEXT, created_at TEXT NOT NULL, "
+            "PRIMARY KEY (conversation_id, seq))"
+        )
+    store = SessionStore(db_path=str(db_path))
+    store.get_or_create_session("conv-a")
+    _turn(store, "conv-a", "Question", "Answer", "span-1")
+    assert [turn.agent_framework for turn in store.iter_turns()] == ["langgraph"]
@@ -18,3 +18,38 @@ def test_get_or_create_session_reuses_row(tmp_path):
     second = store.get_or_create_session("conv-2")
     assert first.conversation_id == second.conversation_id
     assert first.created_at == second.created_at
+
+
+def test_append_transcript_keeps_earlier_turns(tmp_path):
+    db_path = tmp_path / "sessions.db"
+    store = SessionStore(db_path=str(db_path))
+    store.get_or_create_session("conv-3")
+    store.append_transcript("conv-3", [{"role": "user", "content": "first"}])
+    transcript = store.append_transcript("conv-3", [{"role": "user", "content": "second"}])
+    assert [message["content"] for message in transcript] == ["first", "second"]
+    assert store.get_or_create_session("conv-3").transcript == transcript
+
+
+def test_add_document_accumulates_documents(tmp_path):
+    store = SessionStore(db_path=str(tmp_path / "sessions.db"))
+    store.get_or_create_session("conv-4")
+    store.update_document_path("conv-4", "/uploads/original.txt")
+    store.add_document("conv-4", "/uploads/exhibit-a.txt")
+    paths = store.add_document("conv-4", "/uploads/exhibit-b.txt")
+
+    assert paths == ["/uploads/original.txt", "/uploads/exhibit-a.txt", "/uploads/exhibit-b.txt"]
+    record = store.get_or_create_session("conv-4")
+    assert record.document_paths == paths
+    assert record.document_path == "/uploads/exhibit-b.txt"
+    assert store.referenced_document_paths() == set(paths)
+
+
+def test_remove_document_detaches_it(tmp_path):
+    store = SessionStore(db_path=str(tmp_path / "sessions.db"))
+    store.get_or_create_session("conv-5")
+    store.add_document("conv-5", "/uploads/v1.txt")
+    store.remove_document("conv-5", "/uploads/v1.txt")
+    paths = store.add_document("conv-5", "/uploads/v2.txt")
+
+    assert paths == ["/uploads/v2.txt"]
+    assert store.referenced_document_paths() == {"/uploads/v2.txt"}
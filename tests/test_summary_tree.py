@@ -0,0 +1,71 @@
+import threading
+import time
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.backend.agent import rag
+from src.backend.agent.summary_tree import (
+    COMBINE_INSTRUCTIONS,
+    SummaryConfig,
+    build_summary_tree,
+    group_sections,
+)
+
+
+class RecordingSummarizer:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, instructions, text):
+        with self._lock:
+            self.calls.append(instructions)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        kind = "combined" if instructions == COMBINE_INSTRUCTIONS else "section"
+        return f"{kind} summary of {len(text)} chars"
+
+
+def test_sections_respect_size_and_cover_every_chunk():
+    chunks = ["a" * 300] * 7 + ["b" * 900]
+    sections = group_sections(chunks, section_chars=1000)
+    assert sections == [(0, 3), (3, 6), (6, 7), (7, 8)]
+
+
+def test_tree_is_reduced_in_parallel_to_one_root():
+    summarizer = RecordingSummarizer(delay=0.02)
+    config = SummaryConfig(section_chars=1000, fanout=4, concurrency=8, model="fake")
+    tree = build_summary_tree(["x" * 500] * 40, summarizer, config)
+
+    assert [len(level) for level in tree["levels"]] == [20, 5, 2, 1]
+    root = tree["levels"][-1][0]
+    assert (root["start"], root["end"]) == (0, 40)
+    assert summarizer.calls.count(COMBINE_INSTRUCTIONS) == 8
+    assert summarizer.peak > 1
+
+
+def test_summary_mode_is_built_once_and_stored_with_the_index(monkeypatch, tmp_path):
+    monkeypatch.setattr(rag, "_embeddings", lambda: DeterministicFakeEmbedding(size=16))
+    monkeypatch.setattr(rag, "INDEX_DIR", str(tmp_path / "indexes"))
+    monkeypatch.setattr(rag, "_VECTORSTORES", type(rag._VECTORSTORES)())
+    summarizer = RecordingSummarizer()
+    monkeypatch.setattr(rag, "llm_summarizer", lambda model: summarizer)
+    monkeypatch.setenv("RAG_SUMMARY_SECTION_CHARS", "2000")
+    monkeypatch.setenv("RAG_SUMMARY_FANOUT", "2")
+    source = tmp_path / "123e4567-e89b-12d3-a456-426614174000_deposition.txt"
+    source.write_text("\n\n".join(f"Page {i}. The witness describes event {i} in detail." for i in range(200)))
+
+    context = rag.retrieve_context("Summarize the key events", paths=[str(source)], mode="summary")
+    calls = len(summarizer.calls)
+    assert context.startswith("[source: deposition.txt, document summary]\ncombined summary")
+    assert "[source: deposition.txt, part 1, chunks 0-" in context
+
+    rag.evict_vectorstore(str(source))
+    assert rag.retrieve_context("Timeline?", paths=[str(source)], mode="summary") == context
+    assert len(summarizer.calls) == calls
@@ -0,0 +1,69 @@
+import pytest
+from braintrust import logger as bt_logger
+from braintrust.util import LazyValue
+
+from src.backend.agent.trace_sampling import head_sample, install_sampler, sample_children
+from src.backend.storage.session_store import SessionStore
+
+
+class RecordingLogger:
+    def __init__(self):
+        self.events = []
+
+    def log(self, *events):
+        self.events.extend(events)
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    inner = RecordingLogger()
+    monkeypatch.setattr(bt_logger._state, "_global_bg_logger", LazyValue(lambda: inner, use_mutex=False))
+    install_sampler()
+    return inner
+
+
+def _log(event):
+    bt_logger._state.global_bg_logger().log(event)
+
+
+def test_head_sample_is_deterministic_and_respects_rate():
+    ids = [f"conv-{i}" for i in range(2000)]
+    assert all(head_sample(conversation_id, 1.0) for conversation_id in ids)
+    assert not any(head_sample(conversation_id, 0.0) for conversation_id in ids)
+    kept = [conversation_id for conversation_id in ids if head_sample(conversation_id, 0.25)]
+    assert 400 < len(kept) < 600
+    assert kept == [conversation_id for conversation_id in ids if head_sample(conversation_id, 0.25)]
+
+
+def test_unsampled_turn_drops_children_but_keeps_outer_spans(recorder):
+    _log("root")
+    with sample_children(False, slow_turn_s=60) as decision:
+        _log("llm-span")
+        _log("tool-span")
+    _log("chat_turn")
+    assert recorder.events == ["root", "chat_turn"]
+    assert decision.as_metadata() == {
+        "trace_sampled": False,
+        "trace_children_kept": False,
+        "trace_keep_reason": "unsampled",
+    }
+
+
+def test_errors_and_slow_turns_are_force_sampled(recorder):
+    with pytest.raises(RuntimeError):
+        with sample_children(False, slow_turn_s=60):
+            _log("failing-llm-span")
+            raise RuntimeError("model timeout")
+    with sample_children(False, slow_turn_s=0) as decision:
+        _log("slow-tool-span")
+    with sample_children(True):
+        _log("sampled-span")
+    assert recorder.events == ["failing-llm-span", "slow-tool-span", "sampled-span"]
+    assert decision.reason == "forced_slow"
+
+
+def test_sampling_decision_persists_in_session_store(tmp_path):
+    store = SessionStore(db_path=str(tmp_path / "sessions.db"))
+    assert store.get_or_create_session("conv-1").trace_sampled is None
+    store.update_trace_sampled("conv-1", False)
+    assert store.get_or_create_session("conv-1").trace_sampled is False
@@ -0,0 +1,272 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.backend.agent.trace_spool import (
+    SpoolConfig,
+    SpoolingBackgroundLogger,
+    TraceSpool,
+    _deferred_span_row,
+    install_spool,
+    logs3_http_sender,
+    sdk_layout_problems,
+)
+
+
+class FakeIngestionServer:
+    def __init__(self, failures: int = 0):
+        self.rows = []
+        self.failures = failures
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                server.requests += 1
+                if server.failures:
+                    server.failures -= 1
+                    self.send_response(503)
+                else:
+                    server.rows.extend(body["rows"])
+                    self.send_response(200)
+                self.end_headers()
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+
+@pytest.fixture
+def server():
+    fake = FakeIngestionServer()
+    yield fake
+    fake.httpd.shutdown()
+
+
+def _config(tmp_path, **overrides):
+    settings = {
+        "directory": str(tmp_path / "spool"),
+        "max_bytes": 1 << 20,
+        "segment_bytes": 1 << 16,
+        "drop_policy": "oldest",
+        "max_pending_events": 1000,
+        "batch_rows": 2,
+        "base_backoff_s": 0.01,
+        "max_backoff_s": 0.05,
+        **overrides,
+    }
+    return SpoolConfig(**settings)
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_events_are_spooled_and_replayed_after_outage(tmp_path, server):
+    server.failures = 3
+    spool_logger = SpoolingBackgroundLogger(
+        TraceSpool(_config(tmp_path)),
+        send_rows=logs3_http_sender(server.base_url, "test-key"),
+        upload_attachment=lambda record: None,
+    )
+    spool_logger.start()
+    try:
+        for i in range(5):
+            spool_logger.log({"id": f"row-{i}", "output": {"turn": i}})
+        spool_logger.flush()
+        assert _wait_for(lambda: len(server.rows) == 5)
+    finally:
+        spool_logger.stop(timeout=1)
+
+    assert [row["id"] for row in server.rows] == [f"row-{i}" for i in range(5)]
+    assert server.requests > 3
+    assert spool_logger.spool.size_bytes() == 0
+    assert spool_logger.stats()["shipped_rows"] == 5
+
+
+def test_spool_survives_restart_and_caps_size(tmp_path, server):
+    config = _config(tmp_path, max_bytes=300, segment_bytes=100)
+    spool = TraceSpool(config)
+    for i in range(10):
+        spool.append([{"kind": "row", "row": {"id": f"row-{i}", "pad": "x" * 40}}])
+    assert spool.size_bytes() <= 300
+    assert spool.dropped_records > 0
+
+    # A new process picks up whatever is still on disk, oldest first.
+    restarted = SpoolingBackgroundLogger(
+        TraceSpool(config),
+        send_rows=logs3_http_sender(server.base_url, "test-key"),
+        upload_attachment=lambda record: None,
+    )
+    while restarted.ship_once():
+        pass
+    shipped = [row["id"] for row in server.rows]
+    assert shipped == [f"row-{i}" for i in range(10 - len(shipped), 10)]
+
+
+def test_cap_holds_when_the_current_segment_alone_is_over_it(tmp_path):
+    spool = TraceSpool(_config(tmp_path, max_bytes=300, segment_bytes=1 << 16))
+    for i in range(10):
+        spool.append([{"kind": "row", "row": {"id": f"row-{i}", "pad": "x" * 40}}])
+        assert spool.size_bytes() <= 300
+    kept = spool.read(spool.oldest_segment())
+    assert kept[-1]["row"]["id"] == "row-9"
+    assert spool.dropped_records == 10 - len(kept)
+
+    assert spool.append([{"kind": "row", "row": {"pad": "x" * 400}}]) == 0
+    assert spool.size_bytes() <= 300
+
+
+def test_retry_resumes_a_partly_shipped_segment(tmp_path):
+    sent = []
+    outage = {"on_call": 2}
+
+    def send_rows(rows):
+        outage["on_call"] -= 1
+        if outage["on_call"] == 0:
+            raise ConnectionError("backend went away")
+        sent.extend(row["id"] for row in rows)
+
+    spool_logger = SpoolingBackgroundLogger(
+        TraceSpool(_config(tmp_path)), send_rows=send_rows, upload_attachment=lambda record: None
+    )
+    for i in range(5):
+        spool_logger.log({"id": f"row-{i}"})
+    spool_logger.write_pending()
+    with pytest.raises(ConnectionError):
+        spool_logger.ship_once()
+    assert sent == ["row-0", "row-1"]
+
+    # A new process resumes after the last batch that went through.
+    restarted = SpoolingBackgroundLogger(
+        TraceSpool(_config(tmp_path)), send_rows=send_rows, upload_attachment=lambda record: None
+    )
+    while restarted.ship_once():
+        pass
+    assert sent == [f"row-{i}" for i in range(5)]
+    assert restarted.stats()["shipped_rows"] == 3
+    assert restarted.spool.size_bytes() == 0
+
+
+def test_spans_without_api_key_are_spooled_then_resolved(tmp_path, monkeypatch):
+    from braintrust.logger import BraintrustState, init_logger
+    from braintrust.util import LazyValue
+
+    monkeypatch.delenv("BRAINTRUST_API_KEY", raising=False)
+    sent = []
+    spool_logger = SpoolingBackgroundLogger(
+        TraceSpool(_config(tmp_path)),
+        send_rows=sent.extend,
+        upload_attachment=lambda record: None,
+        resolve_parent=lambda parent: {
+            "project_id": f"id-of-{parent['metadata_args']['project_name']}",
+            "log_id": "g",
+        },
+    )
+    state = BraintrustState()
+    state._global_bg_logger = LazyValue(lambda: spool_logger, use_mutex=False)
+    logger = init_logger(project="depositions", api_key=None, set_current=False, state=state)
+    with logger.start_span(name="chat_turn") as span:
+        span.log(input="hi")
+
+    assert spool_logger.write_pending() == 3
+    assert sent == []
+    while spool_logger.ship_once():
+        pass
+    assert {row["project_id"] for row in sent} == {"id-of-depositions"}
+    assert any(row.get("input") == "hi" for row in sent)
+
+
+def test_installed_sdk_has_the_layout_the_spool_reads():
+    from braintrust.logger import BraintrustState, init_logger
+    from braintrust.util import LazyValue
+
+    assert sdk_layout_problems() == []
+
+    events = []
+    state = BraintrustState()
+    state._global_bg_logger = LazyValue(lambda: _Recorder(events), use_mutex=False)
+    logger = init_logger(project="depositions", api_key=None, set_current=False, state=state)
+    logger.log(input="hi")
+
+    row, parent = _deferred_span_row(events[0])
+    assert row["input"] == "hi"
+    assert parent["object_type"] == "project_logs"
+    assert parent["metadata_args"]["project_name"] == "depositions"
+
+
+def test_changed_span_record_closure_disables_the_spool(tmp_path, monkeypatch):
+    from braintrust import logger as bt_logger
+
+    class RenamedSpanImpl(bt_logger.SpanImpl):
+        def log_internal(self, event=None, internal_data=None):
+            record = dict(event or {})
+
+            def compute_record():
+                return dict(record)
+
+            return compute_record
+
+    monkeypatch.setattr(bt_logger, "SpanImpl", RenamedSpanImpl)
+    assert sdk_layout_problems() == ["SpanImpl.log_internal.compute_record closure"]
+    assert install_spool(_config(tmp_path)) is None
+
+
+class _Recorder:
+    def __init__(self, events):
+        self.events = events
+
+    def log(self, *events):
+        self.events.extend(events)
+
+    def enforce_queue_size_limit(self, enforce):
+        pass
+
+
+class _Event:
+    def __init__(self, row, failures=()):
+        self.row = row
+        self.failures = list(failures)
+
+    def get(self):
+        if self.failures:
+            raise self.failures.pop(0)
+        return self.row
+
+
+def test_unconvertible_event_does_not_block_the_queue(tmp_path):
+    sent = []
+    spool_logger = SpoolingBackgroundLogger(
+        TraceSpool(_config(tmp_path, event_attempts=3)),
+        send_rows=sent.extend,
+        upload_attachment=lambda record: None,
+    )
+    poison = _Event({"id": "poison"}, failures=[ValueError("bad record")] * 10)
+    flaky = _Event({"id": "flaky"}, failures=[ConnectionError("backend down")])
+    stuck = _Event({"id": "stuck"}, failures=[ConnectionError("backend down")] * 10)
+    spool_logger.log({"id": "row-0"}, poison, flaky, stuck, {"id": "row-1"})
+
+    with pytest.raises(ConnectionError):
+        spool_logger.write_pending()
+    # Only the transient failures wait for another attempt.
+    assert spool_logger.stats()["pending_events"] == 2
+    with pytest.raises(ConnectionError):
+        spool_logger.write_pending()
+    assert spool_logger.write_pending() == 0
+    while spool_logger.ship_once():
+        pass
+    assert [row["id"] for row in sent] == ["row-0", "row-1", "flaky"]
+    assert spool_logger.stats()["unconvertible_events"] == 2
+    assert spool_logger.stats()["pending_events"] == 0
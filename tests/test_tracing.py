@@ -0,0 +1,40 @@
+from braintrust import init_logger
+from braintrust import logger as bt_logger
+from braintrust.util import LazyValue
+from braintrust_langchain import BraintrustCallbackHandler, set_global_handler
+from braintrust_langchain.context import clear_global_handler
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from src.backend.agent import tracing
+
+
+class RecordingLogger:
+    def __init__(self):
+        self.events = []
+
+    def log(self, *events):
+        self.events.extend(event if isinstance(event, dict) else event.get() for event in events)
+
+    def enforce_queue_size_limit(self, enforce):
+        pass
+
+
+def test_explicit_handler_does_not_duplicate_global_handler_spans(monkeypatch):
+    recorder = RecordingLogger()
+    monkeypatch.setattr(bt_logger._state, "_global_bg_logger", LazyValue(lambda: recorder, use_mutex=False))
+    # Resolving a logged event needs a login; project_id below makes it a no-op.
+    monkeypatch.setattr(bt_logger._state, "logged_in", True)
+    logger = init_logger(project="tracing-test", project_id="tracing-test", api_key="test")
+    handler = BraintrustCallbackHandler(logger=logger)
+    monkeypatch.setattr(tracing, "_logger", logger)
+    monkeypatch.setattr(tracing, "_handler", handler)
+    set_global_handler(handler)
+    try:
+        assert tracing.build_callback_handler(logger) is handler
+        model = FakeListChatModel(responses=["ok"])
+        model.invoke("hi", config={"callbacks": [tracing.build_callback_handler(logger)]})
+    finally:
+        clear_global_handler()
+
+    span_ids = {event["span_id"] for event in recorder.events}
+    assert len(span_ids) == 1
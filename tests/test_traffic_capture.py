@@ -0,0 +1,67 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src.backend.api.traffic import CaptureConfig, TrafficLog, read_blob, read_traffic
+from src.backend.main import app
+from src.backend.storage.session_store import SessionStore
+
+
+class FeedbackLogger:
+    def __init__(self):
+        self.feedback = []
+
+    def log_feedback(self, **kwargs):
+        self.feedback.append(kwargs)
+
+
+@pytest.fixture
+def capture(tmp_path, monkeypatch):
+    monkeypatch.setenv("UPLOADS_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setenv("RAG_SUMMARY_ON_UPLOAD", "false")
+    # No context manager: the lifespan (tracing, warmup, janitor) is not needed.
+    app.state.session_store = SessionStore(str(tmp_path / "sessions.db"))
+    app.state.logger = FeedbackLogger()
+    log = TrafficLog(CaptureConfig(path=str(tmp_path / "traffic.jsonl")))
+    app.state.traffic_log = log
+    yield log, TestClient(app)
+    app.state.traffic_log = None
+    log.close()
+
+
+def test_captures_uploads_and_feedback_in_order(capture):
+    log, client = capture
+    content = b"Q. Where were you?\nA. At home.\n" * 50
+    upload = client.post(
+        "/upload", data={"conversation_id": "conv-1"}, files={"file": ("depo.txt", content, "text/plain")}
+    )
+    assert upload.status_code == 200
+    assert client.post("/feedback", json={"span_id": "span-1", "rating": "up"}).status_code == 200
+    assert client.post("/feedback", json={"span_id": "span-1"}).status_code == 400
+    # Not captured: only /chat, /upload and /feedback are.
+    client.get("/health")
+
+    entries = list(read_traffic(log.path))
+    assert [(entry["seq"], entry["path"], entry["status"]) for entry in entries] == [
+        (0, "/upload", 200),
+        (1, "/feedback", 200),
+        (2, "/feedback", 400),
+    ]
+    uploaded = entries[0]
+    assert uploaded["conversation_id"] == "conv-1"
+    assert uploaded["request"]["filename"] == "depo.txt"
+    assert uploaded["request"]["size"] == len(content)
+    assert read_blob(log.path, uploaded["request"]["sha256"]) == content
+    assert uploaded["response"]["document_id"] == upload.json()["document_id"]
+    assert entries[1]["request"] == {"span_id": "span-1", "rating": "up"}
+    assert entries[0]["ts"] <= entries[1]["ts"] <= entries[2]["ts"]
+    assert all(entry["duration_ms"] >= 0 for entry in entries)
+
+
+def test_capture_stops_at_size_cap(tmp_path):
+    log = TrafficLog(CaptureConfig(path=str(tmp_path / "traffic.jsonl"), max_mb=300 / 1024 / 1024))
+    for number in range(10):
+        log.record({"ts": number, "path": "/feedback", "request": {"span_id": "x" * 50}})
+    log.close()
+    entries = list(read_traffic(log.path))
+    assert 0 < len(entries) < 10
+    assert [entry["seq"] for entry in entries] == list(range(len(entries)))
@@ -0,0 +1,103 @@
+import itertools
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from src.backend.agent import graph
+from src.backend.agent.budget import BudgetTracker, TurnBudget
+from src.backend.agent.runner import run_agent_turn
+
+
+class LoopingModel:
+    """Calls a tool on every turn unless tools are switched off."""
+
+    def __init__(self, tools_per_call=1):
+        self.tools_per_call = tools_per_call
+        self.ids = itertools.count()
+        self.forced_prompts = []
+        self.tool_choice = None
+
+    def bind_tools(self, tools, **kwargs):
+        bound = LoopingModel(self.tools_per_call)
+        bound.ids, bound.forced_prompts = self.ids, self.forced_prompts
+        bound.tool_choice = kwargs.get("tool_choice")
+        return bound
+
+    def invoke(self, messages):
+        if self.tool_choice == "none":
+            self.forced_prompts.append(messages[-1].content)
+            return AIMessage(content="final answer", usage_metadata={"input_tokens": 5, "output_tokens": 5, "total_tokens": 10})
+        calls = [{"name": "noop", "args": {}, "id": f"call-{next(self.ids)}"} for _ in range(self.tools_per_call)]
+        return AIMessage(content="", tool_calls=calls, usage_metadata={"input_tokens": 100, "output_tokens": 10, "total_tokens": 110})
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = LoopingModel()
+    monkeypatch.setattr(graph, "_model", lambda model_name=None: fake)
+    monkeypatch.setattr(graph, "system_prompt", lambda: "test")
+    return fake
+
+
+def _turn(budget):
+    return run_agent_turn(
+        framework="langgraph",
+        conversation_id="conv",
+        thread_id="thread",
+        user_message="Summarize everything",
+        document_paths=[],
+        budget=budget,
+    )
+
+
+def test_llm_call_budget_forces_one_final_answer(model):
+    turn = _turn(TurnBudget(max_llm_calls=3, max_tool_calls=0, max_seconds=0))
+    assert turn.assistant_message == "final answer"
+    assert turn.budget_exhausted == "llm_calls"
+    assert turn.usage.llm_calls == 4
+    # The third call's tool request is answered as skipped, not run, and
+    # does not count as a tool call.
+    assert turn.usage.tool_calls == 2
+    assert turn.raw_state["messages"][-2].content.startswith("Not run: the turn budget is exhausted (llm_calls)")
+    assert len(model.forced_prompts) == 1
+    assert "(llm_calls)" in model.forced_prompts[0]
+
+
+def test_tool_and_token_budgets(model):
+    model.tools_per_call = 2
+    turn = _turn(TurnBudget(max_llm_calls=0, max_tool_calls=3, max_seconds=0))
+    assert turn.budget_exhausted == "tool_calls"
+    assert [message.content for message in turn.raw_state["messages"] if message.type == "tool"] == [
+        "Unknown tool: noop",
+        "Unknown tool: noop",
+        "Not run: the turn budget is exhausted (tool_calls).",
+        "Not run: the turn budget is exhausted (tool_calls).",
+    ]
+    assert turn.usage.tool_calls == 2
+
+    model.tools_per_call = 1
+    turn = _turn(TurnBudget(max_llm_calls=0, max_tool_calls=0, max_seconds=0, max_tokens=300))
+    assert turn.budget_exhausted == "tokens"
+    assert turn.usage.llm_calls == 4
+
+
+def test_unlimited_budget_completes_normally(monkeypatch):
+    monkeypatch.setattr(graph, "_model", lambda model_name=None: type("Plain", (), {
+        "bind_tools": lambda self, tools, **kwargs: self,
+        "invoke": lambda self, messages: AIMessage(content="done"),
+    })())
+    monkeypatch.setattr(graph, "system_prompt", lambda: "test")
+    turn = _turn(TurnBudget(max_llm_calls=1))
+    assert (turn.assistant_message, turn.budget_exhausted) == ("done", None)
+
+
+def test_tracker_refuses_tools_once_exhausted(monkeypatch):
+    clock = iter([0.0, 1.0, 5.0, 6.0])
+    monkeypatch.setattr("src.backend.agent.budget.time.monotonic", lambda: next(clock))
+    tracker = BudgetTracker(TurnBudget(max_llm_calls=2, max_tool_calls=0, max_seconds=4), started=0.0)
+    assert tracker.before_llm_call() is None
+    assert tracker.allow_tool_call()
+    assert not tracker.allow_tool_call()
+    assert tracker.refusal() == "Not run: the turn budget is exhausted (time)."
+    # Once exhausted, the next model call must answer without tools.
+    assert tracker.before_llm_call() == "time"
@@ -0,0 +1,48 @@
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.backend.main import app
+from src.backend.storage.session_store import SessionStore
+
+
+class _Logger:
+    def start_span(self, **kwargs):
+        return nullcontext(SimpleNamespace(log=lambda **event: None))
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv("UPLOADS_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setenv("RAG_SUMMARY_ON_UPLOAD", "false")
+    app.state.session_store = SessionStore(str(tmp_path / "sessions.db"))
+    app.state.logger = _Logger()
+    return TestClient(app)
+
+
+def _upload(client, text, **fields):
+    return client.post(
+        "/upload",
+        data={"conversation_id": "conv", **fields},
+        files={"file": ("deposition.txt", text.encode(), "text/plain")},
+    )
+
+
+def test_same_name_upload_keeps_both_documents_with_a_warning(client):
+    first = _upload(client, "First day.").json()
+    second = _upload(client, "Second day.").json()
+    assert second["document_ids"] == [first["document_id"], second["document_id"]]
+    assert second["replaced_document_id"] is None
+    assert first["document_id"] in second["warnings"][0]
+
+
+def test_revision_replaces_the_named_document(client):
+    first = _upload(client, "Draft.").json()
+    revised = _upload(client, "Final.", replaces=first["document_id"]).json()
+    assert revised["document_ids"] == [revised["document_id"]]
+    assert revised["replaced_document_id"] == first["document_id"]
+    assert revised["warnings"] == []
+
+    assert _upload(client, "Again.", replaces="missing.txt").status_code == 404
@@ -0,0 +1,52 @@
+import pytest
+
+from src.backend.agent import warmup
+from src.backend.agent.warmup import WarmupStatus, resolve_warmup_steps, run_warmup
+
+
+def test_ready_only_after_all_steps_succeed(monkeypatch):
+    calls = []
+    monkeypatch.setitem(warmup.STEPS, "prompt", lambda: calls.append("prompt"))
+    monkeypatch.setitem(warmup.STEPS, "graph", lambda: calls.append("graph"))
+    status = WarmupStatus(steps={"prompt": "pending", "graph": "pending"})
+    assert not status.ready
+    run_warmup(["prompt", "graph"], status)
+    assert calls == ["prompt", "graph"]
+    assert status.ready
+    assert status.as_dict()["status"] == "ready"
+
+
+def test_failed_step_keeps_worker_unready(monkeypatch):
+    def boom():
+        raise RuntimeError("no index")
+
+    monkeypatch.setitem(warmup.STEPS, "vectorstore", boom)
+    status = WarmupStatus()
+    run_warmup(["vectorstore"], status, retry_max_s=0)
+    assert not status.ready
+    assert status.as_dict()["errors"] == {"vectorstore": "no index"}
+
+
+def test_failed_step_is_retried_until_ready(monkeypatch):
+    outcomes = [RuntimeError("embeddings API unavailable"), RuntimeError("still down"), None]
+
+    def flaky():
+        outcome = outcomes.pop(0)
+        if outcome is not None:
+            raise outcome
+
+    monkeypatch.setitem(warmup.STEPS, "prompt", lambda: None)
+    monkeypatch.setitem(warmup.STEPS, "vectorstore", flaky)
+    status = WarmupStatus()
+    run_warmup(["prompt", "vectorstore"], status, retry_base_s=0.01, retry_max_s=0.02)
+    assert status.ready
+    assert status.as_dict()["errors"] == {}
+    assert status.attempts == {"prompt": 1, "vectorstore": 3}
+
+
+def test_resolve_warmup_steps_validates_override(monkeypatch):
+    monkeypatch.setenv("WARMUP_STEPS", "prompt,graph")
+    assert resolve_warmup_steps("langgraph") == ["prompt", "graph"]
+    monkeypatch.setenv("WARMUP_STEPS", "prompt,bogus")
+    with pytest.raises(ValueError):
+        resolve_warmup_steps("langgraph")